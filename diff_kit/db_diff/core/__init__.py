@@ -4,7 +4,11 @@
 # @File: __init__
 
 
+from typing import List, Optional
 from diff_kit.db_diff.core.compare_data import DbDiff, DiffParams, DbConfig
+from diff_kit.db_diff.core.multi_diff import MultiDbDiff
+from diff_kit.db_diff.core.sharding import ShardedDbDiff
+from diff_kit.db_diff.core.work_queue import QueueCoordinator, QueueWorker
 from diff_kit.db_diff.report.report_factory import ReportFactory
 
 
@@ -40,9 +44,40 @@ class DbDiffRunner:
             limit: int = 1000，查询限制的数量，默认为1000条。
             maxsize: int = 20，协程数，默认为20个协程同时工作。
             compare_count: bool 是否只对比行数
+            keyset: bool = False，是否使用键集分页(按unique_field排序，WHERE (k1,k2) > (...) 定位)代替LIMIT/OFFSET，适用于大表。
+            split_ranges: bool = False，是否按唯一键首列的范围(直方图分位点或MIN/MAX)切分A表并行扫描，无需预先COUNT。
+            num_ranges: int = None，切分的键范围数，默认与maxsize相同。
+            exact_row_count: bool = False，按键范围扫描(split_ranges、checksum、merge_join)时是否与扫描同时COUNT两表的总行数；默认不统计，报告中的总行数显示为未统计，仅在B表的行需要bidirectional或merge_join才能发现。
+            checksum: bool = False，是否使用校验和分桶对比: 先在数据库端计算每个键范围的校验和，仅对不一致的范围拉取整行对比，适合大部分数据一致的表。
+            checksum_leaf_size: int = None，校验和不一致时继续切分的最小范围行数，默认与limit相同。
+            merge_join: bool = False，是否使用归并对比: 两端按unique_field有序读取后一次遍历完成对比，可同时发现仅在目标表的记录。字符串类型的键需使用二进制排序规则。
+            prefetch: int = None，流式读取(服务端游标)时每次从数据库获取的行数，默认与limit相同。
+            result_store: str = 'memory'，对比结果明细的存储方式，可选['memory', 'sqlite']，不一致较多时使用sqlite落盘以限制内存。
+            result_store_path: str = None，sqlite存储的文件路径，默认使用临时文件并在生成报告后删除；文件已存在时清空上一次对比的明细。
+            compare_workers: int = 0，对比阶段的并行数，大于0时读取数据与对比流水线执行，对齐与对比交给进程池/线程池，默认在事件循环中对比。
+            compare_executor: str = 'process'，对比阶段使用的执行器，可选['process', 'thread']，process模式下plugin需要是可序列化的模块级函数。
+            checkpoint_path: str = None，检查点文件路径，指定后每个批次/键范围完成时记录进度与部分结果，对比全部完成后删除。
+            resume: bool = False，是否从checkpoint_path续跑，跳过已完成的批次/键范围并把已保存的结果合并到本次报告，对比参数需与上次一致。
+            incremental_column: str = None，增量对比的变更跟踪列(如updated_at)，指定后只对比A表中该列不小于上次成功对比时水位的行，首次运行为全量对比；发现不一致的行时不推进水位，下次仍从上次的水位开始对比。
+            watermark_path: str = 'diff_kit_watermark.sqlite'，保存每对表增量水位的文件路径，多张表可以共用。
+            full_sweep_days: int = None，距上次全量对比超过该天数时执行一次全量对比，用于发现A表删除或只在B表变更的行，默认不定期全量。
+            pushdown: bool = False，A表与B表在同一个数据库实例时(PostgreSQL还需在同一个库)把对比下推到数据库，只返回不一致的键与列，比较遵循数据库的类型与排序规则语义(如MySQL默认字符串比较不区分大小写)；设置plugin或不满足条件时使用常规方式对比。
+            row_hash: bool = False，两阶段对比，先按批只取唯一键与数据库计算的行哈希，哈希不一致的行才拉取整行对比，适合包含大字段的宽表；不同类型数据库的值的文本形式可能不同，哈希不一致的行会退化为整行对比；设置plugin时不生效。
+            sample: float = None，采样对比，小于1时为采样比例，否则为目标样本行数；PostgreSQL使用TABLESAMPLE BERNOULLI，MySQL在整数唯一键上随机探测，结果中给出整张表不一致比例的估计及其置信区间，此次对比数量为样本行数。
+            sample_confidence: float = 0.95，采样对比估计的置信水平。
+            shards: int = 0，多进程分片对比的分片数，大于1时按唯一键首列把A表切分为多个键范围，每个分片在独立的进程中以自己的事件循环与连接池对比，最后合并结果，进程数不超过CPU核数；plugin需要是可序列化的模块级函数，只对比行数与采样对比时不生效。
+            work_queue_path: str = None，分布式对比的工作队列文件(SQLite，多台主机时放在支持文件锁的共享存储上)，指定后本进程作为协调进程切分num_ranges个键范围并发布，由各主机上的QueueWorker领取对比，全部完成后合并结果生成报告；shards大于0时同时在本机启动shards个工作进程；resume时沿用已发布的队列。
+            bidirectional: bool = False，双向对比，A表驱动的对比完成后只读取两端的唯一键，A表的键编码为紧凑的整数集合，流式读取B表的键判断是否存在，判定为不存在的键回A表精确确认后记为仅在B表；单列整数键之外的键按64位哈希判断，判定为存在的键不再确认，A表有n个键时每个仅在B表的键被漏报的概率约为n/2^64；归并对比与下推对比本身已包含仅在B表的行。
+            normalize: bool = False，是否按两端的列类型归一化参与对比的值(Decimal与float、带时区与不带时区的时间、bytes与str、tinyint(1)与bool、JSON文本与对象等)，对比开始前为每一列编译一次转换方法，对比时按批执行；以下归一化选项可以单独使用，未设置normalize时只执行选项本身的转换(float_tolerance会把浮点数列转换为float后按误差比较)。
+            float_tolerance: float = None，浮点数列允许的绝对误差。
+            timestamp_precision: int = None，时间列比较时保留的秒的小数位数(0-6)，多余的位数截断。
+            trim_strings: bool = False，字符串列比较时是否去除首尾空白。
+            ignore_case: bool = False，字符串列比较时是否忽略大小写。
         only_generate_failed_report: 是否仅失败时生成报告,
         report_type: str 报告类型，默认excel 可选['excel', 'text]
         plugin: callable 可自定义比较方法，默认为None
+        batch_plugin: callable 批量插件，每批数据调用一次 batch_plugin(batch_a, batch_b)，返回转换后的 (batch_a, batch_b)，可以使用向量化的方式转换整批数据；启用compare_workers时在对比的进程池/线程池中执行，process模式下需要是可序列化的模块级函数；在plugin之前执行；归并对比与逐行对比时在对齐之后执行，不能增减行，默认为None
+        batch_format: str 批量插件接收与返回的批次格式，默认rows(字典列表) 可选['rows', 'columns', 'dataframe']，columns为{列名: 值列表}，dataframe为pandas.DataFrame
         """
         self.params = diff_params
         self.report_name = report_name
@@ -53,10 +88,71 @@ class DbDiffRunner:
         """
         执行数据库对比并生成报告。
         """
-        result = DbDiff(self.params).start()
-        # 如果仅生成失败报告，并且对比结果为成功，则不生成报告
-        if self.only_generate_failed_report and result.is_success():
-            return True
-        # 生成报告
-        ReportFactory().create_report(self.report_type, self.report_name, result, sheet_name=self.params.table_name_a)
+        if self.params.work_queue_path:
+            result = QueueCoordinator(self.params).start()
+        elif self.params.shards > 1 and not (self.params.compare_count or self.params.sample):
+            result = ShardedDbDiff(self.params).start()
+        else:
+            result = DbDiff(self.params).start()
+        try:
+            # 如果仅生成失败报告，并且对比结果为成功，则不生成报告
+            if self.only_generate_failed_report and result.is_success():
+                return True
+            # 生成报告
+            ReportFactory().create_report(self.report_type, self.report_name, result,
+                                          sheet_name=self.params.table_name_a)
+        finally:
+            # 释放结果明细的存储
+            result.close()
 
+
+class MultiDbDiffRunner:
+    def __init__(self,
+                 report_name: str,
+                 diff_params: Optional[List[DiffParams]] = None,
+                 schema_params: Optional[dict] = None,
+                 schema_a: Optional[str] = None,
+                 schema_b: Optional[str] = None,
+                 max_concurrency: int = 50,
+                 max_tables: int = 4,
+                 only_generate_failed_report: bool = True,
+                 report_type: str = 'excel',
+                 ):
+        """
+        初始化多表对比的类实例，所有表的结果写入同一个报告。
+        参数:
+        report_name: str 报告名称
+        diff_params: List[DiffParams] 需要对比的表的参数列表，字段同DbDiffRunner的diff_params
+        schema_params: dict = None，整库对比的公共参数，字段同diff_params但不需要表名与unique_field，
+            对比A库中的所有表，唯一字段使用主键，B库中不存在或没有主键的表会被跳过。
+            指定result_store_path时每张表的明细写入 {result_store_path}.table{序号}。
+        schema_a: str = None，整库对比时A库的模式名，MySQL为库名，PostgreSQL默认为public。
+        schema_b: str = None，整库对比时B库的模式名，默认与schema_a相同。
+        max_concurrency: int = 50，所有表共享的并发数，同一个数据库端点的所有表共用一个连接池。
+        max_tables: int = 4，同时对比的表数。
+        only_generate_failed_report: 是否仅写入对比失败的表
+        report_type: str 报告类型，默认excel 可选['excel', 'text]
+        """
+        self.multi_diff = MultiDbDiff(diff_params, schema_params, schema_a, schema_b, max_concurrency, max_tables)
+        self.report_name = report_name
+        self.only_generate_failed_report = only_generate_failed_report
+        self.report_type = report_type
+
+    def diff(self):
+        """
+        执行多表对比并生成报告，返回是否所有表都一致，有表执行失败时在生成报告后抛出异常。
+        """
+        results = self.multi_diff.start()
+        try:
+            report_results = [(result.table_name_a, result) for result in results
+                              if not (self.only_generate_failed_report and result.is_success())]
+            if report_results:
+                ReportFactory().create_combined_report(self.report_type, self.report_name, report_results)
+        finally:
+            # 释放结果明细的存储
+            for result in results:
+                result.close()
+
+        if self.multi_diff.errors:
+            raise RuntimeError(f"以下表对比失败: {', '.join(self.multi_diff.errors)}")
+        return all(result.is_success() for result in results)
@@ -0,0 +1,60 @@
+# @Project: diff-kit
+# @Time: 2025/2/20 11:16
+# @Author: Alan
+# @File: batch_plugin
+
+from typing import Callable, Dict, List, Tuple
+
+import pandas as pd
+
+
+def to_rows(rows: list) -> List[dict]:
+    # asyncpg的Record不可修改，转换为字典后交给插件
+    return [dict(row) for row in rows]
+
+
+def to_columns(rows: list) -> Dict[str, list]:
+    columns = list(rows[0].keys()) if rows else []
+    return {column: [row[column] for row in rows] for column in columns}
+
+
+def from_columns(columns: Dict[str, list]) -> List[dict]:
+    names = list(columns.keys())
+    return [dict(zip(names, values)) for values in zip(*columns.values())]
+
+
+def to_dataframe(rows: list) -> pd.DataFrame:
+    return pd.DataFrame.from_records(to_rows(rows))
+
+
+def from_dataframe(df: pd.DataFrame) -> List[dict]:
+    # 数值列中的NULL在DataFrame中是NaN，转换回None后再对比
+    return df.astype(object).where(df.notna(), None).to_dict('records')
+
+
+# 批次格式 -> (行列表转换为该格式的方法, 该格式转换回行列表的方法)
+batch_format_mapping = {
+    'rows': (to_rows, to_rows),
+    'columns': (to_columns, from_columns),
+    'dataframe': (to_dataframe, from_dataframe),
+}
+
+
+class BatchPlugin:
+    """
+    批量插件，每批数据只调用一次: plugin(batch_a, batch_b) -> (batch_a, batch_b)。
+    batch_a与batch_b分别是A表与B表的一批数据，格式由batch_format指定:
+    rows为字典列表，columns为 {列名: 值列表}，dataframe为pandas.DataFrame，可以使用向量化的方式转换整批数据。
+    插件在对比阶段执行，启用compare_workers时随对比一起在进程池/线程池中运行，不阻塞事件循环。
+    """
+
+    def __init__(self, plugin: Callable, batch_format: str = 'rows'):
+        if batch_format not in batch_format_mapping:
+            raise ValueError(f'batch_format: {batch_format} not supported')
+        self.plugin = plugin
+        self.batch_format = batch_format
+
+    def __call__(self, rows_a: list, rows_b: list) -> Tuple[List[dict], List[dict]]:
+        to_batch, from_batch = batch_format_mapping[self.batch_format]
+        batch_a, batch_b = self.plugin(to_batch(rows_a), to_batch(rows_b))
+        return from_batch(batch_a), from_batch(batch_b)
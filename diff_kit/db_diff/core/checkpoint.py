@@ -0,0 +1,73 @@
+# @Project: diff-kit
+# @Time: 2025/1/24 14:32
+# @Author: Alan
+# @File: checkpoint
+
+import os
+import pickle
+import sqlite3
+from typing import Iterator, List, Optional, Tuple
+
+from diff_kit.db_diff.core.planner import KeyRange
+from diff_kit.db_diff.core.results import Result
+
+
+class Checkpoint:
+    """
+    对比进度的检查点，保存在SQLite文件中。
+    每个工作单元(一个批次或一个键范围)对比完成后，在同一个事务中记录该单元及其部分结果(计数与明细)；
+    中断后以resume=True重新运行时跳过已完成的单元，并把保存的部分结果合并到本次的结果中。
+    """
+
+    def __init__(self, path: str, fingerprint: str, resume: bool = False):
+        self.path = path
+        if not resume and os.path.exists(path):
+            os.remove(path)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value BLOB)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS units (unit TEXT PRIMARY KEY, result BLOB)")
+
+        saved_fingerprint = self.get_meta('fingerprint')
+        if saved_fingerprint is None:
+            self.set_meta('fingerprint', fingerprint)
+        elif saved_fingerprint != fingerprint:
+            self.conn.close()
+            raise ValueError(f"检查点{path}与本次的对比参数不一致，无法续跑，请删除检查点文件或关闭resume")
+
+    def get_meta(self, name: str):
+        row = self.conn.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return pickle.loads(row[0]) if row else None
+
+    def set_meta(self, name: str, value):
+        self.conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)",
+                          (name, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)))
+        self.conn.commit()
+
+    def load_plan(self) -> Optional[List[KeyRange]]:
+        """
+        读取保存的键范围，续跑时必须沿用上次的切分，否则已完成的范围与新的范围可能重叠。
+        """
+        return self.get_meta('key_ranges')
+
+    def save_plan(self, key_ranges: List[KeyRange]):
+        self.set_meta('key_ranges', key_ranges)
+
+    def load(self) -> Iterator[Tuple[str, Result]]:
+        """
+        逐个读取已完成的单元及其部分结果。
+        """
+        for unit, payload in self.conn.execute("SELECT unit, result FROM units"):
+            yield unit, pickle.loads(payload)
+
+    def commit(self, unit: str, result: Result):
+        self.conn.execute("INSERT OR REPLACE INTO units (unit, result) VALUES (?, ?)",
+                          (unit, pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)))
+        self.conn.commit()
+
+    def close(self, remove: bool = False):
+        """
+        :param remove: 是否删除检查点文件，对比全部完成后不再需要
+        """
+        self.conn.close()
+        if remove and os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,134 @@
+# @Project: diff-kit
+# @Time: 2025/1/20 10:36
+# @Author: Alan
+# @File: comparator
+
+from typing import Any, Callable, List, Optional, Tuple
+
+import dictdiffer
+import numpy as np
+
+from diff_kit.db_diff.core.batch_plugin import BatchPlugin
+from diff_kit.db_diff.core.key_codec import KeyCodec, KeyIndex
+from diff_kit.db_diff.core.normalizer import ColumnNormalizer
+from diff_kit.db_diff.core.results import Result
+
+
+class BatchComparator:
+    """
+    批量对比A表与B表的数据。
+    按唯一键对齐后逐列向量化比较，只有存在差异的行才逐行使用dictdiffer生成差异明细。
+    """
+
+    def __init__(self, keys_a: List[str], keys_b: List[str], plugin: Optional[Callable] = None,
+                 normalizer: Optional[ColumnNormalizer] = None, batch_plugin: Optional[BatchPlugin] = None):
+        """
+        :param normalizer: 按列预先编译的值归一化计划，对齐后、比较前对整批数据执行
+        :param batch_plugin: 批量插件，每批数据在逐行的plugin之前调用一次
+        """
+        self.keys_a = keys_a
+        self.keys_b = keys_b
+        self.plugin = plugin
+        self.normalizer = normalizer
+        self.batch_plugin = batch_plugin
+        # A表的行已按B表的列名取别名，两端使用B表的唯一字段编码
+        self.codec = KeyCodec(keys_b)
+
+    def where_clause(self, row_a) -> str:
+        """
+        生成报告中展示的查询条件。
+        """
+        return ' AND '.join([key + '=' + str(row_a[key]) for key in self.keys_a])
+
+    def compare(self, rows_a: list, rows_b: list, result: Result):
+        """
+        按唯一键把一批A表数据与B表数据对齐后对比，结果累加到result中。
+        """
+        # 批量插件在对齐之前执行，可以改写唯一键
+        if self.batch_plugin:
+            rows_a, rows_b = self.batch_plugin(rows_a, rows_b)
+        # 为数据源B的查询结果建立唯一键到行下标的索引
+        index_b = KeyIndex(rows_b, self.codec)
+
+        matched = []
+        for row_a in rows_a:
+            if self.plugin:
+                row_a = self.plugin(row_a)
+            matched.append((row_a, index_b.lookup(self.codec.encode(row_a))))
+        self._compare_aligned(matched, result)
+
+    def compare_matched(self, matched: List[Tuple[Any, list]], result: Result):
+        """
+        对比已经对齐的数据，结果累加到result中。
+        与compare相同，先执行批量插件，再对A表的每一行执行plugin。
+        :param matched: [(A表的行, 与之匹配的B表的行列表)]
+        """
+        if self.batch_plugin:
+            matched = self.apply_batch_plugin(matched)
+        if self.plugin:
+            matched = [(self.plugin(row_a), rows_b) for row_a, rows_b in matched]
+        self._compare_aligned(matched, result)
+
+    def apply_batch_plugin(self, matched: List[Tuple[Any, list]]) -> List[Tuple[Any, list]]:
+        """
+        对已经对齐的数据执行批量插件，插件不能增减行或改变行的顺序。
+        """
+        rows_a = [row_a for row_a, _ in matched]
+        rows_b = [row_b for _, matched_b in matched for row_b in matched_b]
+        new_rows_a, new_rows_b = self.batch_plugin(rows_a, rows_b)
+        if len(new_rows_a) != len(rows_a) or len(new_rows_b) != len(rows_b):
+            raise ValueError("batch_plugin不能增减已对齐的数据的行数")
+        iter_b = iter(new_rows_b)
+        return [(row_a, [next(iter_b) for _ in matched_b]) for row_a, (_, matched_b) in zip(new_rows_a, matched)]
+
+    def _compare_aligned(self, matched: List[Tuple[Any, list]], result: Result):
+        pairs_a, pairs_b = [], []
+        for row_a, rows_b in matched:
+            result.num_diff_row += 1
+            # 表B中没有找到匹配的记录
+            if not rows_b:
+                result.add_only_row_in_table_a(self.where_clause(row_a))
+            # 表B中找到多个匹配的记录
+            elif len(rows_b) > 1:
+                result.add_excess_row_in_table_b(self.where_clause(row_a))
+            else:
+                pairs_a.append(row_a)
+                pairs_b.append(rows_b[0])
+
+        if self.normalizer and pairs_a:
+            pairs_a, pairs_b = self.normalizer.apply(pairs_a), self.normalizer.apply(pairs_b)
+
+        for index in self.find_different_rows(pairs_a, pairs_b):
+            row_a, row_b = pairs_a[index], pairs_b[index]
+            # 使用dictdiffer库比较两行数据的差异，并将差异结果转化为列表。
+            differences = list(dictdiffer.diff(dict(row_a), dict(row_b), ignore=None))
+            if self.normalizer and self.normalizer.tolerance_columns:
+                # 误差只作用于浮点数列，其他列的差异原样保留
+                differences = [d for d in differences if not self.normalizer.is_tolerated(d)]
+            if differences:
+                result.add_difference_row(self.where_clause(row_a), differences)
+
+    def find_different_rows(self, pairs_a: list, pairs_b: list):
+        """
+        逐列比较一一对应的两组行，返回可能存在差异的行下标。
+        使用 != 判断，结果是dictdiffer判定为有差异的行的超集，最终由dictdiffer确认。
+        """
+        num_rows = len(pairs_a)
+        if num_rows == 0:
+            return []
+
+        columns = list(pairs_a[0].keys())
+        # 两端的列不一致时每一行都会有差异
+        if set(columns) != set(pairs_b[0].keys()):
+            return range(num_rows)
+
+        mask = np.zeros(num_rows, dtype=bool)
+        for column in columns:
+            # fromiter保证每个值都作为一个元素，不会把列表类型的值展开为多维数组
+            values_a = np.fromiter((row[column] for row in pairs_a), dtype=object, count=num_rows)
+            values_b = np.fromiter((row[column] for row in pairs_b), dtype=object, count=num_rows)
+            if self.normalizer and column in self.normalizer.tolerance_columns:
+                mask |= self.normalizer.find_different(values_a, values_b)
+            else:
+                mask |= (values_a != values_b).astype(bool)
+        return np.flatnonzero(mask)
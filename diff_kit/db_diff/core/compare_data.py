@@ -4,15 +4,33 @@
 # @File: compare_data
 
 import asyncio
+import contextlib
+import functools
+import json
+import math
 import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal
 import dictdiffer
 from pydantic import BaseModel
 from rich.console import Console
-from collections import defaultdict
 from tqdm.asyncio import tqdm as tqdm_async
-from typing import Union, List, Dict, Any, Optional, Callable
+from typing import Union, Optional, Callable, Awaitable
+from diff_kit.db_diff.core.batch_plugin import BatchPlugin
+from diff_kit.db_diff.core.checkpoint import Checkpoint
+from diff_kit.db_diff.core.comparator import BatchComparator
+from diff_kit.db_diff.core.key_codec import KeyCodec
+from diff_kit.db_diff.core.key_set import KeySet
+from diff_kit.db_diff.core.normalizer import ColumnNormalizer
+from diff_kit.db_diff.core.pipeline import ComparePipeline, compare_batch, compare_matched_batch
+from diff_kit.db_diff.core.planner import KeyRange, RangePlanner
+from diff_kit.db_diff.core.pushdown import PushdownQuery
+from diff_kit.db_diff.core.result_store import create_result_store
 from diff_kit.db_diff.core.results import Result
-from diff_kit.db_diff.db_engine import DbEngineFactory
+from diff_kit.db_diff.core.scheduler import run_workers
+from diff_kit.db_diff.core.watermark import Watermark, WatermarkStore
+from diff_kit.db_diff.db_engine import DbEngine, DbEngineFactory, pool_registry
 from diff_kit.utils.logger import logger
 
 console = Console()
@@ -43,18 +61,71 @@ class DiffParams(BaseModel):
     maxsize: int = 50
     compare_count: bool = False
     fast: bool = True
+    keyset: bool = False
+    split_ranges: bool = False
+    num_ranges: Optional[int] = None
+    exact_row_count: bool = False
+    checksum: bool = False
+    checksum_leaf_size: Optional[int] = None
+    merge_join: bool = False
+    prefetch: Optional[int] = None
+    result_store: str = 'memory'
+    result_store_path: Optional[str] = None
+    compare_workers: int = 0
+    compare_executor: str = 'process'
+    checkpoint_path: Optional[str] = None
+    resume: bool = False
+    incremental_column: Optional[str] = None
+    watermark_path: str = 'diff_kit_watermark.sqlite'
+    full_sweep_days: Optional[int] = None
+    pushdown: bool = False
+    row_hash: bool = False
+    sample: Optional[float] = None
+    sample_confidence: float = 0.95
+    shards: int = 0
+    work_queue_path: Optional[str] = None
+    bidirectional: bool = False
+    normalize: bool = False
+    float_tolerance: Optional[float] = None
+    timestamp_precision: Optional[int] = None
+    trim_strings: bool = False
+    ignore_case: bool = False
     plugin: Optional[Callable] = None
+    batch_plugin: Optional[Callable] = None
+    batch_format: str = 'rows'
 
 
 class DbDiff:
+    # 校验和不一致时，每个键范围继续切分的子范围数
+    CHECKSUM_FANOUT = 8
 
-    def __init__(self, kwargs: DiffParams):
+    def __init__(self, kwargs: DiffParams, client_a: DbEngine = None, client_b: DbEngine = None,
+                 budget: asyncio.Semaphore = None):
+        """
+        :param client_a: 已创建连接池的A库引擎，多表对比时共享，由调用方负责关闭
+        :param client_b: 已创建连接池的B库引擎
+        :param budget: 多张表共享的全局并发额度
+        """
         self.kwargs = kwargs
-        self.client_a = None
-        self.client_b = None
+        self.client_a = client_a
+        self.client_b = client_b
+        self.own_clients = client_a is None or client_b is None
+        self.budget = budget
         self.query_columns_a = "*"
         self.query_columns_b = "*"
+        self.diff_columns_a = []
+        self.diff_columns_b = []
+        # 两阶段对比时第一阶段查询的列: 唯一键与行哈希
+        self.hash_columns_a = None
+        self.hash_columns_b = None
         self.results = None
+        self.comparator = None
+        self.pipeline = None
+        self.checkpoint = None
+        # 从检查点恢复的已完成单元 {单元: 对比行数}
+        self.completed_units = {}
+        # 是否统计两表的总行数，分片对比时由协调进程统一统计
+        self.count_total_rows = True
 
     async def create_db_conn(self):
         """
@@ -67,29 +138,41 @@ class DbDiff:
         # 如果db_name_b没有提供，就使用db_name_a的值
         if not self.kwargs.db_name_b:
             self.kwargs.db_name_b = self.kwargs.db_name_a
+        # 使用调用方传入的共享连接池
+        if not self.own_clients:
+            return
 
         try:
             db_conn_config_a = self.kwargs.db_conn_a.model_dump(exclude={'db_type'})
             db_conn_config_b = self.kwargs.db_conn_b.model_dump(exclude={'db_type'})
-            self.client_a = DbEngineFactory(
+            factory_a = DbEngineFactory(
                 self.kwargs.db_conn_a.db_type,
                 db=self.kwargs.db_name_a,
                 **db_conn_config_a
-            ).create_db_engine()
-            self.client_b = DbEngineFactory(
+            )
+            factory_b = DbEngineFactory(
                 self.kwargs.db_conn_b.db_type,
                 db=self.kwargs.db_name_b,
                 **db_conn_config_b
-            ).create_db_engine()
-            # 创建数据库连接池
-            await self.client_a.create_pool(self.kwargs.maxsize)
-            await self.client_b.create_pool(self.kwargs.maxsize)
+            )
+            # A表与B表在同一个库时共用一个连接池。归并对比等模式会同时占用两端的连接，
+            # 连接池上限取两端之和以免互相等待，连接按需建立，实际连接数约为分开时的一半
+            pool_size = self.kwargs.maxsize
+            if factory_a.db_type == factory_b.db_type and factory_a.kwargs == factory_b.kwargs:
+                pool_size *= 2
+            # 从连接池登记表获取，同一进程中之前的对比留下的空闲连接池可以直接复用
+            self.client_a = await factory_a.acquire_db_engine(pool_size)
+            self.client_b = await factory_b.acquire_db_engine(pool_size)
         except Exception as e:
             raise RuntimeError("Failed to create database connections: {}".format(e))
 
     async def close_db_conn(self):
-        await self.client_a.close()
-        await self.client_b.close()
+        if not self.own_clients:
+            return
+        if self.client_a:
+            await DbEngineFactory.release_db_engine(self.client_a)
+        if self.client_b:
+            await DbEngineFactory.release_db_engine(self.client_b)
 
     def _handle_query_columns(self, columns, method='alias'):
         """
@@ -137,78 +220,26 @@ class DbDiff:
         """
         return ' AND '.join(where_clause)
 
-    def _parse_where_clause_b(self, row_a: dict):
-        # 根据字段值的类型生成相应的查询条件字符串。
-        def check_type(k, v, sign='='):
-            if isinstance(v, int) or isinstance(v, float):
-                return f"{k} {sign} {v}"
-            if v is None:
-                return f"{k} IS NULL"
-            if v == '':
-                return f"{k} {sign} ''"
-
-            return f"{k} {sign} '{str(v)}'"
-
-        if isinstance(self.kwargs.unique_field, dict):
-            expression = [check_type(field_b, row_a[field_a]) for field_a, field_b in self.unique_field.items()]
-
-        elif isinstance(self.kwargs.unique_field, list):
-            expression = [check_type(field, row_a[field]) for field in self.kwargs.unique_field]
-
-        else:
-            raise TypeError("unique_field must be a dict or a list")
-
-        if self.kwargs.where_clause_b:
-            expression.append(self.kwargs.where_clause_b)
-
-        return ' AND '.join(expression)
-
     def _parse_query_condition_in_b(self, result_a):
         """
-        根据查询条件解析来自结果A的条件并生成适用于B的批量查询条件
-
-        此函数的作用是根据预设的查询条件(self.where_clause_b)将结果A(list of dicts)中的特定字段
-        提取出来，形成一个新的查询条件字典(batch_where_clause_b)，该字典用于后续对数据源B的查询。
-        同时，该函数会返回一个包含所有查询键的列表(keys)。
-
-        """
-        batch_where_clause_b, keys_a, keys_b = {}, [], []
-
-        def add_batch_where_clause(ka, kb, values):
-            batch_where_clause_b[kb] = [str(row_a[ka]) if row_a[ka] else row_a[ka] for row_a in values]
-            keys_a.append(ka)
-            keys_b.append(kb)
-
-        # 确认where_clause_b是字典还是列表
-        if isinstance(self.kwargs.unique_field, dict):
-            for ka, kb in self.kwargs.unique_field.items():
-                add_batch_where_clause(ka, kb, result_a)
-
-        # 如果查询条件是列表，遍历其元素
-        elif isinstance(self.kwargs.unique_field, list):
-            for k in self.kwargs.unique_field:
-                add_batch_where_clause(k, k, result_a)
-        else:
-            raise TypeError("unique_field must be a dict or a list")
-
-        return keys_a, keys_b, batch_where_clause_b
-
-    def _generate_key(self, row: Dict[str, Any], keys: List[str]) -> str:
-        """
-        生成用于唯一标识行的键。
+        从一批A表数据中提取B表的查询键。
+        返回A表与B表的唯一字段列表，以及去重后的唯一键值列表(每个元素是与唯一字段一一对应的元组)，
+        由数据库引擎按行值精确查询B表。
         """
-        return '_'.join([str(row[k]) for k in keys])
+        keys_a, keys_b = self._get_unique_keys()
+        key_values = list(dict.fromkeys(tuple(row_a[k] for k in keys_a) for row_a in result_a))
+        return keys_a, keys_b, key_values
 
-    def _build_results_dict(self, query_b_result: List[Dict[str, Any]], keys: List[str]) -> Dict[
-        str, List[Dict[str, Any]]]:
+    def _get_unique_keys(self):
         """
-        构建用于存储查询结果字典。
+        获取A表与B表的唯一字段列表。
+        :return: (keys_a, keys_b)
         """
-        results_dict = defaultdict(list)
-        for row in query_b_result:
-            key = self._generate_key(row, keys)
-            results_dict[key].append(row)
-        return results_dict
+        if isinstance(self.kwargs.unique_field, dict):
+            return list(self.kwargs.unique_field.keys()), list(self.kwargs.unique_field.values())
+        if isinstance(self.kwargs.unique_field, list):
+            return list(self.kwargs.unique_field), list(self.kwargs.unique_field)
+        raise TypeError("unique_field must be a dict or a list")
 
     async def get_row_count(self, is_use_query_condition=False):
         """
@@ -221,6 +252,8 @@ class DbDiff:
 
         # 如果不使用查询条件，则将查询条件置为None
         if not is_use_query_condition:
+            if not self.count_total_rows:
+                return [0, 0]
             where_clause_a = None
             where_clause_b = None
 
@@ -236,22 +269,186 @@ class DbDiff:
         :param total_tasks: 任务总数
         :param batch_size: 每次只执行大小
         """
-        num_batches = (total_tasks // batch_size) + (total_tasks % batch_size > 0)
-        # 控制并发数
+        with tqdm_async(total=total_tasks, desc=task_name, unit="row", ncols=160) as pbar:
+
+            async def task(start_index):
+                compare = self.compare_data_batch if self.kwargs.fast else self.compare_data
+                await self.run_unit(pbar, f"offset:{start_index}",
+                                    functools.partial(compare, pbar, start_index, batch_size))
+
+            async with self.compare_stage():
+                # 键集分页需要依赖上一批的最后一行，由单个协程顺序读取A表
+                if self.kwargs.keyset:
+                    return await self.compare_data_keyset(pbar, asyncio.Semaphore(maxsize), batch_size)
+
+                # 固定maxsize个协程按需取出批次的起始位置，不预先为每个批次创建协程
+                await run_workers(range(0, total_tasks, batch_size), task, maxsize)
+
+    async def distribute_range_tasks(self, task_name, total_tasks, batch_size, maxsize):
+        """
+        按唯一键范围分配任务，每个协程独立扫描一个键范围，无需预先COUNT，也没有OFFSET跳行。
+        :param task_name: 任务名称
+        :param total_tasks: 预估的任务总数，仅用于进度条，可以为None
+        :param batch_size: 每次只执行大小
+        """
+        keys_a, _ = self._get_unique_keys()
+        planner = RangePlanner(self.client_a, self.kwargs.table_name_a, keys_a[0], self.kwargs.where_clause_a)
+        num_ranges = self.kwargs.num_ranges or maxsize
+        # 归并对比未要求切分范围时，两端各只打开一个有序的数据流
+        if self.kwargs.merge_join and not self.kwargs.split_ranges and not self.kwargs.checksum:
+            num_ranges = 1
+        # 续跑时沿用检查点中保存的键范围
+        key_ranges = self.checkpoint.load_plan() if self.checkpoint else None
+        if key_ranges is None:
+            # 切分键范围的查询同样占用全局并发额度
+            async with self.use_budget():
+                key_ranges = await planner.plan(num_ranges)
+            if self.checkpoint:
+                self.checkpoint.save_plan(key_ranges)
+        # 校验和递归切分出的子范围共享该信号量控制并发数
         semaphore = asyncio.Semaphore(maxsize)
 
-        async def task(pbar, start_index, batch_size):
-            async with semaphore:
-                if self.kwargs.fast:
-                    await self.compare_data_batch(pbar, start_index, batch_size)
+        with tqdm_async(total=total_tasks, desc=task_name, unit="row", ncols=160) as pbar:
+
+            async def task(index):
+                key_range = key_ranges[index]
+                if self.kwargs.checksum:
+                    compare = functools.partial(self.compare_data_checksum, pbar, semaphore, planner, key_range,
+                                                batch_size)
+                elif self.kwargs.merge_join:
+                    compare = functools.partial(self.compare_data_merge, pbar, key_range, batch_size)
                 else:
-                    await self.compare_data(pbar, start_index, batch_size)
+                    compare = functools.partial(self.compare_data_range, pbar, key_range, batch_size)
+                # 校验和递归的每次查询各自占用全局并发额度，键范围本身不占用，避免父范围持有额度等待子范围
+                await self.run_unit(pbar, f"range:{index}", compare, acquire_budget=not self.kwargs.checksum)
 
-        with tqdm_async(total=total_tasks, desc=task_name, unit="row", ncols=160) as pbar:
-            tasks = [task(pbar, start_index * batch_size, batch_size)
-                     for start_index in range(num_batches)]
+            async with self.compare_stage():
+                await run_workers(range(len(key_ranges)), task, maxsize)
 
-            await asyncio.gather(*tasks)
+    @contextlib.asynccontextmanager
+    async def checkpoint_stage(self):
+        """
+        配置了checkpoint_path时打开检查点，续跑时把已完成单元的结果合并到总结果。
+        全部对比完成后删除检查点文件，出错时保留以便续跑。
+        """
+        if not self.kwargs.checkpoint_path:
+            if self.kwargs.resume:
+                raise ValueError("resume需要同时指定checkpoint_path")
+            yield
+            return
+        self.checkpoint = Checkpoint(self.kwargs.checkpoint_path, self.checkpoint_fingerprint(), self.kwargs.resume)
+        for unit, result in self.checkpoint.load():
+            self.results.merge(result)
+            self.completed_units[unit] = result.num_diff_row
+        if self.completed_units:
+            logger.info(f"从检查点{self.kwargs.checkpoint_path}续跑，已完成的单元数: {len(self.completed_units)}")
+        completed = False
+        try:
+            yield
+            completed = True
+        finally:
+            self.checkpoint.close(remove=completed)
+            self.checkpoint = None
+
+    def checkpoint_fingerprint(self) -> str:
+        """
+        影响工作单元划分与对比结果的参数，续跑时必须与检查点一致。
+        """
+        params = self.kwargs.model_dump(include={
+            'db_name_a', 'db_name_b', 'table_name_a', 'table_name_b', 'where_clause_a', 'where_clause_b',
+            'field_mapping', 'unique_field', 'diff_columns', 'exclude_columns', 'limit', 'fast', 'keyset',
+            'split_ranges', 'checksum', 'checksum_leaf_size', 'merge_join', 'row_hash', 'bidirectional',
+            'normalize', 'float_tolerance', 'timestamp_precision', 'trim_strings', 'ignore_case', 'batch_format'
+        })
+        # 插件按模块与名称区分，函数对象的文本形式包含内存地址，每次运行都不同
+        for field in ('plugin', 'batch_plugin'):
+            plugin = getattr(self.kwargs, field)
+            if plugin:
+                name = getattr(plugin, '__qualname__', type(plugin).__qualname__)
+                params[field] = f"{getattr(plugin, '__module__', '')}.{name}"
+        return json.dumps(params, sort_keys=True, default=str)
+
+    async def run_unit(self, pbar, unit: str, compare: Callable[[Result], Awaitable], acquire_budget=True):
+        """
+        执行一个工作单元(一个批次或一个键范围)。
+        未启用检查点时直接写入总结果；启用时写入该单元单独的结果，完成后保存到检查点再合并到总结果，
+        已完成的单元直接跳过。
+        :param compare: 接收结果对象并执行对比的协程函数
+        :param acquire_budget: 执行期间是否占用全局并发额度，为False时由compare内部的查询自行占用
+        """
+        async with self.use_budget(acquire_budget):
+            return await self.execute_unit(pbar, unit, compare)
+
+    @contextlib.asynccontextmanager
+    async def use_budget(self, acquire=True):
+        """
+        占用一个全局并发额度，单表对比时不做限制。
+        多表对比时所有表的查询共享全局并发额度，等待的查询先到先得，各表交替执行。
+        :param acquire: 为False时不占用，便于调用方按条件使用
+        """
+        if self.budget is None or not acquire:
+            yield
+            return
+        async with self.budget:
+            yield
+
+    async def execute_unit(self, pbar, unit: str, compare: Callable[[Result], Awaitable]):
+        if self.checkpoint is None:
+            return await compare(self.results)
+        if unit in self.completed_units:
+            pbar.update(self.completed_units[unit])
+            return
+        result = Result()
+        await compare(result)
+        self.checkpoint.commit(unit, result)
+        self.results.merge(result)
+
+    @contextlib.asynccontextmanager
+    async def compare_stage(self):
+        """
+        配置了compare_workers时启动对比流水线，退出前等待已提交的批次全部对比完成。
+        """
+        if not self.kwargs.compare_workers:
+            yield
+            return
+        self.pipeline = ComparePipeline(self.kwargs.compare_workers, self.kwargs.compare_executor)
+        await self.pipeline.start()
+        try:
+            yield
+            await self.pipeline.join()
+        finally:
+            await self.pipeline.close()
+            self.pipeline = None
+
+    async def submit_compare(self, pbar, rows_a: list, rows_b: list, result: Result):
+        """
+        按唯一键对齐并对比一批数据。
+        启用对比流水线时交给进程池/线程池执行，当前协程可以继续读取下一批；否则直接在当前协程中对比。
+        启用检查点时需要等待这一批对比完成，工作单元结束时其结果才是完整的。
+        """
+        if self.pipeline is None:
+            self.comparator.compare(rows_a, rows_b, result)
+            pbar.update(len(rows_a))
+            return
+        if self.pipeline.is_process:
+            # asyncpg的Record无法序列化，交给进程池之前转换为字典
+            rows_a = [dict(row) for row in rows_a]
+            rows_b = [dict(row) for row in rows_b]
+        await self.pipeline.submit(pbar, len(rows_a), result, compare_batch, self.comparator, rows_a, rows_b,
+                                   wait=self.checkpoint is not None)
+
+    async def submit_compare_matched(self, pbar, matched: list, result: Result):
+        """
+        对比一批已经对齐的数据，执行方式同submit_compare。
+        """
+        if self.pipeline is None:
+            self.comparator.compare_matched(matched, result)
+            pbar.update(len(matched))
+            return
+        if self.pipeline.is_process:
+            matched = [(dict(row_a), [dict(row_b) for row_b in rows_b]) for row_a, rows_b in matched]
+        await self.pipeline.submit(pbar, len(matched), result, compare_matched_batch, self.comparator, matched,
+                                   wait=self.checkpoint is not None)
 
     async def run_compare(self):
         try:
@@ -260,8 +457,13 @@ class DbDiff:
             # 只对比行数
             if self.kwargs.compare_count:
                 return await self.compare_row_count()
+            # 增量对比时限定本次对比的行
+            watermark = await self.prepare_incremental() if self.kwargs.incremental_column else None
             # 对比数据
-            return await self.batch_compare_data()
+            result = await self.batch_compare_data()
+            if watermark:
+                self.save_watermark(watermark, result)
+            return result
         except Exception as e:
             # 记录执行过程中的异常
             logger.error(f"Error occurred: {e}")
@@ -270,11 +472,74 @@ class DbDiff:
             # 确保与数据库的连接被正确关闭
             await self.close_db_conn()
 
+    def create_result(self, num_table_a=0, num_table_b=0):
+        """
+        创建对比结果，明细按result_store保存在内存或落盘到SQLite文件。
+        """
+        store_kwargs = {'path': self.kwargs.result_store_path} if self.kwargs.result_store_path else {}
+        store = create_result_store(self.kwargs.result_store, **store_kwargs)
+        return Result(self.kwargs.table_name_a, self.kwargs.table_name_b, num_table_a=num_table_a,
+                      num_table_b=num_table_b, store=store)
+
+    def save_watermark(self, watermark: Watermark, result: Result):
+        """
+        对比完成且没有发现差异时才推进水位；中途失败或仍有不一致的行时，下次仍从上次的水位开始，
+        否则这些行会落在新的水位之下，之后的增量对比不再检查。
+        """
+        if result.num_mismatched_row or result.only_row_count_in_table_b:
+            logger.warning("增量对比发现不一致的行，不更新水位，下次仍从上次的水位开始对比")
+            return
+        WatermarkStore(self.kwargs.watermark_path).save(self.watermark_pair(), watermark)
+
+    def watermark_pair(self) -> str:
+        return f"{self.kwargs.db_name_a}.{self.kwargs.table_name_a}->{self.kwargs.db_name_b}.{self.kwargs.table_name_b}"
+
+    @staticmethod
+    def _format_literal(value) -> str:
+        """
+        把水位值转换为SQL字面量。
+        """
+        if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+            return str(value)
+        return "'" + str(value).replace("'", "''") + "'"
+
+    async def prepare_incremental(self) -> Watermark:
+        """
+        增量对比: 只对比A表中变更跟踪列不小于上次水位的行，没有水位或距上次全量对比超过full_sweep_days时执行全量对比。
+        A表中删除的行以及只在B表发生的变更需要依靠定期的全量对比发现。
+        :return: 本次对比完成后需要保存的水位
+        """
+        column = self.kwargs.incremental_column
+        saved = WatermarkStore(self.kwargs.watermark_path).load(self.watermark_pair())
+        # 以开始对比时的最大值作为新的水位，对比过程中才更新的行留到下一次对比
+        _, max_value = await self.client_a.get_key_bounds(self.kwargs.table_name_a, column,
+                                                          self.kwargs.where_clause_a)
+        now = datetime.now()
+        full_sweep_days = self.kwargs.full_sweep_days
+        if saved is None or saved.value is None or saved.last_full_sweep is None or (
+                full_sweep_days is not None and now - saved.last_full_sweep >= timedelta(days=full_sweep_days)):
+            logger.info(f"增量对比: 本次执行全量对比，新的水位: {column}={max_value}")
+            return Watermark(max_value, now)
+
+        condition = f"{column} >= {self._format_literal(saved.value)}"
+        update = {'where_clause_a': f"({self.kwargs.where_clause_a}) AND {condition}"
+                  if self.kwargs.where_clause_a else condition}
+        # 校验和、归并对比、双向对比与下推对比会对称地扫描两端，B表也需要按同一水位限定，
+        # 否则B表未变更的行会被当作仅在目标表的记录
+        if self.kwargs.checksum or self.kwargs.merge_join or self.kwargs.bidirectional or self.kwargs.pushdown:
+            column_b = (self.kwargs.field_mapping or {}).get(column, column)
+            condition_b = f"{column_b} >= {self._format_literal(saved.value)}"
+            update['where_clause_b'] = f"({self.kwargs.where_clause_b}) AND {condition_b}" \
+                if self.kwargs.where_clause_b else condition_b
+        # 复制参数而不是直接修改，同一个DiffParams可以被多次使用
+        self.kwargs = self.kwargs.model_copy(update=update)
+        logger.info(f"增量对比: 只对比{condition}的行")
+        return Watermark(saved.value if max_value is None else max_value, saved.last_full_sweep)
+
     async def compare_row_count(self):
         row_count_a, row_count_b = await self.get_row_count(is_use_query_condition=True)
         # 初始化结果
-        self.results = Result(self.kwargs.table_name_a, self.kwargs.table_name_b, num_table_a=row_count_a,
-                              num_table_b=row_count_b)
+        self.results = self.create_result(num_table_a=row_count_a, num_table_b=row_count_b)
         return self.results
 
     async def batch_compare_data(self):
@@ -287,115 +552,536 @@ class DbDiff:
         # 处理差异列，使用别名方法
         self.query_columns_a = self._join_query_columns(self._handle_query_columns(diff_columns, method='alias'))
         self.query_columns_b = self._join_query_columns(self._handle_query_columns(diff_columns, method='replace'))
+        # 未使用别名的参与对比的列，A表与B表一一对应
+        exclude_columns = self.kwargs.exclude_columns or []
+        self.diff_columns_a = [col for col in diff_columns if col not in exclude_columns]
+        self.diff_columns_b = self._handle_query_columns(self.diff_columns_a, method='replace')
+        batch_plugin = BatchPlugin(self.kwargs.batch_plugin, self.kwargs.batch_format) \
+            if self.kwargs.batch_plugin else None
+        self.comparator = BatchComparator(*self._get_unique_keys(), plugin=self.kwargs.plugin,
+                                          normalizer=await self.prepare_normalizer(), batch_plugin=batch_plugin)
+        if self.kwargs.row_hash:
+            self.prepare_row_hash()
+
+        name = f"Task 比较两个表，基础表为: {self.kwargs.table_name_a}, 对比表为: {self.kwargs.table_name_b}"
+
+        if self.kwargs.pushdown:
+            if self.can_pushdown():
+                return await self.compare_data_pushdown(name)
+            logger.warning("A表与B表不在同一个数据库实例或设置了plugin、batch_plugin、值归一化，无法下推到数据库对比，使用常规方式对比")
+
+        if self.kwargs.sample:
+            return await self.compare_data_sample(name)
+
+        if self.kwargs.checksum and self.kwargs.db_conn_a.db_type != self.kwargs.db_conn_b.db_type:
+            logger.warning("不同类型数据库的值的文本形式可能不同，校验和不一致的范围将退化为逐行对比")
+
+        if self.kwargs.split_ranges or self.kwargs.checksum or self.kwargs.merge_join:
+            # 按键范围扫描时无需预先COUNT；exact_row_count时表总行数与扫描同时统计，否则不统计
+            self.results = self.create_result(num_table_a=None, num_table_b=None)
+            # 进度条使用统计信息中的估算行数，有查询条件时估算值不准确，不显示总数
+            estimated_row_count = None if self.kwargs.where_clause_a else \
+                await self.client_a.estimate_row_count(self.kwargs.table_name_a)
+            async with self.checkpoint_stage():
+                scan = self.distribute_range_tasks(name, estimated_row_count, self.kwargs.limit, self.kwargs.maxsize)
+                if self.kwargs.exact_row_count:
+                    (self.results.num_table_a, self.results.num_table_b), _ = await asyncio.gather(
+                        self.get_row_count(is_use_query_condition=False), scan)
+                else:
+                    await scan
+                # 归并对比在遍历时已经发现仅在B表的行
+                if self.kwargs.bidirectional and not self.kwargs.merge_join:
+                    await self.compare_only_in_table_b(name, self.results.num_table_b)
+            return self.results
 
         # 获取基础表A和对比表B的行数，并根据查询条件获取A表中不同行的数
         table_a_total_num, table_b_total_num = await self.get_row_count(is_use_query_condition=False)
         # 初始化结果
-        self.results = Result(self.kwargs.table_name_a, self.kwargs.table_name_b, num_table_a=table_a_total_num,
-                              num_table_b=table_b_total_num)
+        self.results = self.create_result(num_table_a=table_a_total_num, num_table_b=table_b_total_num)
 
         diff_row_count = table_a_total_num
-        if self.kwargs.where_clause_a:
+        # 未统计表的总行数(分片、工作队列的键范围)时，同样按查询条件统计此次对比的行数
+        if self.kwargs.where_clause_a or not self.count_total_rows:
             diff_row_count = await self.client_a.get_row_count(self.kwargs.table_name_a, self.kwargs.where_clause_a)
 
-        name = f"Task 比较两个表，基础表为: {self.kwargs.table_name_a}, 对比表为: {self.kwargs.table_name_b}"
-        await self.distribute_run_tasks(name, diff_row_count, self.kwargs.limit, self.kwargs.maxsize)
+        async with self.checkpoint_stage():
+            await self.distribute_run_tasks(name, diff_row_count, self.kwargs.limit, self.kwargs.maxsize)
+            if self.kwargs.bidirectional:
+                await self.compare_only_in_table_b(name, table_b_total_num)
 
         return self.results
 
-    async def compare_data_batch(self, pbar, start_index, batch_size):
+    async def iter_key_batches(self, client: DbEngine, table_name, key_columns, where_clause, batch_size):
+        """
+        流式读取一张表的唯一键，按批返回键值元组列表。
+        """
+        batch = []
+        async for row in client.query_stream(', '.join(key_columns), table_name, where_clause,
+                                             prefetch=self.kwargs.prefetch or batch_size):
+            batch.append(tuple(row[k] for k in key_columns))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    async def compare_only_in_table_b(self, task_name, total_rows_b=None):
+        """
+        双向对比: A表驱动的对比只能发现A表中的行，完成后再找出仅在B表的行。
+        只读取两端的唯一键，A表的键编码进紧凑的KeySet，流式读取B表的键按批判断是否存在；
+        判定为不存在的键再回A表精确查询确认，确认后记为仅在B表，不需要第二次整行对比；
+        判定为存在的键不再确认，漏报的概率见KeySet。
+        """
+        keys_a, keys_b = self._get_unique_keys()
+        batch_size = self.kwargs.limit
+        key_set = KeySet()
+        codec_a = KeyCodec(keys_a)
+        async for keys in self.iter_key_batches(self.client_a, self.kwargs.table_name_a, keys_a,
+                                                self.kwargs.where_clause_a, batch_size):
+            key_set.add(keys)
+        key_set.freeze()
+
+        async def confirm(candidates):
+            rows_a = await self.client_a.query_in(', '.join(keys_a), self.kwargs.table_name_a, keys_a, candidates,
+                                                  self.kwargs.where_clause_a)
+            found = {codec_a.encode(row_a) for row_a in rows_a}
+            # 两端唯一字段的类型不同时按文本形式兜底
+            found_text = {codec_a.to_text(key) for key in found}
+            for key_b in candidates:
+                key = codec_a.encode_values(key_b)
+                if key not in found and codec_a.to_text(key) not in found_text:
+                    self.results.add_only_row_in_table_b(' AND '.join(f"{k}={v}" for k, v in zip(keys_b, key_b)))
+
+        with tqdm_async(total=total_rows_b or None, desc=f"{task_name}, 查找仅在B表的行", unit="row",
+                        ncols=160) as pbar:
+            async for keys in self.iter_key_batches(self.client_b, self.kwargs.table_name_b, keys_b,
+                                                    self.kwargs.where_clause_b, batch_size):
+                missing = ~key_set.contains(keys)
+                if missing.any():
+                    await confirm(list(dict.fromkeys(key for key, is_missing in zip(keys, missing) if is_missing)))
+                pbar.update(len(keys))
+
+    def can_pushdown(self) -> bool:
+        """
+        两张表在同一个数据库实例中(PostgreSQL还需要在同一个库中)并且没有设置plugin、batch_plugin与值归一化时才能下推到数据库对比。
+        """
+        if self.kwargs.plugin or self.kwargs.batch_plugin or self.comparator.normalizer or self.kwargs.db_conn_a != self.kwargs.db_conn_b:
+            return False
+        return self.kwargs.db_name_a == self.kwargs.db_name_b or self.client_a.CROSS_DATABASE_QUERY
+
+    async def compare_data_pushdown(self, task_name):
+        """
+        在数据库中直接对比同一实例中的两张表，只把不一致的键与列拉回本地，结果与常规方式一致。
+        不一致的判断使用数据库的比较语义(如MySQL字符串比较遵循排序规则)，返回的行再由dictdiffer生成差异明细。
+        """
+        keys_a, keys_b = self._get_unique_keys()
+        table_name_b = self.client_a.qualify_table_name(self.kwargs.table_name_b, self.kwargs.db_name_b)
+        query = PushdownQuery(self.client_a.gen_distinct_condition, self.kwargs.table_name_a, table_name_b,
+                              keys_a, keys_b, self.diff_columns_a, self.diff_columns_b,
+                              self.kwargs.where_clause_a, self.kwargs.where_clause_b)
+        prefetch = self.kwargs.prefetch or self.kwargs.limit
+        # 报告中的列名与常规方式一致，使用映射后的列名
+        column_names = self.diff_columns_b
+
+        def key_row(row):
+            return {key: row[f"k{i}"] for i, key in enumerate(keys_a)}
+
+        table_a_total_num, table_b_total_num = await self.get_row_count(is_use_query_condition=False)
+        self.results = self.create_result(num_table_a=table_a_total_num, num_table_b=table_b_total_num)
+
+        with tqdm_async(total=4, desc=task_name, unit="query", ncols=160) as pbar:
+            # B表存在多条的行不算作不一致的行，先取出这些键
+            excess_keys = set()
+            async for row in self.client_a.execute_stream(query.excess_in_table_b_sql(), prefetch=prefetch):
+                excess_keys.add(tuple(row[f"k{i}"] for i in range(len(keys_a))))
+                self.results.add_excess_row_in_table_b(self.comparator.where_clause(key_row(row)))
+            pbar.update(1)
+
+            async for row in self.client_a.execute_stream(query.only_in_table_a_sql(), prefetch=prefetch):
+                self.results.add_only_row_in_table_a(self.comparator.where_clause(key_row(row)))
+            pbar.update(1)
+
+            async for row in self.client_a.execute_stream(query.only_in_table_b_sql(), prefetch=prefetch):
+                self.results.add_only_row_in_table_b(
+                    ' AND '.join([f"{key}={row[f'k{i}']}" for i, key in enumerate(keys_b)]))
+            pbar.update(1)
+
+            difference_sql = query.difference_sql()
+            if difference_sql:
+                async for row in self.client_a.execute_stream(difference_sql, prefetch=prefetch):
+                    if tuple(row[f"k{i}"] for i in range(len(keys_a))) in excess_keys:
+                        continue
+                    values_a = {name: row[f"a_c{i}"] for i, name in enumerate(column_names)}
+                    values_b = {name: row[f"b_c{i}"] for i, name in enumerate(column_names)}
+                    differences = list(dictdiffer.diff(values_a, values_b, ignore=None))
+                    if differences:
+                        self.results.add_difference_row(self.comparator.where_clause(key_row(row)), differences)
+            pbar.update(1)
+
+        # 此次对比的行数为A表中满足查询条件的行数
+        self.results.num_diff_row = await self.client_a.get_row_count(self.kwargs.table_name_a,
+                                                                      self.kwargs.where_clause_a)
+        return self.results
+
+    def get_sample_size(self, population: int):
+        """
+        根据sample计算采样比例与目标行数: 小于1时为比例，否则为目标行数。
+        :return: (rate, num_rows)
+        """
+        sample = self.kwargs.sample
+        if sample < 1:
+            return sample, math.ceil(population * sample)
+        num_rows = min(int(sample), population)
+        return (num_rows / population if population else 1), num_rows
+
+    async def compare_data_sample(self, task_name):
+        """
+        采样对比: 在数据库端随机抽取A表的部分行，按常规方式与B表对比，
+        并据此估计整张表的不一致比例及其置信区间，用于在全量对比之前快速判断是否需要全量对比。
+        """
+        table_a_total_num, table_b_total_num = await self.get_row_count(is_use_query_condition=False)
+        self.results = self.create_result(num_table_a=table_a_total_num, num_table_b=table_b_total_num)
+        population = table_a_total_num
+        if self.kwargs.where_clause_a:
+            population = await self.client_a.get_row_count(self.kwargs.table_name_a, self.kwargs.where_clause_a)
+        rate, num_rows = self.get_sample_size(population)
+        logger.info(f"采样对比: 总体{population}行，采样比例{rate:.4%}，目标样本{num_rows}行")
+
+        keys_a, _ = self._get_unique_keys()
+        batch_size = self.kwargs.limit
+        async with self.compare_stage():
+            with tqdm_async(total=num_rows, desc=task_name, unit="row", ncols=160) as pbar:
+                batch = []
+                async for row in self.client_a.query_sample(self.hash_columns_a or self.query_columns_a,
+                                                            self.kwargs.table_name_a, keys_a, rate, num_rows,
+                                                            self.kwargs.where_clause_a,
+                                                            prefetch=self.kwargs.prefetch or batch_size):
+                    batch.append(row)
+                    if len(batch) >= batch_size:
+                        await self.compare_batch_rows(pbar, batch, self.results)
+                        batch = []
+                if batch:
+                    await self.compare_batch_rows(pbar, batch, self.results)
+
+        if self.results.num_diff_row < num_rows:
+            logger.info(f"采样对比: 实际样本{self.results.num_diff_row}行少于目标样本{num_rows}行，按实际样本估计")
+        # 按实际对比的样本行数估计，而不是目标样本数
+        estimate = self.results.estimate_from_sample(population, self.kwargs.sample_confidence)
+        logger.info(f"采样对比: 样本{self.results.num_diff_row}行，不一致{self.results.num_mismatched_row}行，"
+                    f"估计不一致比例{estimate.rate:.4%}，{estimate.confidence:.0%}置信区间"
+                    f"[{estimate.lower:.4%}, {estimate.upper:.4%}]")
+        return self.results
+
+    async def prepare_normalizer(self) -> Optional[ColumnNormalizer]:
+        """
+        设置了normalize或任一归一化选项时，读取两端的列类型，为参与对比的非唯一键列编译归一化计划；
+        未设置normalize时只执行归一化选项本身需要的转换。
+        """
+        if not (self.kwargs.normalize or self.kwargs.float_tolerance or self.kwargs.timestamp_precision is not None
+                or self.kwargs.trim_strings or self.kwargs.ignore_case):
+            return None
+        types_a, types_b = await asyncio.gather(
+            self.client_a.get_table_columns(self.kwargs.table_name_a, with_types=True),
+            self.client_b.get_table_columns(self.kwargs.table_name_b, with_types=True)
+        )
+        _, keys_b = self._get_unique_keys()
+        column_mapping = {column_a: column_b for column_a, column_b in zip(self.diff_columns_a, self.diff_columns_b)
+                          if column_b not in keys_b}
+        return ColumnNormalizer.compile(types_a, types_b, column_mapping,
+                                        float_tolerance=self.kwargs.float_tolerance,
+                                        timestamp_precision=self.kwargs.timestamp_precision,
+                                        trim_strings=self.kwargs.trim_strings,
+                                        ignore_case=self.kwargs.ignore_case,
+                                        normalize_types=self.kwargs.normalize)
+
+    def prepare_row_hash(self):
+        """
+        两阶段对比: 批量读取A表时只取唯一键与行哈希，行哈希按映射后一一对应的对比列在数据库中计算。
+        plugin作用于整行，无法体现在数据库计算的哈希中，设置plugin或batch_plugin时不使用两阶段对比。
+        """
+        if self.kwargs.plugin or self.kwargs.batch_plugin:
+            logger.warning("设置了plugin或batch_plugin，无法按行哈希对比，使用常规方式对比")
+            return
+        keys_a, keys_b = self._get_unique_keys()
+        self.hash_columns_a = ', '.join(keys_a + [f"{self.client_a.gen_row_hash(self.diff_columns_a)} AS row_hash"])
+        self.hash_columns_b = ', '.join(keys_b + [f"{self.client_b.gen_row_hash(self.diff_columns_b)} AS row_hash"])
+
+    async def compare_data_batch(self, pbar, start_index, batch_size, result: Result):
         # 查询A表数据
         query_a_result = await self.client_a.query(
-            self.query_columns_a,
+            self.hash_columns_a or self.query_columns_a,
             self.kwargs.table_name_a,
             self.kwargs.where_clause_a,
             start_index,
             batch_size
         )
-        # 根据A表数据解析出B表的查询条件
-        keys_a, keys_b, batch_where_clause_b = self._parse_query_condition_in_b(query_a_result)
+        await self.compare_batch_rows(pbar, query_a_result, result)
+
+    async def iter_keyset_batches(self, batch_size, key_range: KeyRange = None, acquire_budget=False):
+        """
+        以键集分页(seek)的方式逐批读取A表。
+        按unique_field排序，以上一批最后一行的键值作为下一批的起点。
+        :param key_range: 唯一键首列的范围，None表示整张表
+        :param acquire_budget: 每次读取时是否占用全局并发额度，调用方已在工作单元内占用时为False
+        """
+        keys_a, _ = self._get_unique_keys()
+        last_key = None
+        while True:
+            async with self.use_budget(acquire_budget):
+                query_a_result = await self.client_a.query_keyset(
+                    self.hash_columns_a or self.query_columns_a,
+                    self.kwargs.table_name_a,
+                    keys_a,
+                    self.kwargs.where_clause_a,
+                    last_key,
+                    batch_size,
+                    key_range
+                )
+            if not query_a_result:
+                return
+            last_key = [query_a_result[-1][k] for k in keys_a]
+            yield query_a_result
+            if len(query_a_result) < batch_size:
+                return
+
+    async def compare_data_keyset(self, pbar, semaphore, batch_size):
+        """
+        以键集分页(seek)的方式对比数据。
+        顺序读取A表，每批的B表查询与对比交由协程并发执行，并发数由semaphore控制。
+        """
+        keys_a, _ = self._get_unique_keys()
+        tasks = set()
+
+        async def task(query_a_result):
+            try:
+                # 以每批第一行的键标识该批次，续跑时A表仍会被顺序读取，但已完成批次的B表查询与对比会被跳过
+                unit = f"keyset:{[query_a_result[0][k] for k in keys_a]}"
+                await self.run_unit(pbar, unit, functools.partial(self.compare_batch_rows, pbar, query_a_result))
+            finally:
+                semaphore.release()
+
+        try:
+            # A表的读取不属于任何工作单元，每次读取单独占用全局并发额度
+            async for query_a_result in self.iter_keyset_batches(batch_size, acquire_budget=True):
+                # 控制同时进行对比的批次数，避免A表读取过快堆积过多数据
+                await semaphore.acquire()
+                # 已完成的批次出错时停止读取A表，取消其余批次并抛出该错误
+                for done in [t for t in tasks if t.done()]:
+                    tasks.discard(done)
+                    if not done.cancelled() and done.exception():
+                        semaphore.release()
+                        raise done.exception()
+                tasks.add(asyncio.create_task(task(query_a_result)))
+
+            await asyncio.gather(*tasks)
+        finally:
+            for pending in tasks:
+                pending.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def compare_data_range(self, pbar, key_range: KeyRange, batch_size, result: Result):
+        """
+        顺序对比一个键范围内的数据。
+        """
+        async for query_a_result in self.iter_keyset_batches(batch_size, key_range):
+            await self.compare_batch_rows(pbar, query_a_result, result)
+
+    async def compare_data_checksum(self, pbar, semaphore, planner: RangePlanner, key_range: KeyRange, batch_size,
+                                    result: Result):
+        """
+        以校验和分桶(hashdiff)的方式对比一个键范围。
+        两端在数据库中计算该范围的行数与校验和，一致则整个范围跳过；不一致时继续切分为子范围递归对比，
+        直到行数不超过checksum_leaf_size，才拉取整行逐行对比。
+        每次查询同时占用semaphore与全局并发额度，递归等待子范围时不持有任何额度。
+        """
+        keys_a, keys_b = self._get_unique_keys()
+        async with semaphore, self.use_budget():
+            (count_a, checksum_a), (count_b, checksum_b) = await asyncio.gather(
+                self.client_a.get_checksum(self.kwargs.table_name_a, self.diff_columns_a, keys_a[0],
+                                           self.kwargs.where_clause_a, key_range),
+                self.client_b.get_checksum(self.kwargs.table_name_b, self.diff_columns_b, keys_b[0],
+                                           self.kwargs.where_clause_b, key_range)
+            )
+        if count_a == count_b and checksum_a == checksum_b:
+            result.num_diff_row += count_a
+            pbar.update(count_a)
+            return
+
+        if count_a > (self.kwargs.checksum_leaf_size or batch_size):
+            async with semaphore, self.use_budget():
+                sub_ranges = await planner.split(key_range, self.CHECKSUM_FANOUT)
+            if len(sub_ranges) > 1:
+                await asyncio.gather(*[self.compare_data_checksum(pbar, semaphore, planner, sub_range, batch_size,
+                                                                  result)
+                                       for sub_range in sub_ranges])
+                return
+
+        async with semaphore, self.use_budget():
+            if self.kwargs.merge_join:
+                await self.compare_data_merge(pbar, key_range, batch_size, result)
+            else:
+                await self.compare_data_range(pbar, key_range, batch_size, result)
+
+    async def iter_key_groups(self, rows, key_columns):
+        """
+        把有序的行流按唯一键分组，产出 (key, [row, ...])。
+        归并依赖两端的排序与Python的比较一致，发现乱序时直接报错。
+        """
+        group_key, group = None, []
+        async for row in rows:
+            key = tuple(row[k] for k in key_columns)
+            if group and key == group_key:
+                group.append(row)
+                continue
+            if group:
+                if key < group_key:
+                    raise ValueError(f"归并对比要求按唯一键有序，{key} 出现在 {group_key} 之后，"
+                                     f"字符串类型的键请使用二进制排序规则(如 utf8mb4_bin / COLLATE \"C\")")
+                yield group_key, group
+            group_key, group = key, [row]
+        if group:
+            yield group_key, group
+
+    @staticmethod
+    async def _next_group(groups):
+        try:
+            return await groups.__anext__()
+        except StopAsyncIteration:
+            return None, None
+
+    async def compare_data_merge(self, pbar, key_range: KeyRange, batch_size, result: Result):
+        """
+        以归并(merge join)的方式对比一个键范围。
+        两端各打开一个按unique_field排序的服务端游标，一次线性遍历即可得到仅在A表、仅在B表、B表多条以及不一致的行，
+        不需要构造 IN (...) 查询，也不需要为每批数据建立B表结果字典。
+        """
+        keys_a, keys_b = self._get_unique_keys()
+        prefetch = self.kwargs.prefetch or batch_size
+        groups_a = self.iter_key_groups(
+            self.client_a.query_stream(self.query_columns_a, self.kwargs.table_name_a, self.kwargs.where_clause_a,
+                                       key_columns=keys_a, key_range=key_range, prefetch=prefetch),
+            keys_a
+        )
+        groups_b = self.iter_key_groups(
+            self.client_b.query_stream(self.query_columns_b, self.kwargs.table_name_b, self.kwargs.where_clause_b,
+                                       key_columns=keys_b, key_range=key_range, prefetch=prefetch),
+            keys_b
+        )
+
+        # 已对齐的行先放入缓冲区，攒够一批后批量对比
+        matched = []
+
+        async def compare_group(rows_a, rows_b):
+            # batch_plugin与plugin在对比时依次执行，与按批对比的顺序一致
+            for row_a in rows_a:
+                matched.append((row_a, rows_b))
+            if len(matched) >= batch_size:
+                await flush()
+
+        async def flush():
+            # 提交给对比流水线的批次可能尚未处理，使用新的缓冲区而不是清空原列表
+            nonlocal matched
+            if matched:
+                await self.submit_compare_matched(pbar, matched, result)
+            matched = []
+
+        key_a, rows_a = await self._next_group(groups_a)
+        key_b, rows_b = await self._next_group(groups_b)
+        while rows_a is not None or rows_b is not None:
+            if rows_b is None or (rows_a is not None and key_a < key_b):
+                await compare_group(rows_a, [])
+                key_a, rows_a = await self._next_group(groups_a)
+            elif rows_a is None or key_b < key_a:
+                result.add_only_row_in_table_b(' AND '.join([f"{k}={v}" for k, v in zip(keys_b, key_b)]))
+                key_b, rows_b = await self._next_group(groups_b)
+            else:
+                await compare_group(rows_a, rows_b)
+                key_a, rows_a = await self._next_group(groups_a)
+                key_b, rows_b = await self._next_group(groups_b)
+        await flush()
+
+    async def compare_batch_rows(self, pbar, query_a_result, result: Result):
+        """
+        对比一批A表数据: 批量查询B表中对应的行并对比。
+        """
+        if self.hash_columns_a:
+            return await self.compare_batch_hashes(pbar, query_a_result, result)
+        # 根据A表数据解析出B表的查询键
+        _, keys_b, key_values = self._parse_query_condition_in_b(query_a_result)
         # 查询B表数据
         query_b_result = await self.client_b.query_in(
             self.query_columns_b,
             self.kwargs.table_name_b,
-            batch_where_clause_b,
+            keys_b,
+            key_values,
             self.kwargs.where_clause_b
         )
 
-        # 将数据源B的查询结果转换为字典形式
-        query_b_result_dict = self._build_results_dict(query_b_result, keys_b)
-        # 遍历数据源A的查询结果
-        for row_a in query_a_result:
-            if self.kwargs.plugin:
-                row_a = self.kwargs.plugin(row_a)
-            # 生成数据源B的查询条件
-            where_clause_b = ' AND '.join([key + '=' + str(row_a[key]) for key in keys_a])
-            # 生成B表结果对应的key
-            key_b = self._generate_key(row_a, keys_b)
-            # 根据条件从数据源B的结果字典中获取对应行
-            row_b = query_b_result_dict[key_b]
-            # 比较来自两个数据源的行，并更新结果
-            await self.compare_row(row_a, row_b, where_clause_b)
-            # 更新进度条
-            pbar.update(1)
+        # 按唯一键对齐后批量对比，并更新结果与进度条
+        await self.submit_compare(pbar, query_a_result, query_b_result, result)
+
+    async def compare_batch_hashes(self, pbar, hash_rows_a, result: Result):
+        """
+        两阶段对比一批A表数据。
+        第一阶段查询B表中对应键的行哈希，哈希一致的行直接计为相同；
+        第二阶段只为哈希不一致、B表中不存在或存在多条的键拉取两端的整行，按常规方式对比并生成明细。
+        """
+        keys_a, keys_b, key_values = self._parse_query_condition_in_b(hash_rows_a)
+        hash_rows_b = await self.client_b.query_in(self.hash_columns_b, self.kwargs.table_name_b, keys_b,
+                                                   key_values, self.kwargs.where_clause_b)
+        codec_a, codec_b = KeyCodec(keys_a), KeyCodec(keys_b)
+        hashes_b = defaultdict(list)
+        for row_b in hash_rows_b:
+            hashes_b[codec_b.encode(row_b)].append(row_b['row_hash'])
+
+        mismatched = {}
+        encoded_keys = [codec_a.encode(row_a) for row_a in hash_rows_a]
+        for key, row_a in zip(encoded_keys, hash_rows_a):
+            if hashes_b.get(key) != [row_a['row_hash']]:
+                mismatched[key] = tuple(row_a[k] for k in keys_a)
+        # A表中同一个键的所有行都在第二阶段重新读取，不在这里重复计数
+        num_same_rows = sum(1 for key in encoded_keys if key not in mismatched)
+        result.num_diff_row += num_same_rows
+        pbar.update(num_same_rows)
+        if not mismatched:
+            return
 
-        del query_a_result
-        del query_b_result_dict
-        del batch_where_clause_b
+        key_values = list(mismatched.values())
+        rows_a, rows_b = await asyncio.gather(
+            self.client_a.query_in(self.query_columns_a, self.kwargs.table_name_a, keys_a, key_values,
+                                   self.kwargs.where_clause_a),
+            self.client_b.query_in(self.query_columns_b, self.kwargs.table_name_b, keys_b, key_values,
+                                   self.kwargs.where_clause_b)
+        )
+        await self.submit_compare(pbar, rows_a, rows_b, result)
 
-    async def compare_data(self, pbar, start_index, batch_size):
+    async def compare_data(self, pbar, start_index, batch_size, result: Result):
         """
         异步比较两个数据源中指定条件的数据批。
         :param start_index: 数据起始索引，用于分批处理数据。
         :param batch_size: 批处理大小，即每次查询的数据量。
         :return: 返回一个结果报告，包含比较中发现的不同行数。
         """
-        async for row_a in self.client_a.execute_query_generator(
+        keys_a, keys_b = self._get_unique_keys()
+        async for row_a in self.client_a.query_stream(
                 self.query_columns_a,
                 self.kwargs.table_name_a,
                 self.kwargs.where_clause_a,
                 start_index,
-                batch_size
+                batch_size,
+                prefetch=self.kwargs.prefetch or batch_size
         ):
-            where_clause_b = self._parse_where_clause_b(row_a)
-            row_b = await self.client_b.execute_query(self.query_columns_b, self.table_name_b, where_clause_b)
-            await self.compare_row(row_a, row_b, where_clause_b)
+            # 键值以参数绑定，每一行使用相同的SQL文本
+            row_b = await self.client_b.query_key(self.query_columns_b, self.kwargs.table_name_b, keys_b,
+                                                  [row_a[k] for k in keys_a], self.kwargs.where_clause_b)
+            self.comparator.compare_matched([(row_a, row_b)], result)
             pbar.update(1)
 
-    async def compare_row(self, row_a, row_b, where_clause_b):
-        """
-        异步比较两个表中指定行的数据差异，并将差异信息更新到报告中。
-        """
-        self.results.num_diff_row += 1
-
-        # 如果表B中没有找到匹配的记录，则更新报告中仅存在于表A的记录计数和列表，并记录警告日志。
-        if not row_b:
-            self.results.only_row_count_in_table_a += 1
-            self.results.only_rows_in_table_a.append(where_clause_b)
-            # logger.warning(f"在{self.table_name_b}未找到匹配的记录: {where_clause_b}")
-
-        # 如果表B中找到多个匹配的记录，则更新报告中在表B中有更多记录的计数和列表，并记录警告日志，同时比较差异。
-        elif len(row_b) > 1:
-            self.results.excess_row_count_in_table_b += 1
-            self.results.excess_rows_in_table_b.append(where_clause_b)
-            # logger.warning(f"在{self.table_name_b}找到多条匹配记录: {where_clause_b}")
-
-        # 如果表B中找到一个匹配的记录，则进行差异比较。
-        else:
-            # 获取表B中与row_a匹配的行。
-            row_b = row_b[0]
-            # 使用dictdiffer库比较两行数据的差异，并将差异结果转化为列表。
-            differences_generator = dictdiffer.diff(dict(row_a), dict(row_b), ignore=None)
-            differences = list(differences_generator)
-            # 如果存在差异，则更新报告中差异计数和差异列表，并记录警告日志。
-            if len(differences) > 0:
-                self.results.difference_row_count += 1
-                self.results.difference_rows.append((where_clause_b, differences))
-                # logger.warning(f"结果有差异: {differences}")
-
     def start(self):
         start_time = time.perf_counter()
-        result = asyncio.run(self.run_compare())
+
+        # 在常驻的事件循环中执行，之后的对比可以复用本次对比的连接池
+        result = pool_registry.run(self.run_compare())
         # 在控制台打印汇总结果的表格
         console.print()
         console.print(result.get_summary_table())
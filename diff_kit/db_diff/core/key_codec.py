@@ -0,0 +1,117 @@
+# @Project: diff-kit
+# @Time: 2025/2/18 10:22
+# @Author: Alan
+# @File: key_codec
+
+import datetime
+import uuid
+from decimal import Decimal
+from typing import Any, Dict, Hashable, List
+
+
+def _normalize_decimal(value: Decimal):
+    # 整数值的Decimal与int相等且哈希相同，统一为int后 Decimal('1.0')、1、1.0 是同一个键
+    return int(value) if value == value.to_integral_value() else value.normalize()
+
+
+def _normalize_float(value: float):
+    return int(value) if value.is_integer() else value
+
+
+def _normalize_datetime(value: datetime.datetime):
+    # PostgreSQL的timestamptz返回带时区的时间，统一转换为UTC的无时区时间
+    if value.tzinfo is not None:
+        return value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return value
+
+
+class KeyCodec:
+    """
+    唯一键编码。
+    按值的类型把两端的键值归一化后组成可哈希的键: 单列键为值本身，多列键为元组，不再拼接字符串，
+    ("a_b", "c") 与 ("a", "b_c") 不会被视为同一个键；不同数据库返回的同一个键值(如MySQL的int与
+    PostgreSQL的Decimal、bytes与memoryview、UUID与其文本形式)得到相同的键。
+    """
+
+    # 值类型 -> 归一化方法，未列出的类型保持原值
+    NORMALIZERS = {
+        bool: int,
+        Decimal: _normalize_decimal,
+        float: _normalize_float,
+        datetime.datetime: _normalize_datetime,
+        bytearray: bytes,
+        memoryview: bytes,
+        uuid.UUID: str,
+    }
+
+    def __init__(self, key_columns: List[str]):
+        self.key_columns = key_columns
+        self.single = len(key_columns) == 1
+
+    @classmethod
+    def normalize(cls, value: Any) -> Hashable:
+        normalizer = cls.NORMALIZERS.get(type(value))
+        return normalizer(value) if normalizer else value
+
+    def encode_values(self, values) -> Hashable:
+        """
+        编码一组与key_columns一一对应的键值。
+        """
+        if self.single:
+            return self.normalize(values[0])
+        return tuple(map(self.normalize, values))
+
+    def encode(self, row: Dict[str, Any]) -> Hashable:
+        """
+        编码一行数据的唯一键。
+        """
+        if self.single:
+            return self.normalize(row[self.key_columns[0]])
+        return tuple([self.normalize(row[k]) for k in self.key_columns])
+
+    def to_text(self, key: Hashable) -> Hashable:
+        """
+        键的文本形式，两端唯一字段的类型不同(如一端为字符串)时用于兜底匹配。
+        """
+        if self.single:
+            return str(key)
+        return tuple(map(str, key))
+
+
+class KeyIndex:
+    """
+    B表一批数据的唯一键索引。
+    键只映射到行在批次中的下标，重复的键才额外保存其余下标，不再为每个键创建行列表。
+    按类型归一化的键找不到时再按文本形式查找，文本索引只在第一次找不到时创建。
+    """
+
+    def __init__(self, rows: list, codec: KeyCodec):
+        self.rows = rows
+        self.codec = codec
+        self.offsets = {}
+        # 键 -> 除第一行以外的其他行下标
+        self.duplicates = {}
+        # 文本形式 -> 按类型归一化的键
+        self.text_keys = None
+        for offset, row in enumerate(rows):
+            key = codec.encode(row)
+            first = self.offsets.setdefault(key, offset)
+            if first != offset:
+                self.duplicates.setdefault(key, []).append(offset)
+
+    def lookup(self, key: Hashable) -> list:
+        """
+        :return: 与键匹配的行列表
+        """
+        offset = self.offsets.get(key)
+        if offset is None:
+            if self.text_keys is None:
+                self.text_keys = {self.codec.to_text(k): k for k in self.offsets}
+            key = self.text_keys.get(self.codec.to_text(key))
+            if key is None:
+                return []
+            offset = self.offsets[key]
+        duplicates = self.duplicates.get(key)
+        if duplicates is None:
+            return [self.rows[offset]]
+        return [self.rows[offset]] + [self.rows[i] for i in duplicates]
@@ -0,0 +1,69 @@
+# @Project: diff-kit
+# @Time: 2025/2/17 14:05
+# @Author: Alan
+# @File: key_set
+
+from typing import Iterable, List
+
+import numpy as np
+
+from diff_kit.db_diff.core.key_codec import KeyCodec
+
+
+class KeySet:
+    """
+    紧凑的唯一键集合，用于在不保存键字符串的情况下判断B表的键是否存在于A表。
+    每个键编码为一个64位整数: 单列整数键直接使用其值，其他键使用按类型归一化后的哈希值；
+    所有编码分块写入numpy数组，冻结后排序，按批使用二分查找判断是否存在，每个键只占8字节。
+    判定为存在的键不再回A表确认，哈希冲突会让仅在B表的键被误判为存在(漏报)，但不会产生误报；
+    判定为不存在的键仍需精确确认。单列整数键的编码就是键值本身，不会冲突；其他键在A表有n个键时，
+    每个仅在B表的键被漏报的概率约为 n / 2^64(n为10亿时约为5e-11)。
+    """
+
+    def __init__(self, chunk_size: int = 100000):
+        self.chunk_size = chunk_size
+        self.buffer: List[int] = []
+        self.chunks: List[np.ndarray] = []
+        self.codes = None
+
+    @staticmethod
+    def encode(key: tuple) -> int:
+        # 不同数据库返回的键值类型可能不同，先按类型归一化；hash在同一个进程中是稳定的
+        key = tuple(map(KeyCodec.normalize, key))
+        if len(key) == 1 and type(key[0]) is int and -2 ** 63 <= key[0] < 2 ** 63:
+            return key[0]
+        return hash(key)
+
+    def encode_many(self, keys: Iterable[tuple]) -> np.ndarray:
+        return np.fromiter((self.encode(key) for key in keys), dtype=np.int64)
+
+    def add(self, keys: Iterable[tuple]):
+        self.buffer.extend(self.encode(key) for key in keys)
+        if len(self.buffer) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self.chunks.append(np.array(self.buffer, dtype=np.int64))
+            self.buffer = []
+
+    def freeze(self):
+        """
+        写入完成后合并并排序，之后才能查询。
+        """
+        self.flush()
+        self.codes = np.unique(np.concatenate(self.chunks)) if self.chunks else np.empty(0, dtype=np.int64)
+        self.chunks = []
+
+    def __len__(self):
+        return 0 if self.codes is None else len(self.codes)
+
+    def contains(self, keys: List[tuple]) -> np.ndarray:
+        """
+        批量判断键是否(可能)存在，返回布尔数组。
+        """
+        codes = self.encode_many(keys)
+        if len(self.codes) == 0:
+            return np.zeros(len(codes), dtype=bool)
+        positions = np.minimum(np.searchsorted(self.codes, codes), len(self.codes) - 1)
+        return self.codes[positions] == codes
@@ -0,0 +1,158 @@
+# @Project: diff-kit
+# @Time: 2025/2/5 10:21
+# @Author: Alan
+# @File: multi_diff
+
+import asyncio
+import time
+from typing import Dict, List, Optional, Tuple
+
+from rich.table import Table
+
+from diff_kit.db_diff.core.compare_data import DbConfig, DbDiff, DiffParams, console
+from diff_kit.db_diff.core.results import Result
+from diff_kit.db_diff.core.scheduler import run_workers
+from diff_kit.db_diff.db_engine import DbEngine, DbEngineFactory, pool_registry
+from diff_kit.utils.logger import logger
+
+
+class MultiDbDiff:
+    """
+    多表对比。
+    同一个数据库端点只创建一个连接池，所有表共享；各表的工作单元共享max_concurrency个全局并发额度，
+    等待额度的单元先到先得，同时对比的max_tables张表交替推进。
+    """
+
+    def __init__(self, diff_params: Optional[List[DiffParams]] = None, schema_params: Optional[dict] = None,
+                 schema_a: Optional[str] = None, schema_b: Optional[str] = None, max_concurrency: int = 50,
+                 max_tables: int = 4):
+        """
+        :param diff_params: 需要对比的表的参数列表
+        :param schema_params: 整库对比时的公共参数(DiffParams中除表名与unique_field之外的字段)，
+                              对比A库中的所有表，唯一字段使用主键
+        :param schema_a: 整库对比时A库的模式名，MySQL为库名，PostgreSQL默认为public
+        :param schema_b: 整库对比时B库的模式名，默认与schema_a相同
+        :param max_concurrency: 所有表共享的并发工作单元数
+        :param max_tables: 同时对比的表数
+        """
+        if not diff_params and not schema_params:
+            raise ValueError("diff_params与schema_params至少需要指定一个")
+        self.diff_params = list(diff_params or [])
+        self.schema_params = schema_params
+        self.schema_a = schema_a
+        self.schema_b = schema_b or schema_a
+        self.max_concurrency = max_concurrency
+        self.max_tables = max_tables
+        self.clients: Dict[Tuple, DbEngine] = {}
+        self.results: List[Result] = []
+        # 对比失败的表 {表名: 错误}
+        self.errors: Dict[str, Exception] = {}
+
+    async def get_client(self, db_config: DbConfig, db_name: str) -> DbEngine:
+        """
+        按数据库端点获取共享的引擎，第一次使用时从连接池登记表获取。
+        A表与B表可能在同一个端点并同时占用两端的连接(如归并对比)，连接池上限取并发数的两倍，连接按需建立。
+        """
+        key = (db_config.db_type, db_config.host, db_config.port, db_config.user, db_name)
+        if key not in self.clients:
+            factory = DbEngineFactory(db_config.db_type, db=db_name, **db_config.model_dump(exclude={'db_type'}))
+            self.clients[key] = await factory.acquire_db_engine(self.max_concurrency * 2)
+        return self.clients[key]
+
+    async def close_clients(self):
+        for client in self.clients.values():
+            await DbEngineFactory.release_db_engine(client)
+        self.clients = {}
+
+    def map_table_name(self, table_name_a: str) -> str:
+        """
+        把A库的表名映射为B库的表名，只替换模式名。
+        """
+        if self.schema_a and self.schema_b and table_name_a.startswith(f"{self.schema_a}."):
+            return f"{self.schema_b}.{table_name_a[len(self.schema_a) + 1:]}"
+        return table_name_a
+
+    async def discover_tables(self) -> List[DiffParams]:
+        """
+        整库对比: 列出A库中的所有表，按主键作为唯一字段生成每张表的对比参数。
+        B库中不存在的表以及没有主键的表会被跳过。
+        """
+        params = {k: v for k, v in self.schema_params.items()
+                  if k not in ('table_name_a', 'table_name_b', 'unique_field')}
+        params['db_name_b'] = params.get('db_name_b') or params['db_name_a']
+        db_conn_a = DbConfig.model_validate(params['db_conn_a'])
+        db_conn_b = DbConfig.model_validate(params.get('db_conn_b') or params['db_conn_a'])
+        client_a = await self.get_client(db_conn_a, params['db_name_a'])
+        client_b = await self.get_client(db_conn_b, params['db_name_b'])
+        tables_a, tables_b = await asyncio.gather(client_a.get_table_names(self.schema_a),
+                                                  client_b.get_table_names(self.schema_b))
+
+        tables_b = set(tables_b)
+        diff_params = []
+        for table_name_a in tables_a:
+            table_name_b = self.map_table_name(table_name_a)
+            if table_name_b not in tables_b:
+                logger.warning(f"目标库中不存在表{table_name_b}，跳过")
+                continue
+            unique_field = await client_a.get_primary_key(table_name_a)
+            if not unique_field:
+                logger.warning(f"表{table_name_a}没有主键，跳过")
+                continue
+            diff_params.append(DiffParams(**params, table_name_a=table_name_a, table_name_b=table_name_b,
+                                          unique_field=unique_field))
+        logger.info(f"整库对比，共{len(diff_params)}张表")
+        return diff_params
+
+    async def run_compare(self) -> List[Result]:
+        budget = asyncio.Semaphore(self.max_concurrency)
+        try:
+            if self.schema_params:
+                self.diff_params.extend(await self.discover_tables())
+            results: List[Optional[Result]] = [None] * len(self.diff_params)
+
+            async def task(index):
+                params = self.diff_params[index]
+                if params.result_store_path:
+                    # 各表的明细写入各自的文件，不同表共用一个路径时互不覆盖
+                    params = params.model_copy(
+                        update={'result_store_path': f"{params.result_store_path}.table{index}"})
+                try:
+                    client_a = await self.get_client(params.db_conn_a, params.db_name_a)
+                    client_b = await self.get_client(params.db_conn_b or params.db_conn_a,
+                                                     params.db_name_b or params.db_name_a)
+                    results[index] = await DbDiff(params, client_a, client_b, budget).run_compare()
+                except Exception as e:
+                    # 单张表失败不影响其他表
+                    self.errors[params.table_name_a] = e
+
+            await run_workers(range(len(self.diff_params)), task, self.max_tables)
+            self.results = [result for result in results if result is not None]
+            return self.results
+        finally:
+            await self.close_clients()
+
+    def get_summary_table(self, title: str = "多表对比结果") -> Table:
+        table = Table(title=title, highlight=True)
+        for column in ("源表", "目标表", "源表的总数量", "目标表的总数量", "仅在源表的数量", "仅在目标表的数量",
+                       "目标表存在多条的数量", "对比结果不同的数量", "是否一致"):
+            table.add_column(column, justify="center")
+        for result in self.results:
+            table.add_row(str(result.table_name_a), str(result.table_name_b), result.format_count(result.num_table_a),
+                          result.format_count(result.num_table_b), str(result.only_row_count_in_table_a),
+                          str(result.only_row_count_in_table_b), str(result.excess_row_count_in_table_b),
+                          str(result.difference_row_count),
+                          "是" if result.is_success() else "[red]否[/red]")
+        for table_name, error in self.errors.items():
+            table.add_row(table_name, "", "", "", "", "", "", "", f"[red]失败: {error}[/red]")
+        return table
+
+    def start(self) -> List[Result]:
+        start_time = time.perf_counter()
+
+        # 在常驻的事件循环中执行，之后的对比可以复用本次对比的连接池
+        results = pool_registry.run(self.run_compare())
+        console.print()
+        console.print(self.get_summary_table())
+        console.print()
+        logger.info(f"消耗时间: {time.perf_counter() - start_time}")
+        return results
@@ -0,0 +1,249 @@
+# @Project: diff-kit
+# @Time: 2025/2/19 15:40
+# @Author: Alan
+# @File: normalizer
+
+import datetime
+import functools
+import json
+import uuid
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+# 类型名前缀 -> 类型分类，按顺序匹配(timestamp需要在time之前，tinyint(1)需要在tinyint之前，interval需要在int之前)
+category_mapping = [
+    (('tinyint(1)', 'bit(1)', 'bool'), 'bool'),
+    (('decimal', 'numeric'), 'decimal'),
+    (('float', 'double', 'real'), 'float'),
+    (('interval',), 'other'),
+    (('tinyint', 'smallint', 'mediumint', 'bigint', 'int', 'serial', 'bigserial', 'year'), 'integer'),
+    (('timestamp', 'datetime'), 'datetime'),
+    (('date',), 'date'),
+    (('time',), 'time'),
+    (('json',), 'json'),
+    (('uuid',), 'uuid'),
+    (('binary', 'varbinary', 'tinyblob', 'mediumblob', 'longblob', 'blob', 'bytea', 'bit'), 'binary'),
+    (('char', 'varchar', 'tinytext', 'mediumtext', 'longtext', 'text', 'enum', 'set', 'character', 'citext'), 'text'),
+]
+
+NUMERIC_CATEGORIES = {'bool', 'decimal', 'float', 'integer'}
+
+
+def column_category(column_type: str) -> str:
+    """
+    把数据库的列类型(如 varchar(20)、timestamp without time zone)归为对比时使用的类型分类。
+    """
+    column_type = column_type.lower()
+    for prefixes, category in category_mapping:
+        if column_type.startswith(prefixes):
+            return category
+    return 'other'
+
+
+def skip_none(converter: Callable) -> Callable:
+    @functools.wraps(converter)
+    def wrapper(value, *args, **kwargs):
+        return None if value is None else converter(value, *args, **kwargs)
+    return wrapper
+
+
+@skip_none
+def to_float(value):
+    return float(value)
+
+
+@skip_none
+def to_bool(value):
+    # MySQL的BIT(1)返回bytes，b'\x00'需要按整数取值，否则会被视为True
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        value = int.from_bytes(value, 'big')
+    return bool(value)
+
+
+@skip_none
+def to_text(value):
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return bytes(value).decode('utf-8', errors='replace')
+    return value if isinstance(value, str) else str(value)
+
+
+@skip_none
+def to_bytes(value):
+    return bytes(value) if isinstance(value, (bytearray, memoryview)) else value
+
+
+@skip_none
+def to_json(value):
+    if isinstance(value, (bytes, bytearray, memoryview, str)):
+        text = to_text(value)
+        try:
+            return json.loads(text)
+        except ValueError:
+            # 不是合法的JSON(如空字符串)时保留原文本，该行按差异报告而不是中断对比
+            return text
+    return value
+
+
+@skip_none
+def to_uuid_text(value):
+    return str(value).lower() if isinstance(value, (uuid.UUID, str)) else value
+
+
+@skip_none
+def to_timedelta(value):
+    # MySQL的TIME返回timedelta，PostgreSQL返回time
+    if isinstance(value, datetime.time):
+        return datetime.timedelta(hours=value.hour, minutes=value.minute, seconds=value.second,
+                                  microseconds=value.microsecond)
+    return value
+
+
+@skip_none
+def to_naive_datetime(value, precision: Optional[int] = None):
+    """
+    带时区的时间转换为UTC的无时区时间，并按precision截断秒的小数位。
+    """
+    if not isinstance(value, datetime.datetime):
+        return value
+    if value.tzinfo is not None:
+        value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return truncate_fraction(value, precision)
+
+
+@skip_none
+def truncate_fraction(value, precision: Optional[int] = None):
+    """
+    按precision截断时间的秒的小数位，不转换时区。
+    """
+    if not isinstance(value, (datetime.datetime, datetime.time)) or precision is None or precision >= 6:
+        return value
+    unit = 10 ** (6 - precision)
+    return value.replace(microsecond=value.microsecond // unit * unit)
+
+
+@skip_none
+def strip_text(value):
+    return value.strip() if isinstance(value, str) else value
+
+
+@skip_none
+def fold_case(value):
+    return value.casefold() if isinstance(value, str) else value
+
+
+class Chain:
+    """
+    依次执行多个转换，可以序列化后交给进程池。
+    """
+
+    def __init__(self, converters: List[Callable]):
+        self.converters = converters
+
+    def __call__(self, value):
+        for converter in self.converters:
+            value = converter(value)
+        return value
+
+
+class ColumnNormalizer:
+    """
+    按列预先编译的值归一化计划。
+    对比开始前读取两端的列类型，为每一列选定一次转换方法，对比时按批对已对齐的行逐列转换，
+    不再需要为每一行调用plugin处理跨数据库的类型差异(Decimal与float、带时区与不带时区的时间、
+    bytes与str、tinyint(1)与bool、JSON文本与对象等)。
+    """
+
+    def __init__(self, converters: Dict[str, Callable], float_tolerance: Optional[float] = None,
+                 tolerance_columns: Optional[List[str]] = None):
+        """
+        :param converters: {B表列名: 转换方法}，A表的行已按B表的列名取别名
+        :param float_tolerance: 浮点数列允许的绝对误差
+        :param tolerance_columns: 按误差比较的列
+        """
+        self.converters = converters
+        self.float_tolerance = float_tolerance
+        self.tolerance_columns = tolerance_columns or []
+
+    @classmethod
+    def compile(cls, types_a: Dict[str, str], types_b: Dict[str, str], column_mapping: Dict[str, str],
+                float_tolerance: Optional[float] = None, timestamp_precision: Optional[int] = None,
+                trim_strings: bool = False, ignore_case: bool = False,
+                normalize_types: bool = True) -> 'ColumnNormalizer':
+        """
+        :param types_a: A表的列类型 {列名: 类型}
+        :param types_b: B表的列类型
+        :param column_mapping: 参与对比的列 {A表列名: B表列名}
+        :param normalize_types: 是否按类型转换两端的值，为False时只执行各选项本身需要的转换
+        """
+        converters, tolerance_columns = {}, []
+        for column_a, column_b in column_mapping.items():
+            categories = {column_category(types_a.get(column_a, '')), column_category(types_b.get(column_b, ''))}
+            steps = []
+            if categories <= NUMERIC_CATEGORIES:
+                if 'float' in categories:
+                    # 按误差比较时两端都需要转换为float
+                    if normalize_types or float_tolerance:
+                        steps.append(to_float)
+                    if float_tolerance:
+                        tolerance_columns.append(column_b)
+                elif 'bool' in categories and normalize_types:
+                    steps.append(to_bool)
+            elif categories & {'datetime', 'date'}:
+                if normalize_types:
+                    steps.append(functools.partial(to_naive_datetime, precision=timestamp_precision))
+                elif timestamp_precision is not None:
+                    steps.append(functools.partial(truncate_fraction, precision=timestamp_precision))
+            elif 'time' in categories:
+                if normalize_types:
+                    steps.append(to_timedelta)
+            elif 'json' in categories:
+                if normalize_types:
+                    steps.append(to_json)
+            elif 'uuid' in categories:
+                if normalize_types:
+                    steps.append(to_uuid_text)
+            elif 'text' in categories:
+                if normalize_types:
+                    steps.append(to_text)
+                if trim_strings:
+                    steps.append(strip_text)
+                if ignore_case:
+                    steps.append(fold_case)
+            elif 'binary' in categories:
+                if normalize_types:
+                    steps.append(to_bytes)
+
+            if steps:
+                converters[column_b] = steps[0] if len(steps) == 1 else Chain(steps)
+        return cls(converters, float_tolerance, tolerance_columns)
+
+    def apply(self, rows: list) -> List[dict]:
+        """
+        转换一批行，返回新的字典列表。
+        """
+        rows = [dict(row) for row in rows]
+        for column, converter in self.converters.items():
+            for row in rows:
+                if column in row:
+                    row[column] = converter(row[column])
+        return rows
+
+    def is_tolerated(self, difference: tuple) -> bool:
+        """
+        dictdiffer给出的差异是否为浮点数列在误差范围内的变化。
+        """
+        kind, column, values = difference
+        if kind != 'change' or column not in self.tolerance_columns:
+            return False
+        value_a, value_b = values
+        return value_a is not None and value_b is not None and abs(value_a - value_b) <= self.float_tolerance
+
+    def find_different(self, values_a: np.ndarray, values_b: np.ndarray) -> np.ndarray:
+        """
+        按误差比较一列浮点数，返回不一致的布尔数组，两端都为NULL时视为一致。
+        """
+        floats_a = np.array([np.nan if value is None else value for value in values_a], dtype=float)
+        floats_b = np.array([np.nan if value is None else value for value in values_b], dtype=float)
+        same = np.isclose(floats_a, floats_b, rtol=0, atol=self.float_tolerance)
+        return ~(same | (np.isnan(floats_a) & np.isnan(floats_b)))
@@ -0,0 +1,113 @@
+# @Project: diff-kit
+# @Time: 2025/1/22 15:08
+# @Author: Alan
+# @File: pipeline
+
+import asyncio
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Optional
+
+from diff_kit.db_diff.core.comparator import BatchComparator
+from diff_kit.db_diff.core.results import Result
+
+executor_mapping = {
+    'process': ProcessPoolExecutor,
+    'thread': ThreadPoolExecutor
+}
+
+
+def compare_batch(comparator: BatchComparator, rows_a: list, rows_b: list) -> Result:
+    """
+    在进程池/线程池中对齐并对比一批数据，返回这一批的部分结果。
+    """
+    result = Result()
+    comparator.compare(rows_a, rows_b, result)
+    return result
+
+
+def compare_matched_batch(comparator: BatchComparator, matched: list) -> Result:
+    """
+    在进程池/线程池中对比一批已经对齐的数据，返回这一批的部分结果。
+    """
+    result = Result()
+    comparator.compare_matched(matched, result)
+    return result
+
+
+class ComparePipeline:
+    """
+    对比阶段的流水线。
+    读取数据的协程把每批数据放入有界队列后即可继续读取下一批，消费协程把数据交给进程池/线程池完成对齐与对比，
+    返回的部分结果在事件循环中合并到总结果，网络I/O与对比计算互相重叠并可以利用多核。
+    """
+
+    def __init__(self, workers: int, executor_type: str = 'process', queue_size: Optional[int] = None):
+        if executor_type not in executor_mapping:
+            raise ValueError(f'compare_executor: {executor_type} not supported')
+        self.workers = workers
+        self.executor_type = executor_type
+        self.queue_size = queue_size or workers * 2
+        self.executor = None
+        self.queue = None
+        self.consumers = []
+        self.error = None
+
+    @property
+    def is_process(self) -> bool:
+        return self.executor_type == 'process'
+
+    async def start(self):
+        self.executor = executor_mapping[self.executor_type](max_workers=self.workers)
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self.consumers = [asyncio.create_task(self.consume()) for _ in range(self.workers)]
+
+    async def submit(self, pbar, num_rows: int, result: Result, func: Callable, *args, wait: bool = False):
+        """
+        提交一批数据，队列已满时等待，对读取协程形成反压。
+        :param result: 这一批的部分结果合并到的结果
+        :param wait: 是否等待这一批对比完成并合并之后再返回
+        """
+        if self.error:
+            raise self.error
+        done = asyncio.get_running_loop().create_future() if wait else None
+        await self.queue.put((pbar, num_rows, result, func, args, done))
+        if done:
+            await done
+
+    async def consume(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            pbar, num_rows, result, func, args, done = await self.queue.get()
+            try:
+                # 出现错误后只清空队列，避免读取协程阻塞在已满的队列上
+                if self.error is None:
+                    partial_result = await loop.run_in_executor(self.executor, func, *args)
+                    result.merge(partial_result)
+                    pbar.update(num_rows)
+                    if done:
+                        done.set_result(None)
+                elif done:
+                    done.set_exception(self.error)
+            except Exception as e:
+                self.error = e
+                if done:
+                    done.set_exception(e)
+            finally:
+                self.queue.task_done()
+
+    async def join(self):
+        """
+        等待已提交的数据全部对比完成。
+        """
+        await self.queue.join()
+        if self.error:
+            raise self.error
+
+    async def close(self):
+        for consumer in self.consumers:
+            consumer.cancel()
+        await asyncio.gather(*self.consumers, return_exceptions=True)
+        self.consumers = []
+        if self.executor:
+            self.executor.shutdown(wait=True)
+            self.executor = None
@@ -0,0 +1,115 @@
+# @Project: diff-kit
+# @Time: 2025/1/6 10:12
+# @Author: Alan
+# @File: planner
+
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, List, NamedTuple, Optional
+
+from diff_kit.db_diff.db_engine import DbEngine
+from diff_kit.utils.logger import logger
+
+
+class KeyRange(NamedTuple):
+    """
+    唯一键首列上的一个左开右闭区间 (lower, upper]，None表示该侧无边界。
+    """
+    lower: Any = None
+    upper: Any = None
+
+
+class RangePlanner:
+    """
+    按唯一键首列把A表切分为互不相交的键范围。
+    优先使用数据库统计信息中的直方图(分位点)切分，使非均匀分布的键(如雪花ID)也能均匀分配；
+    没有直方图时退化为按MIN/MAX等距切分。
+    """
+
+    # 可以做等距切分的键类型
+    LINEAR_TYPES = (int, float, Decimal, datetime, date)
+
+    def __init__(self, client: DbEngine, table_name: str, key_column: str, where_clause: Optional[str] = None):
+        self.client = client
+        self.table_name = table_name
+        self.key_column = key_column
+        self.where_clause = where_clause
+
+    async def plan(self, num_ranges: int) -> List[KeyRange]:
+        """
+        生成键范围列表。
+        :param num_ranges: 期望切分的范围数
+        """
+        if num_ranges <= 1:
+            return [KeyRange()]
+
+        histogram = await self.client.get_key_histogram(self.table_name, self.key_column)
+        if histogram:
+            split_points = self.split_by_histogram(histogram, num_ranges)
+            logger.info(f"根据直方图统计信息切分键范围: {self.key_column}, 切分点数: {len(split_points)}")
+        else:
+            min_value, max_value = await self.client.get_key_bounds(self.table_name, self.key_column,
+                                                                    self.where_clause)
+            split_points = self.split_linear(min_value, max_value, num_ranges)
+            if min_value is not None and not self.is_linear(min_value):
+                logger.warning(f"唯一键{self.key_column}的类型{type(min_value).__name__}无法按范围切分，将顺序扫描")
+            logger.info(f"根据MIN/MAX切分键范围: {self.key_column}, [{min_value}, {max_value}]")
+
+        return self.to_ranges(split_points)
+
+    async def split(self, key_range: KeyRange, num_ranges: int) -> List[KeyRange]:
+        """
+        把一个键范围按其中实际的MIN/MAX继续等距切分为子范围，无法切分时返回只包含自身的列表。
+        """
+        min_value, max_value = await self.client.get_key_bounds(self.table_name, self.key_column,
+                                                                self.where_clause, key_range)
+        split_points = sorted(set(self.split_linear(min_value, max_value, num_ranges)))
+        lowers = [key_range.lower] + split_points
+        uppers = split_points + [key_range.upper]
+        return [KeyRange(lower, upper) for lower, upper in zip(lowers, uppers)]
+
+    def is_linear(self, value) -> bool:
+        return isinstance(value, self.LINEAR_TYPES) and not isinstance(value, bool)
+
+    @staticmethod
+    def split_by_histogram(histogram: list, num_ranges: int) -> list:
+        """
+        根据直方图选取分位点。
+        :param histogram: [(边界值, 累计占比)]，按边界值升序排列
+        """
+        split_points = []
+        index = 0
+        for i in range(1, num_ranges):
+            quantile = i / num_ranges
+            while index < len(histogram) and histogram[index][1] < quantile:
+                index += 1
+            if index >= len(histogram):
+                break
+            split_points.append(histogram[index][0])
+        return split_points
+
+    def split_linear(self, min_value, max_value, num_ranges: int) -> list:
+        """
+        在[min_value, max_value]之间等距选取切分点。
+        """
+        if min_value is None or max_value is None or min_value == max_value or not self.is_linear(min_value):
+            return []
+
+        step = (max_value - min_value) / num_ranges
+        split_points = []
+        for i in range(1, num_ranges):
+            point = min_value + step * i
+            if isinstance(min_value, int):
+                point = int(point)
+            split_points.append(point)
+        return split_points
+
+    @staticmethod
+    def to_ranges(split_points: list) -> List[KeyRange]:
+        """
+        把切分点转换为互不相交且覆盖全部键空间的范围。
+        """
+        points = sorted(set(split_points))
+        lowers = [None] + points
+        uppers = points + [None]
+        return [KeyRange(lower, upper) for lower, upper in zip(lowers, uppers)]
@@ -0,0 +1,71 @@
+# @Project: diff-kit
+# @Time: 2025/2/10 11:03
+# @Author: Alan
+# @File: pushdown
+
+from typing import Callable, List, Optional
+
+
+class PushdownQuery:
+    """
+    生成在数据库中直接对比同一实例中两张表的SQL，数据库只返回不一致的键与列。
+    两端先各自包装为派生表，唯一键与对比列按位置统一别名为k0、k1...与c0、c1...，
+    列名映射、查询条件都在派生表中处理，外层查询只按位置关联与比较。
+    """
+
+    def __init__(self, distinct_condition: Callable[[str, str], str], table_name_a: str, table_name_b: str,
+                 keys_a: List[str], keys_b: List[str], columns_a: List[str], columns_b: List[str],
+                 where_clause_a: Optional[str] = None, where_clause_b: Optional[str] = None):
+        """
+        :param distinct_condition: 生成NULL安全的不相等判断的函数，由数据库引擎提供
+        :param columns_a: 参与对比的A表列，与columns_b一一对应
+        """
+        self.distinct_condition = distinct_condition
+        self.num_keys = len(keys_a)
+        self.num_columns = len(columns_a)
+        self.table_a = self.derived_table(table_name_a, keys_a, columns_a, where_clause_a)
+        self.table_b = self.derived_table(table_name_b, keys_b, columns_b, where_clause_b)
+
+    @staticmethod
+    def derived_table(table_name: str, keys: List[str], columns: List[str], where_clause: Optional[str]) -> str:
+        select = [f"{key} AS k{i}" for i, key in enumerate(keys)] + \
+                 [f"{column} AS c{i}" for i, column in enumerate(columns)]
+        sql = f"SELECT {', '.join(select)} FROM {table_name}"
+        if where_clause:
+            sql += f" WHERE {where_clause}"
+        return f"({sql})"
+
+    def key_columns(self, alias: str) -> str:
+        return ', '.join([f"{alias}.k{i}" for i in range(self.num_keys)])
+
+    def key_join(self, left: str, right: str) -> str:
+        return ' AND '.join([f"{left}.k{i} = {right}.k{i}" for i in range(self.num_keys)])
+
+    def only_in_table_a_sql(self) -> str:
+        return f"SELECT {self.key_columns('a')} FROM {self.table_a} a " \
+               f"WHERE NOT EXISTS (SELECT 1 FROM {self.table_b} b WHERE {self.key_join('a', 'b')})"
+
+    def only_in_table_b_sql(self) -> str:
+        return f"SELECT {self.key_columns('b')} FROM {self.table_b} b " \
+               f"WHERE NOT EXISTS (SELECT 1 FROM {self.table_a} a WHERE {self.key_join('a', 'b')})"
+
+    def excess_in_table_b_sql(self) -> str:
+        """
+        B表中存在多条匹配记录的A表行。
+        """
+        return f"SELECT {self.key_columns('a')} FROM {self.table_a} a " \
+               f"JOIN (SELECT {self.key_columns('b')} FROM {self.table_b} b GROUP BY {self.key_columns('b')} " \
+               f"HAVING COUNT(*) > 1) d ON {self.key_join('a', 'd')}"
+
+    def difference_sql(self) -> Optional[str]:
+        """
+        按唯一键关联后至少有一列不相等的行，返回键以及两端的对比列(a_c0..., b_c0...)。
+        """
+        if not self.num_columns:
+            return None
+        columns = [f"a.c{i} AS a_c{i}" for i in range(self.num_columns)] + \
+                  [f"b.c{i} AS b_c{i}" for i in range(self.num_columns)]
+        conditions = [self.distinct_condition(f"a.c{i}", f"b.c{i}") for i in range(self.num_columns)]
+        return f"SELECT {self.key_columns('a')}, {', '.join(columns)} " \
+               f"FROM {self.table_a} a JOIN {self.table_b} b ON {self.key_join('a', 'b')} " \
+               f"WHERE {' OR '.join(conditions)}"
@@ -0,0 +1,118 @@
+# @Project: diff-kit
+# @Time: 2025/1/13 14:20
+# @Author: Alan
+# @File: result_store
+
+import abc
+import os
+import pickle
+import sqlite3
+import tempfile
+from collections import defaultdict
+from typing import Any, Iterator, Optional
+
+# 明细的类别
+DIFFERENCE = 'difference'
+ONLY_IN_TABLE_A = 'only_in_table_a'
+ONLY_IN_TABLE_B = 'only_in_table_b'
+EXCESS_IN_TABLE_B = 'excess_in_table_b'
+
+
+class ResultStore(metaclass=abc.ABCMeta):
+    """
+    对比结果明细的存储，计数保存在Result中，明细由存储负责保存和读取。
+    """
+
+    @abc.abstractmethod
+    def append(self, kind: str, item: Any):
+        pass
+
+    @abc.abstractmethod
+    def iter(self, kind: str) -> Iterator[Any]:
+        pass
+
+    def close(self):
+        pass
+
+
+class MemoryResultStore(ResultStore):
+    """
+    明细保存在内存列表中。
+    """
+
+    def __init__(self):
+        self.items = defaultdict(list)
+
+    def append(self, kind: str, item: Any):
+        self.items[kind].append(item)
+
+    def iter(self, kind: str) -> Iterator[Any]:
+        return iter(self.items[kind])
+
+
+class SqliteResultStore(ResultStore):
+    """
+    明细写入SQLite文件，内存中只保留一个写缓冲区，读取时按写入顺序逐条返回。
+    未指定路径时使用临时文件，关闭时删除；指定路径时打开后清空文件中上一次对比的明细。
+    """
+
+    def __init__(self, path: Optional[str] = None, buffer_size: int = 1000):
+        self.is_temp = path is None
+        if self.is_temp:
+            fd, path = tempfile.mkstemp(prefix='diff_kit_', suffix='.sqlite')
+            os.close(fd)
+        self.path = path
+        self.buffer_size = buffer_size
+        self.buffer = []
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode = OFF")
+        self.conn.execute("PRAGMA synchronous = OFF")
+        self.conn.execute("DROP TABLE IF EXISTS details")
+        self.conn.execute("CREATE TABLE details (id INTEGER PRIMARY KEY, kind TEXT, payload BLOB)")
+        self.conn.execute("CREATE INDEX idx_details_kind ON details (kind, id)")
+
+    def append(self, kind: str, item: Any):
+        self.buffer.append((kind, pickle.dumps(item, protocol=pickle.HIGHEST_PROTOCOL)))
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer:
+            return
+        self.conn.executemany("INSERT INTO details (kind, payload) VALUES (?, ?)", self.buffer)
+        self.conn.commit()
+        self.buffer = []
+
+    def iter(self, kind: str) -> Iterator[Any]:
+        self.flush()
+        cursor = self.conn.execute("SELECT payload FROM details WHERE kind = ? ORDER BY id", (kind,))
+        for (payload,) in cursor:
+            yield pickle.loads(payload)
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+        if self.is_temp and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __getstate__(self):
+        # 在进程之间传递时只传递文件路径，由接收方重新连接并负责关闭(删除临时文件)
+        self.flush()
+        return {'is_temp': self.is_temp, 'path': self.path, 'buffer_size': self.buffer_size}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.buffer = []
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+
+
+store_mapping = {
+    'memory': MemoryResultStore,
+    'sqlite': SqliteResultStore
+}
+
+
+def create_result_store(store_type: str = 'memory', **kwargs) -> ResultStore:
+    if store_type not in store_mapping:
+        raise ValueError(f'result_store: {store_type} not supported')
+    return store_mapping[store_type](**kwargs)
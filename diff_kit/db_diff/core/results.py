@@ -3,30 +3,68 @@
 # @Author: Alan
 # @File: results
 
+import math
+from statistics import NormalDist
+from typing import NamedTuple, Optional
+
 from rich.table import Table
+from diff_kit.db_diff.core.result_store import (ResultStore, MemoryResultStore, DIFFERENCE, ONLY_IN_TABLE_A,
+                                                ONLY_IN_TABLE_B, EXCESS_IN_TABLE_B)
+
+
+class SampleEstimate(NamedTuple):
+    """
+    采样对比时按样本估计的整张表的不一致比例。
+    rate: 样本中不一致行的比例
+    lower/upper: 置信区间(Wilson score interval)
+    """
+    rate: float
+    lower: float
+    upper: float
+    confidence: float
+    population: int
+
+    @classmethod
+    def wilson(cls, num_mismatched: int, num_sampled: int, population: int, confidence: float = 0.95):
+        if num_sampled == 0:
+            return cls(0.0, 0.0, 1.0, confidence, population)
+        z = NormalDist().inv_cdf((1 + confidence) / 2)
+        rate = num_mismatched / num_sampled
+        denominator = 1 + z ** 2 / num_sampled
+        center = (rate + z ** 2 / (2 * num_sampled)) / denominator
+        margin = z * math.sqrt(rate * (1 - rate) / num_sampled + z ** 2 / (4 * num_sampled ** 2)) / denominator
+        return cls(rate, max(0.0, center - margin), min(1.0, center + margin), confidence, population)
 
 
 class Result:
     """比较结果"""
 
-    def __init__(self, table_name_a=None, table_name_b=None, num_table_a=0, num_table_b=0) -> None:
+    def __init__(self, table_name_a=None, table_name_b=None, num_table_a=0, num_table_b=0,
+                 store: ResultStore = None) -> None:
         self.table_name_a = table_name_a
         self.table_name_b = table_name_b
         self.num_table_a = num_table_a
         self.num_table_b = num_table_b
         self.num_diff_row = 0
         self.only_row_count_in_table_a = 0
+        self.only_row_count_in_table_b = 0
         self.excess_row_count_in_table_b = 0
         self.difference_row_count = 0
-        self.only_rows_in_table_a = []
-        self.excess_rows_in_table_b = []
-        self.difference_rows = []
+        # 采样对比时的估计，全量对比时为None
+        self.sample_estimate: Optional[SampleEstimate] = None
+        # 计数保存在内存中，明细交给存储，大量不一致时可以落盘
+        self.store = store or MemoryResultStore()
 
     @staticmethod
     def colorize_if(raw_string: str, condition: bool, color: str) -> str:
         # 设置命令行显示颜色
         return f"[{color}]{raw_string}[/{color}]" if condition else raw_string
 
+    @staticmethod
+    def format_count(count) -> str:
+        # 按键范围扫描时默认不统计表的总行数
+        return "未统计" if count is None else str(count)
+
     def get_summary_table(self, title: str = "对比结果") -> Table:
         """
         返回一个汇总结果的表格
@@ -36,9 +74,9 @@ class Result:
         table.add_column("数量", justify="center", width=20)
 
         table.add_row("源表的总数量",
-                      str(self.num_table_a))
+                      self.format_count(self.num_table_a))
         table.add_row("目标表的总数量",
-                      str(self.num_table_b))
+                      self.format_count(self.num_table_b))
         table.add_row("此次对比数量",
                       str(self.num_diff_row))
         table.add_section()
@@ -46,6 +84,10 @@ class Result:
                       self.colorize_if(raw_string=str(self.only_row_count_in_table_a),
                                        condition=self.only_row_count_in_table_a > 0,
                                        color="red"))
+        table.add_row("仅在目标表的数量",
+                      self.colorize_if(raw_string=str(self.only_row_count_in_table_b),
+                                       condition=self.only_row_count_in_table_b > 0,
+                                       color="red"))
         table.add_row("目标表存在多条的数量",
                       self.colorize_if(raw_string=str(self.excess_row_count_in_table_b),
                                        condition=self.excess_row_count_in_table_b > 0,
@@ -55,6 +97,16 @@ class Result:
                       self.colorize_if(raw_string=str(self.difference_row_count),
                                        condition=self.difference_row_count > 0,
                                        color="red"))
+        if self.sample_estimate:
+            estimate = self.sample_estimate
+            table.add_section()
+            table.add_row("估计不一致比例",
+                          self.colorize_if(raw_string=f"{estimate.rate:.4%}", condition=estimate.rate > 0,
+                                           color="red"))
+            table.add_row(f"{estimate.confidence:.0%}置信区间", f"[{estimate.lower:.4%}, {estimate.upper:.4%}]")
+            table.add_row("估计不一致行数",
+                          f"{round(estimate.lower * estimate.population)} ~ "
+                          f"{round(estimate.upper * estimate.population)}")
         return table
 
     def as_summary(self):
@@ -65,22 +117,83 @@ class Result:
             "num_table_b": self.num_table_b,
             "num_diff_row": self.num_diff_row,
             "only_row_count_in_table_a": self.only_row_count_in_table_a,
+            "only_row_count_in_table_b": self.only_row_count_in_table_b,
             "excess_row_count_in_table_b": self.excess_row_count_in_table_b,
             "difference_row_count": self.difference_row_count,
+            **({"sample_estimate": self.sample_estimate._asdict()} if self.sample_estimate else {}),
         }
 
+    def add_only_row_in_table_a(self, where_clause):
+        self.only_row_count_in_table_a += 1
+        self.store.append(ONLY_IN_TABLE_A, where_clause)
+
+    def add_only_row_in_table_b(self, where_clause):
+        self.only_row_count_in_table_b += 1
+        self.store.append(ONLY_IN_TABLE_B, where_clause)
+
+    def add_excess_row_in_table_b(self, where_clause):
+        self.excess_row_count_in_table_b += 1
+        self.store.append(EXCESS_IN_TABLE_B, where_clause)
+
+    def add_difference_row(self, where_clause, differences):
+        self.difference_row_count += 1
+        self.store.append(DIFFERENCE, (where_clause, differences))
+
     def get_only_rows_in_table_a(self):
-        return self.only_rows_in_table_a
+        return self.store.iter(ONLY_IN_TABLE_A)
+
+    def get_only_rows_in_table_b(self):
+        return self.store.iter(ONLY_IN_TABLE_B)
 
     def get_excess_rows_in_table_b(self):
-        return self.excess_rows_in_table_b
+        return self.store.iter(EXCESS_IN_TABLE_B)
 
     def get_difference_rows(self):
-        return self.difference_rows
+        return self.store.iter(DIFFERENCE)
+
+    only_rows_in_table_a = property(get_only_rows_in_table_a)
+    only_rows_in_table_b = property(get_only_rows_in_table_b)
+    excess_rows_in_table_b = property(get_excess_rows_in_table_b)
+    difference_rows = property(get_difference_rows)
+
+    @property
+    def num_mismatched_row(self):
+        """
+        A表中不一致的行数: 仅在A表、B表存在多条以及对比结果不同的行。
+        """
+        return self.only_row_count_in_table_a + self.excess_row_count_in_table_b + self.difference_row_count
+
+    def estimate_from_sample(self, population: int, confidence: float = 0.95):
+        """
+        把此次对比的行视为A表中population行的简单随机样本，估计整张表的不一致比例及其置信区间。
+        """
+        self.sample_estimate = SampleEstimate.wilson(self.num_mismatched_row, self.num_diff_row, population,
+                                                     confidence)
+        return self.sample_estimate
+
+    def merge(self, other: 'Result'):
+        """
+        合并另一个结果(如对比阶段在进程池中产出的部分结果)的计数与明细，表总行数不合并。
+        """
+        self.num_diff_row += other.num_diff_row
+        self.only_row_count_in_table_a += other.only_row_count_in_table_a
+        self.only_row_count_in_table_b += other.only_row_count_in_table_b
+        self.excess_row_count_in_table_b += other.excess_row_count_in_table_b
+        self.difference_row_count += other.difference_row_count
+        for kind in (DIFFERENCE, ONLY_IN_TABLE_A, ONLY_IN_TABLE_B, EXCESS_IN_TABLE_B):
+            for item in other.store.iter(kind):
+                self.store.append(kind, item)
+
+    def close(self):
+        """
+        释放明细存储(如删除临时文件)，生成报告之后调用。
+        """
+        self.store.close()
 
     def is_success(self):
-        if self.num_table_a != self.num_table_b:
+        if self.num_table_a is not None and self.num_table_b is not None and self.num_table_a != self.num_table_b:
             return False
         return self.only_row_count_in_table_a == 0 \
+            and self.only_row_count_in_table_b == 0 \
             and self.excess_row_count_in_table_b == 0 \
             and self.difference_row_count == 0
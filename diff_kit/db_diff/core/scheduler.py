@@ -0,0 +1,34 @@
+# @Project: diff-kit
+# @Time: 2025/1/23 10:47
+# @Author: Alan
+# @File: scheduler
+
+import asyncio
+from typing import Any, Awaitable, Callable, Iterable
+
+
+async def run_workers(jobs: Iterable, worker: Callable[[Any], Awaitable], num_workers: int):
+    """
+    固定数量的协程从任务生成器中按需取出任务执行。
+    任务在被取出时才创建，启动耗时与内存占用与任务总数无关；任一任务出错时取消其余协程并抛出该错误。
+    :param jobs: 任务参数的可迭代对象，建议使用生成器或range
+    :param worker: 执行单个任务的协程函数
+    :param num_workers: 并发执行的协程数
+    """
+    jobs = iter(jobs)
+
+    async def run():
+        # 事件循环是单线程的，多个协程共享同一个迭代器是安全的
+        for job in jobs:
+            await worker(job)
+
+    tasks = [asyncio.create_task(run()) for _ in range(max(num_workers, 1))]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        for task in done:
+            if not task.cancelled() and task.exception():
+                raise task.exception()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,119 @@
+# @Project: diff-kit
+# @Time: 2025/2/12 15:26
+# @Author: Alan
+# @File: sharding
+
+import asyncio
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, List, Optional, Tuple
+
+from diff_kit.db_diff.core.compare_data import DbDiff, DiffParams, console
+from diff_kit.db_diff.core.planner import KeyRange, RangePlanner
+from diff_kit.db_diff.core.results import Result
+from diff_kit.db_diff.core.watermark import Watermark
+from diff_kit.db_diff.db_engine import pool_registry
+from diff_kit.utils.logger import logger
+
+
+def run_shard(params: DiffParams) -> Result:
+    """
+    子进程入口: 在独立的事件循环与连接池中对比一个分片。
+    表的总行数由协调进程统计，分片不再重复统计。
+    """
+    diff = DbDiff(params)
+    diff.count_total_rows = False
+
+    async def main():
+        try:
+            return await diff.run_compare()
+        finally:
+            await pool_registry.close_idle()
+
+    return asyncio.run(main())
+
+
+class ShardedDbDiff:
+    """
+    多进程分片对比。
+    按唯一键首列把A表切分为shards个互不相交的键范围，每个分片在独立的进程中以自己的事件循环与连接池对比，
+    两端都只读取分片范围内的行，最后合并各分片的结果，对比的吞吐量可以随CPU核数扩展。
+    """
+
+    def __init__(self, diff_params: DiffParams):
+        self.kwargs = diff_params
+        self.shards = diff_params.shards
+        self.workers = min(self.shards, os.cpu_count() or 1)
+
+    @staticmethod
+    def shard_params(params: DiffParams, key_range: KeyRange, index: int) -> DiffParams:
+        """
+        生成一个分片的对比参数: 两端的查询条件加上分片的键范围，检查点按分片分别保存。
+        分片的明细使用各自的临时文件，合并后由协调进程删除，只有合并后的结果写入result_store_path。
+        """
+        keys_a, keys_b = DbDiff(params)._get_unique_keys()
+        update = {'shards': 0, 'work_queue_path': None, 'incremental_column': None, 'result_store_path': None}
+        for field, column in (('where_clause_a', keys_a[0]), ('where_clause_b', keys_b[0])):
+            conditions = [f"({getattr(params, field)})"] if getattr(params, field) else []
+            if key_range.lower is not None:
+                conditions.append(f"{column} > {DbDiff._format_literal(key_range.lower)}")
+            if key_range.upper is not None:
+                conditions.append(f"{column} <= {DbDiff._format_literal(key_range.upper)}")
+            update[field] = ' AND '.join(conditions) or None
+        if params.checkpoint_path:
+            update['checkpoint_path'] = f"{params.checkpoint_path}.shard{index}"
+        return params.model_copy(update=update)
+
+    async def prepare(self) -> Tuple[DiffParams, Optional[Watermark], List[KeyRange], Tuple[int, int]]:
+        """
+        在协调进程中统计两表的总行数、切分键范围；增量对比的水位也在这里确定，分片只对比水位之后的行。
+        """
+        diff = DbDiff(self.kwargs)
+        await diff.create_db_conn()
+        try:
+            watermark = await diff.prepare_incremental() if self.kwargs.incremental_column else None
+            keys_a, _ = diff._get_unique_keys()
+            planner = RangePlanner(diff.client_a, diff.kwargs.table_name_a, keys_a[0], diff.kwargs.where_clause_a)
+            key_ranges = await planner.plan(self.shards)
+            row_counts = await diff.get_row_count(is_use_query_condition=False)
+            return diff.kwargs, watermark, key_ranges, row_counts
+        finally:
+            await diff.close_db_conn()
+
+    def run(self) -> Result:
+        params, watermark, key_ranges, (num_table_a, num_table_b) = pool_registry.run(self.prepare())
+        if len(key_ranges) == 1:
+            # 键无法切分(如字符串键且没有直方图、MIN与MAX相同、空表)时不需要启动子进程
+            logger.info("只切分出1个键范围，使用单进程对比")
+            return pool_registry.run(DbDiff(self.kwargs).run_compare())
+        logger.info(f"分片对比: {len(key_ranges)}个分片，{self.workers}个进程")
+
+        with ProcessPoolExecutor(max_workers=min(self.workers, len(key_ranges))) as executor:
+            shard_results = list(executor.map(
+                run_shard, [self.shard_params(params, key_range, i) for i, key_range in enumerate(key_ranges)]))
+        return self.collect(params, watermark, shard_results, num_table_a, num_table_b)
+
+    @staticmethod
+    def collect(params: DiffParams, watermark: Optional[Watermark], shard_results: Iterable[Result],
+                num_table_a: int, num_table_b: int) -> Result:
+        """
+        合并各分片的结果，全部分片完成并且没有发现差异时才保存增量水位。
+        """
+        result = DbDiff(params).create_result(num_table_a=num_table_a, num_table_b=num_table_b)
+        for shard_result in shard_results:
+            result.merge(shard_result)
+            shard_result.close()
+
+        if watermark:
+            DbDiff(params).save_watermark(watermark, result)
+        return result
+
+    def start(self) -> Result:
+        start_time = time.perf_counter()
+        result = self.run()
+        console.print()
+        console.print(result.get_summary_table())
+        console.print()
+        logger.info(f"消耗时间: {time.perf_counter() - start_time}")
+        return result
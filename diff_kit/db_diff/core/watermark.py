@@ -0,0 +1,50 @@
+# @Project: diff-kit
+# @Time: 2025/1/26 09:55
+# @Author: Alan
+# @File: watermark
+
+import pickle
+import sqlite3
+from datetime import datetime
+from typing import Any, NamedTuple, Optional
+
+
+class Watermark(NamedTuple):
+    """
+    一对表的增量对比水位。
+    value: 上次成功对比时变更跟踪列的最大值
+    last_full_sweep: 上次全量对比完成的时间
+    """
+    value: Any = None
+    last_full_sweep: Optional[datetime] = None
+
+
+class WatermarkStore:
+    """
+    增量对比的水位，按 (A表, B表) 保存在SQLite文件中，多张表可以共用同一个文件。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def connect(self):
+        conn = sqlite3.connect(self.path)
+        conn.execute("CREATE TABLE IF NOT EXISTS watermarks (pair TEXT PRIMARY KEY, value BLOB, last_full_sweep BLOB)")
+        return conn
+
+    def load(self, pair: str) -> Optional[Watermark]:
+        conn = self.connect()
+        try:
+            row = conn.execute("SELECT value, last_full_sweep FROM watermarks WHERE pair = ?", (pair,)).fetchone()
+        finally:
+            conn.close()
+        return Watermark(*[pickle.loads(item) for item in row]) if row else None
+
+    def save(self, pair: str, watermark: Watermark):
+        conn = self.connect()
+        try:
+            conn.execute("INSERT OR REPLACE INTO watermarks (pair, value, last_full_sweep) VALUES (?, ?, ?)",
+                         (pair, *[pickle.dumps(item, protocol=pickle.HIGHEST_PROTOCOL) for item in watermark]))
+            conn.commit()
+        finally:
+            conn.close()
@@ -0,0 +1,304 @@
+# @Project: diff-kit
+# @Time: 2025/2/14 10:48
+# @Author: Alan
+# @File: work_queue
+
+import asyncio
+import os
+import pickle
+import socket
+import sqlite3
+import time
+import uuid
+from multiprocessing import Process
+from typing import Iterator, List, Optional, Tuple
+
+from tqdm import tqdm
+
+from diff_kit.db_diff.core.compare_data import DbDiff, DiffParams
+from diff_kit.db_diff.core.planner import KeyRange
+from diff_kit.db_diff.core.results import Result
+from diff_kit.db_diff.core.sharding import ShardedDbDiff
+from diff_kit.db_diff.db_engine import pool_registry
+from diff_kit.utils.logger import logger
+
+PENDING = 'pending'
+LEASED = 'leased'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class WorkQueue:
+    """
+    基于SQLite文件的工作队列，文件放在各主机都能访问并支持文件锁的共享存储上，单机时使用本地文件即可。
+    协调进程发布对比参数与键范围；工作进程以租约的方式领取键范围，租约过期未续约的范围可以被其他工作进程重新领取，
+    完成后把该范围的部分结果(计数与明细)写回队列，由协调进程合并。
+    每次操作使用独立的短连接与事务，不在共享存储上长时间持有锁。
+    """
+
+    def __init__(self, path: str, max_attempts: int = 3, timeout: float = 30):
+        """
+        :param max_attempts: 一个键范围最多被领取的次数，超过后标记为失败
+        :param timeout: 等待其他进程释放文件锁的秒数
+        """
+        self.path = path
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+
+    def connect(self):
+        return sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+
+    def publish(self, params: DiffParams, key_ranges: List[KeyRange], **meta):
+        """
+        重新创建队列，发布对比参数与所有键范围。
+        :param meta: 协调进程需要保存的其他信息，如两表的总行数
+        """
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        conn = self.connect()
+        try:
+            conn.execute("CREATE TABLE meta (name TEXT PRIMARY KEY, value BLOB)")
+            conn.execute("CREATE TABLE tasks (id INTEGER PRIMARY KEY, key_range BLOB, status TEXT, worker TEXT, "
+                         "lease_until REAL, attempts INTEGER DEFAULT 0, error TEXT, result BLOB)")
+            conn.execute("BEGIN")
+            conn.executemany("INSERT INTO meta (name, value) VALUES (?, ?)",
+                             [(name, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+                              for name, value in {'params': params, **meta}.items()])
+            conn.executemany("INSERT INTO tasks (id, key_range, status) VALUES (?, ?, ?)",
+                             [(i, pickle.dumps(key_range, protocol=pickle.HIGHEST_PROTOCOL), PENDING)
+                              for i, key_range in enumerate(key_ranges)])
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    def get_meta(self, name: str):
+        conn = self.connect()
+        try:
+            row = conn.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        finally:
+            conn.close()
+        return pickle.loads(row[0]) if row else None
+
+    def claim(self, worker: str, lease_seconds: float) -> Optional[Tuple[int, KeyRange]]:
+        """
+        领取一个待处理或租约已过期的键范围，返回 (范围编号, 键范围)，没有可领取的范围时返回None。
+        """
+        conn = self.connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            now = time.time()
+            self.reap_expired(conn, now)
+            row = conn.execute("SELECT id, key_range FROM tasks WHERE status = ? OR (status = ? AND lease_until < ?) "
+                               "ORDER BY id LIMIT 1", (PENDING, LEASED, now)).fetchone()
+            if row:
+                conn.execute("UPDATE tasks SET status = ?, worker = ?, lease_until = ?, attempts = attempts + 1 "
+                             "WHERE id = ?", (LEASED, worker, now + lease_seconds, row[0]))
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+        return (row[0], pickle.loads(row[1])) if row else None
+
+    def reap_expired(self, conn, now: float):
+        """
+        租约过期且领取次数已达上限的范围(工作进程多次崩溃)标记为失败，不再重新领取。
+        """
+        conn.execute("UPDATE tasks SET status = ?, error = ? WHERE status = ? AND lease_until < ? AND attempts >= ?",
+                     (FAILED, "租约多次过期", LEASED, now, self.max_attempts))
+
+    def renew(self, task_id: int, worker: str, lease_seconds: float) -> bool:
+        """
+        续约，租约已被其他工作进程接管时返回False。
+        """
+        conn = self.connect()
+        try:
+            cursor = conn.execute("UPDATE tasks SET lease_until = ? WHERE id = ? AND worker = ? AND status = ?",
+                                  (time.time() + lease_seconds, task_id, worker, LEASED))
+            return cursor.rowcount == 1
+        finally:
+            conn.close()
+
+    def complete(self, task_id: int, worker: str, result: Result) -> bool:
+        """
+        写回一个键范围的部分结果，租约已被其他工作进程接管时丢弃并返回False。
+        """
+        conn = self.connect()
+        try:
+            cursor = conn.execute("UPDATE tasks SET status = ?, result = ? WHERE id = ? AND worker = ? AND status = ?",
+                                  (DONE, pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL), task_id, worker,
+                                   LEASED))
+            return cursor.rowcount == 1
+        finally:
+            conn.close()
+
+    def fail(self, task_id: int, worker: str, error: str):
+        """
+        对比出错时交还键范围，领取次数达到上限后标记为失败。
+        """
+        conn = self.connect()
+        try:
+            conn.execute("UPDATE tasks SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END, error = ? "
+                         "WHERE id = ? AND worker = ? AND status = ?",
+                         (self.max_attempts, FAILED, PENDING, error, task_id, worker, LEASED))
+        finally:
+            conn.close()
+
+    def progress(self) -> Tuple[int, int, int, List[str]]:
+        """
+        :return: (已完成数, 失败数, 总数, 失败原因)
+        """
+        conn = self.connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            self.reap_expired(conn, time.time())
+            conn.execute("COMMIT")
+            counts = dict(conn.execute("SELECT status, COUNT(*) FROM tasks GROUP BY status").fetchall())
+            errors = [f"范围{task_id}: {error}" for task_id, error in
+                      conn.execute("SELECT id, error FROM tasks WHERE status = ?", (FAILED,))]
+        finally:
+            conn.close()
+        return counts.get(DONE, 0), counts.get(FAILED, 0), sum(counts.values()), errors
+
+    def is_drained(self) -> bool:
+        """
+        是否已没有待处理或正在处理的键范围。
+        """
+        conn = self.connect()
+        try:
+            row = conn.execute("SELECT COUNT(*) FROM tasks WHERE status IN (?, ?)", (PENDING, LEASED)).fetchone()
+        finally:
+            conn.close()
+        return row[0] == 0
+
+    def results(self) -> Iterator[Result]:
+        conn = self.connect()
+        try:
+            for (payload,) in conn.execute("SELECT result FROM tasks WHERE status = ? ORDER BY id", (DONE,)):
+                yield pickle.loads(payload)
+        finally:
+            conn.close()
+
+
+class QueueWorker:
+    """
+    分布式对比的工作进程，可以在任意能访问队列文件与数据库的主机上启动多个。
+    循环领取键范围并对比，对比期间定期续约，队列中没有待处理的范围后退出。
+    """
+
+    def __init__(self, queue_path: str, worker_id: Optional[str] = None, lease_seconds: float = 300,
+                 poll_interval: float = 5):
+        """
+        :param worker_id: 工作进程标识，默认为 主机名-进程号-随机串
+        :param lease_seconds: 租约时长，工作进程崩溃后其范围在租约过期后被重新领取
+        :param poll_interval: 其他工作进程仍在处理时，等待租约过期的轮询间隔
+        """
+        self.queue = WorkQueue(queue_path)
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+
+    async def keep_lease(self, task_id: int):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            if not self.queue.renew(task_id, self.worker_id, self.lease_seconds):
+                logger.warning(f"范围{task_id}的租约已被其他工作进程接管")
+                return
+
+    async def compare(self, params: DiffParams) -> Result:
+        # 明细随结果写回队列，每个键范围的明细保存在内存中，不读写协调进程的result_store_path
+        diff = DbDiff(params.model_copy(update={'result_store': 'memory', 'result_store_path': None}))
+        # 表的总行数由协调进程统计
+        diff.count_total_rows = False
+        return await diff.run_compare()
+
+    async def run(self) -> int:
+        """
+        :return: 本工作进程完成的键范围数
+        """
+        params = self.queue.get_meta('params')
+        num_completed = 0
+        try:
+            while True:
+                task = self.queue.claim(self.worker_id, self.lease_seconds)
+                if task is None:
+                    if self.queue.is_drained():
+                        return num_completed
+                    await asyncio.sleep(self.poll_interval)
+                    continue
+
+                task_id, key_range = task
+                lease = asyncio.create_task(self.keep_lease(task_id))
+                try:
+                    result = await self.compare(ShardedDbDiff.shard_params(params, key_range, task_id))
+                except Exception as e:
+                    logger.error(f"范围{task_id}对比失败: {e}")
+                    self.queue.fail(task_id, self.worker_id, str(e))
+                    continue
+                finally:
+                    lease.cancel()
+
+                if self.queue.complete(task_id, self.worker_id, result):
+                    num_completed += 1
+                else:
+                    logger.warning(f"范围{task_id}的租约已被其他工作进程接管，丢弃本次结果")
+        finally:
+            await pool_registry.close_idle()
+
+    def start(self) -> int:
+        num_completed = asyncio.run(self.run())
+        logger.info(f"工作进程{self.worker_id}退出，完成的键范围数: {num_completed}")
+        return num_completed
+
+
+def run_queue_worker(queue_path: str):
+    QueueWorker(queue_path).start()
+
+
+class QueueCoordinator(ShardedDbDiff):
+    """
+    分布式对比的协调进程。
+    切分键范围(num_ranges，默认与maxsize相同)并发布到work_queue_path，等待各主机上的QueueWorker全部完成后合并结果；
+    shards大于0时同时在本机启动shards个工作进程。resume时沿用已发布的队列，只等待未完成的范围。
+    """
+
+    def __init__(self, diff_params: DiffParams, poll_interval: float = 5):
+        super().__init__(diff_params)
+        self.queue = WorkQueue(diff_params.work_queue_path)
+        self.shards = diff_params.num_ranges or diff_params.maxsize
+        self.local_workers = diff_params.shards
+        self.poll_interval = poll_interval
+
+    def publish(self):
+        if self.kwargs.resume and os.path.exists(self.queue.path):
+            logger.info(f"沿用已发布的工作队列{self.queue.path}")
+            return
+        params, watermark, key_ranges, row_counts = pool_registry.run(self.prepare())
+        # 工作进程只在有检查点时续跑各自的范围
+        params = params.model_copy(update={'resume': params.resume and bool(params.checkpoint_path)})
+        self.queue.publish(params, key_ranges, watermark=watermark, row_counts=tuple(row_counts))
+        logger.info(f"已发布到工作队列{self.queue.path}，键范围数: {len(key_ranges)}")
+
+    def wait(self):
+        done, failed, total, errors = self.queue.progress()
+        with tqdm(total=total, initial=done, desc="分布式对比", unit="range", ncols=160) as pbar:
+            while done + failed < total:
+                time.sleep(self.poll_interval)
+                last_done = done
+                done, failed, total, errors = self.queue.progress()
+                pbar.update(done - last_done)
+        if errors:
+            raise RuntimeError(f"以下键范围对比失败: {'; '.join(errors)}")
+
+    def run(self) -> Result:
+        self.publish()
+        processes = [Process(target=run_queue_worker, args=(self.queue.path,)) for _ in range(self.local_workers)]
+        for process in processes:
+            process.start()
+        try:
+            self.wait()
+        finally:
+            for process in processes:
+                process.join()
+
+        num_table_a, num_table_b = self.queue.get_meta('row_counts')
+        return self.collect(self.queue.get_meta('params'), self.queue.get_meta('watermark'), self.queue.results(),
+                            num_table_a, num_table_b)
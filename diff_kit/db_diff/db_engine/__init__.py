@@ -5,6 +5,7 @@
 from diff_kit.db_diff.db_engine.abc import DbEngine
 from diff_kit.db_diff.db_engine.mysql import AsyncMysqlDbEngine
 from diff_kit.db_diff.db_engine.pgsql import AsyncPgEngine
+from diff_kit.db_diff.db_engine.registry import PoolRegistry, pool_registry
 
 db_mapping = {
     'mysql': AsyncMysqlDbEngine,
@@ -19,6 +20,17 @@ class DbEngineFactory(object):
     def create_db_engine(self) -> DbEngine:
         db_engine = self.get_db_engine(self.db_type)
         return db_engine(**self.kwargs)
+
+    async def acquire_db_engine(self, maxsize: int) -> DbEngine:
+        """
+        从连接池登记表获取引擎，相同的地址、账号与库名复用同一个连接池，用完后调用release_db_engine释放。
+        """
+        return await pool_registry.acquire(self, maxsize)
+
+    @staticmethod
+    async def release_db_engine(db_engine: DbEngine):
+        await pool_registry.release(db_engine)
+
     @staticmethod
     def get_db_engine(db_type):
         if db_type not in db_mapping:
@@ -7,6 +7,9 @@ import abc
 
 
 class DbEngine(metaclass=abc.ABCMeta):
+    # 同一个实例中是否可以跨库查询
+    CROSS_DATABASE_QUERY = False
+
     def __init__(self, host, port, user, password, db):
         self.host = host
         self.port = port
@@ -28,7 +31,21 @@ class DbEngine(metaclass=abc.ABCMeta):
         pass
 
     @abc.abstractmethod
-    def query_in(self, columns, table_mame, values):
+    def query_keyset(self, columns, table_name, key_columns, where_clause=None, last_key=None, batch_size=None,
+                     key_range=None):
+        pass
+
+    @abc.abstractmethod
+    def query_stream(self, columns, table_name, where_clause=None, start_index=None, batch_size=None,
+                     key_columns=None, key_range=None, prefetch=1000):
+        pass
+
+    @abc.abstractmethod
+    def query_in(self, columns, table_name, key_columns, keys, extend=None):
+        pass
+
+    @abc.abstractmethod
+    def query_key(self, columns, table_name, key_columns, key, extend=None):
         pass
 
     @abc.abstractmethod
@@ -36,5 +53,51 @@ class DbEngine(metaclass=abc.ABCMeta):
         pass
 
     @abc.abstractmethod
-    def get_table_columns(self, table_name):
+    def get_table_columns(self, table_name, with_types=False):
+        pass
+
+    @abc.abstractmethod
+    def get_key_bounds(self, table_name, key_column, where_clause=None, key_range=None):
+        pass
+
+    @abc.abstractmethod
+    def gen_row_hash(self, columns):
+        pass
+
+    @abc.abstractmethod
+    def get_checksum(self, table_name, columns, key_column, where_clause=None, key_range=None):
+        pass
+
+    @abc.abstractmethod
+    def get_key_histogram(self, table_name, key_column):
+        pass
+
+    @abc.abstractmethod
+    def estimate_row_count(self, table_name):
+        pass
+
+    @abc.abstractmethod
+    def query_sample(self, columns, table_name, key_columns, rate, num_rows, where_clause=None, prefetch=1000):
+        pass
+
+    @abc.abstractmethod
+    def execute_stream(self, query_sql, values=None, prefetch=1000):
+        pass
+
+    @abc.abstractmethod
+    def gen_distinct_condition(self, left, right):
+        pass
+
+    def qualify_table_name(self, table_name, db_name):
+        """
+        在同一个实例中跨库查询时为表名加上库名。
+        """
+        return table_name
+
+    @abc.abstractmethod
+    def get_table_names(self, schema_name=None):
+        pass
+
+    @abc.abstractmethod
+    def get_primary_key(self, table_name):
         pass
@@ -4,6 +4,7 @@
 # @File: common
 
 import functools
+import inspect
 
 from diff_kit.utils.logger import logger
 
@@ -16,6 +17,19 @@ class DBException(Exception):
 
 
 def handle_db_exception(func):
+    # 只装饰直接访问数据库的方法，被装饰的方法之间不相互调用，避免同一个异常被重复包装
+    # 流式查询为异步生成器，需要在迭代过程中捕获异常
+    if inspect.isasyncgenfunction(func):
+        @functools.wraps(func)
+        async def generator_wrapper(self, *args, **kwargs):
+            try:
+                async for item in func(self, *args, **kwargs):
+                    yield item
+            except Exception as e:
+                logger.error(f"执行参数：{args}, {kwargs}")
+                raise DBException(e)
+        return generator_wrapper
+
     @functools.wraps(func)
     async def wrapper(self, *args, **kwargs):
         try:
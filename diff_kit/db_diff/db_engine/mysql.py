@@ -4,6 +4,8 @@
 # @File: mysql
 
 
+import json
+import random
 import aiomysql
 
 from diff_kit.db_diff.db_engine.abc import DbEngine
@@ -11,6 +13,9 @@ from diff_kit.db_diff.db_engine.exception import handle_db_exception
 
 
 class AsyncMysqlDbEngine(DbEngine):
+    CROSS_DATABASE_QUERY = True
+    # 采样时补充探测的最大轮数
+    SAMPLE_MAX_ROUNDS = 10
 
     def __init__(self, host, port, user, password, db):
         super().__init__(host, port, user, password, db)
@@ -29,49 +34,218 @@ class AsyncMysqlDbEngine(DbEngine):
         self.pool.close()
         await self.pool.wait_closed()
 
-    def gen_query_sql(self, columns, table_mame, where_clause=None, start_index=None, limit=None):
+    @staticmethod
+    def escape_percent(where_clause):
         """
-        生成指定条件的SQL查询语句。
+        绑定参数时aiomysql会对SQL做%格式化，用户条件中的%需要转义为%%。
         """
+        return where_clause.replace('%', '%%') if where_clause else where_clause
+
+    def gen_query_sql(self, columns, table_mame, where_clause=None, start_index=None, limit=None, values=None):
+        """
+        生成指定条件的SQL查询语句，返回 (SQL, 参数)。
+        分页参数以占位符绑定，不同批次的SQL文本相同；values为where_clause中占位符的参数，为None时转义where_clause中的%。
+        """
+        if values is None:
+            where_clause = self.escape_percent(where_clause)
+        values = list(values or [])
         # 构造基本的SQL查询语句
         query_sql = f"SELECT {columns} FROM {table_mame}"
         if where_clause:
             query_sql += f" WHERE {where_clause}"
         # 如果指定了分页参数，则在SQL语句中添加LIMIT子句
         if start_index is not None and limit is not None:
-            query_sql += f" LIMIT {start_index}, {limit}"
-        return query_sql
+            query_sql += " LIMIT %s, %s"
+            values.extend([start_index, limit])
+        return query_sql, values
+
+    def gen_range_conditions(self, key_column, key_range, values: list):
+        """
+        生成唯一键首列范围 lower < key <= upper 的查询条件，参数依次追加到values中。
+        """
+        conditions = []
+        if key_range is None:
+            return conditions
+        lower, upper = key_range
+        if lower is not None:
+            conditions.append(f"{key_column} > %s")
+            values.append(lower)
+        if upper is not None:
+            conditions.append(f"{key_column} <= %s")
+            values.append(upper)
+        return conditions
+
+    def gen_keyset_sql(self, columns, table_name, key_columns, where_clause=None, last_key=None, limit=None,
+                       key_range=None):
+        """
+        生成键集分页(seek)的SQL查询语句。
+        以上一批最后一行的键值作为起点: WHERE (k1, k2) > (%s, %s) ORDER BY k1, k2 LIMIT n，
+        每批的代价与所处的位置无关。
+        key_range: (lower, upper)，限定唯一键首列的范围 lower < k1 <= upper，None表示无边界。
+        """
+        conditions, values = [], []
+        if where_clause:
+            conditions.append(f"({self.escape_percent(where_clause)})")
+        conditions.extend(self.gen_range_conditions(key_columns[0], key_range, values))
+        if last_key is not None:
+            placeholders = ', '.join(['%s'] * len(key_columns))
+            conditions.append(f"({', '.join(key_columns)}) > ({placeholders})")
+            values.extend(last_key)
+
+        query_sql = f"SELECT {columns} FROM {table_name}"
+        if conditions:
+            query_sql += " WHERE " + " AND ".join(conditions)
+        query_sql += f" ORDER BY {', '.join(key_columns)}"
+        if limit is not None:
+            query_sql += " LIMIT %s"
+            values.append(limit)
+        return query_sql, values
+
+    async def query_stream(self, columns, table_name, where_clause=None, start_index=None, batch_size=None,
+                           key_columns=None, key_range=None, prefetch=1000):
+        """
+        使用服务端游标(SSDictCursor)流式读取数据，每次只从服务端取prefetch行，内存占用与结果集大小无关。
+        指定key_columns时按唯一键排序，并可以用key_range限定唯一键首列的范围。
+        """
+        if key_columns:
+            query_sql, values = self.gen_keyset_sql(columns, table_name, key_columns, where_clause,
+                                                    key_range=key_range)
+        else:
+            query_sql, values = self.gen_query_sql(columns, table_name, where_clause, start_index, batch_size)
+        async for row in self.execute_stream(query_sql, values, prefetch):
+            yield row
+
+    async def query_sample(self, columns, table_name, key_columns, rate, num_rows, where_clause=None,
+                           prefetch=1000):
+        """
+        随机采样约num_rows行。
+        唯一键首列为整数时在[MIN, MAX]中随机取探测点，每个探测点通过索引定位到第一个不小于它的行，
+        每prefetch个探测点生成、排序后以UNION ALL合并为一条语句，不在内存中一次性生成全部探测点；
+        重复命中的行只返回一次，样本不足num_rows行时继续补充探测，最多SAMPLE_MAX_ROUNDS轮。
+        键分布接近连续时近似于简单随机抽样。
+        其他类型的键退化为 RAND() < rate 的服务端过滤，需要扫描全表，但只传输样本。
+        """
+        key_column = key_columns[0]
+        min_value, max_value = await self.get_key_bounds(table_name, key_column, where_clause)
+        if not (isinstance(min_value, int) and isinstance(max_value, int)):
+            query_sql = f"SELECT {columns} FROM {table_name} WHERE RAND() < %s"
+            if where_clause:
+                query_sql += f" AND ({self.escape_percent(where_clause)})"
+            async for row in self.execute_stream(query_sql, [rate], prefetch):
+                yield row
+            return
+
+        condition = f"{key_column} >= %s"
+        if where_clause:
+            condition += f" AND ({self.escape_percent(where_clause)})"
+        probe_sql = f"SELECT {columns} FROM {table_name} WHERE {condition} ORDER BY {', '.join(key_columns)} LIMIT 1"
+        seen = set()
+        for round_index in range(self.SAMPLE_MAX_ROUNDS):
+            # 补充探测时重复命中的比例越来越高，每一轮的探测点数翻倍，达到目标后不再返回
+            num_probes = (num_rows - len(seen)) * 2 ** round_index
+            for start in range(0, num_probes, prefetch):
+                if len(seen) >= num_rows:
+                    return
+                num_values = min(prefetch, num_probes - start)
+                values = sorted(random.randint(min_value, max_value) for _ in range(num_values))
+                query_sql = ' UNION ALL '.join([f"SELECT * FROM ({probe_sql}) AS p{i}" for i in range(len(values))])
+                async for row in self.execute_stream(query_sql, values, prefetch):
+                    key = tuple(row[k] for k in key_columns)
+                    if key not in seen and len(seen) < num_rows:
+                        seen.add(key)
+                        yield row
+            if len(seen) >= num_rows:
+                return
+
+    @handle_db_exception
+    async def execute_stream(self, query_sql, values=None, prefetch=1000):
+        """
+        使用服务端游标执行任意查询并逐行返回。
+        """
+        async with self.pool.acquire() as conn:
+            async with conn.cursor(aiomysql.SSDictCursor) as cur:
+                await cur.execute(query_sql, tuple(values) if values is not None else None)
+                while True:
+                    rows = await cur.fetchmany(prefetch)
+                    if not rows:
+                        break
+                    for row in rows:
+                        yield row
+
+    @staticmethod
+    def gen_distinct_condition(left, right):
+        """
+        NULL安全的不相等判断，NULL与NULL视为相等。
+        """
+        return f"NOT ({left} <=> {right})"
+
+    def qualify_table_name(self, table_name, db_name):
+        if '.' in table_name or db_name == self.db:
+            return table_name
+        return f"{db_name}.{table_name}"
 
     @handle_db_exception
-    async def query_generator(self, columns, table_mame, where_clause=None, start_index=None, batch_size=None):
-        query_sql = self.gen_query_sql(columns, table_mame, where_clause, start_index, batch_size)
+    async def query(self, columns, table_mame, where_clause=None, start_index=None, batch_size=None, values=None):
+        query_sql, values = self.gen_query_sql(columns, table_mame, where_clause, start_index, batch_size, values)
         async with self.pool.acquire() as conn:
             async with conn.cursor(aiomysql.DictCursor) as cur:
-                await cur.execute(query_sql)
-                async for row in cur:
-                    yield row
+                await cur.execute(query_sql, tuple(values))
+                return await cur.fetchall()
 
     @handle_db_exception
-    async def query(self, columns, table_mame, where_clause=None, start_index=None, batch_size=None, values=None):
-        query_sql = self.gen_query_sql(columns, table_mame, where_clause, start_index, batch_size)
+    async def query_keyset(self, columns, table_name, key_columns, where_clause=None, last_key=None,
+                           batch_size=None, key_range=None):
+        query_sql, values = self.gen_keyset_sql(columns, table_name, key_columns, where_clause, last_key, batch_size,
+                                                key_range)
         async with self.pool.acquire() as conn:
             async with conn.cursor(aiomysql.DictCursor) as cur:
-                await cur.execute(query_sql, values)
+                await cur.execute(query_sql, tuple(values))
                 return await cur.fetchall()
 
     @handle_db_exception
-    async def query_in(self, columns, table_name, query_data: dict, extend: str = None) -> dict:
-        query_sql = f"SELECT {columns} FROM {table_name} "
-        where_clause = "WHERE " + ' AND '.join([f"{k} IN %s" for k in query_data.keys()])
+    async def query_in(self, columns, table_name, key_columns, keys, extend: str = None):
+        """
+        按唯一键精确查询一批行: 单列时为 k IN (%s, ...)，多列时为行值比较 (k1, k2) IN ((%s, %s), ...)，
+        不会像每列各自IN那样返回笛卡尔积的超集。
+        :param keys: 唯一键值的列表，每个元素是与key_columns一一对应的元组
+        """
+        if not keys:
+            return []
+        if len(key_columns) == 1:
+            condition = f"{key_columns[0]} IN ({', '.join(['%s'] * len(keys))})"
+            values = [key[0] for key in keys]
+        else:
+            row_placeholder = f"({', '.join(['%s'] * len(key_columns))})"
+            condition = f"({', '.join(key_columns)}) IN ({', '.join([row_placeholder] * len(keys))})"
+            values = [value for key in keys for value in key]
+        query_sql = f"SELECT {columns} FROM {table_name} WHERE {condition}"
         if extend:
-            where_clause += " AND " + extend
-        values = [tuple(v) for v in query_data.values()]
-        query_sql += where_clause
+            query_sql += f" AND ({self.escape_percent(extend)})"
         async with self.pool.acquire() as conn:
             async with conn.cursor(aiomysql.DictCursor) as cur:
                 await cur.execute(query_sql, values)
                 return await cur.fetchall()
 
+    @handle_db_exception
+    async def query_key(self, columns, table_name, key_columns, key, extend: str = None):
+        """
+        按一个唯一键查询B表中的行，键值以参数绑定，NULL使用IS NULL匹配。
+        """
+        conditions, values = [], []
+        for key_column, value in zip(key_columns, key):
+            if value is None:
+                conditions.append(f"{key_column} IS NULL")
+            else:
+                conditions.append(f"{key_column} = %s")
+                values.append(value)
+        if extend:
+            conditions.append(f"({self.escape_percent(extend)})")
+        query_sql = f"SELECT {columns} FROM {table_name} WHERE {' AND '.join(conditions)}"
+        async with self.pool.acquire() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cur:
+                await cur.execute(query_sql, tuple(values))
+                return await cur.fetchall()
+
     @handle_db_exception
     async def get_row_count(self, table_name, where_clause=None):
         query = f"SELECT COUNT(*) FROM {table_name}"
@@ -85,10 +259,129 @@ class AsyncMysqlDbEngine(DbEngine):
                 return row_count
 
     @handle_db_exception
-    async def get_table_columns(self, table_name):
+    async def get_table_columns(self, table_name, with_types=False):
+        """
+        :param with_types: 是否同时返回列类型，为True时返回 {列名: 类型}
+        """
         query = f"SHOW COLUMNS FROM {table_name}"
         async with self.pool.acquire() as conn:
             async with conn.cursor() as cur:
                 await cur.execute(query)
-                columns = [column[0] for column in await cur.fetchall()]
+                rows = await cur.fetchall()
+                if with_types:
+                    return {column[0]: column[1] for column in rows}
+                columns = [column[0] for column in rows]
                 return columns
+
+    @handle_db_exception
+    async def get_key_bounds(self, table_name, key_column, where_clause=None, key_range=None):
+        values = []
+        conditions = [f"({self.escape_percent(where_clause)})"] if where_clause else []
+        conditions.extend(self.gen_range_conditions(key_column, key_range, values))
+        query = f"SELECT MIN({key_column}), MAX({key_column}) FROM {table_name}"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        async with self.pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(query, tuple(values))
+                return await cur.fetchone()
+
+    @staticmethod
+    def gen_row_hash(columns):
+        """
+        生成行哈希的SQL表达式: 各列转为文本后先各自取MD5(NULL记为N)，再以|拼接后取MD5，与PostgreSQL引擎的算法一致。
+        每列的MD5是定长的十六进制文本，不含分隔符，列值中的|或与NULL相同的文本不会让不同的行得到相同的哈希。
+        """
+        row_text = "CONCAT_WS('|', " + ", ".join([f"COALESCE(MD5(CAST({c} AS CHAR)), 'N')" for c in columns]) + ")"
+        return f"MD5({row_text})"
+
+    @handle_db_exception
+    async def get_checksum(self, table_name, columns, key_column, where_clause=None, key_range=None):
+        """
+        在数据库端计算一个键范围内的行数与校验和，返回 (count, checksum)。
+        每行取行哈希的前15位十六进制转为整数后求和，与行的顺序无关，
+        并且与PostgreSQL引擎的算法一致，不同引擎之间也可以直接比较。
+        """
+        row_hash = self.gen_row_hash(columns)
+        values = []
+        conditions = [f"({self.escape_percent(where_clause)})"] if where_clause else []
+        conditions.extend(self.gen_range_conditions(key_column, key_range, values))
+        query = f"SELECT COUNT(*), COALESCE(SUM(CAST(CONV(SUBSTRING({row_hash}, 1, 15), 16, 10) AS UNSIGNED)), 0) " \
+                f"FROM {table_name}"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        async with self.pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(query, tuple(values))
+                count, checksum = await cur.fetchone()
+                return count, int(checksum)
+
+    @handle_db_exception
+    async def get_key_histogram(self, table_name, key_column):
+        """
+        读取MySQL 8的列直方图(ANALYZE TABLE ... UPDATE HISTOGRAM)，返回[(边界值, 累计占比)]。
+        只使用数值类型的边界，没有直方图时返回空列表。
+        """
+        schema_name = self.db
+        if '.' in table_name:
+            schema_name, table_name = table_name.split('.')
+        query = "SELECT HISTOGRAM FROM information_schema.COLUMN_STATISTICS " \
+                "WHERE SCHEMA_NAME = %s AND TABLE_NAME = %s AND COLUMN_NAME = %s"
+        async with self.pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                try:
+                    await cur.execute(query, (schema_name, table_name, key_column))
+                except aiomysql.Error:
+                    # MySQL 8 以下没有 COLUMN_STATISTICS
+                    return []
+                result = await cur.fetchone()
+        if not result:
+            return []
+
+        histogram = json.loads(result[0]) if isinstance(result[0], (str, bytes)) else result[0]
+        # equi-height: [lower, upper, cumulative_frequency, num_distinct]; singleton: [value, cumulative_frequency]
+        bounds = [(bucket[1], bucket[2]) if len(bucket) == 4 else (bucket[0], bucket[1])
+                  for bucket in histogram.get('buckets', [])]
+        if not all(isinstance(value, (int, float)) for value, _ in bounds):
+            return []
+        return bounds
+
+    @handle_db_exception
+    async def estimate_row_count(self, table_name):
+        """
+        根据information_schema中的统计信息估算表的行数，不扫描表。
+        """
+        schema_name = self.db
+        if '.' in table_name:
+            schema_name, table_name = table_name.split('.')
+        query = "SELECT TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s"
+        async with self.pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(query, (schema_name, table_name))
+                result = await cur.fetchone()
+                return result[0] if result and result[0] is not None else None
+
+    @handle_db_exception
+    async def get_table_names(self, schema_name=None):
+        """
+        获取库中所有的表名，指定schema_name时返回 schema_name.表名。
+        """
+        query = "SELECT TABLE_NAME FROM information_schema.TABLES WHERE TABLE_SCHEMA = %s " \
+                "AND TABLE_TYPE = 'BASE TABLE' ORDER BY TABLE_NAME"
+        async with self.pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(query, (schema_name or self.db,))
+                names = [row[0] for row in await cur.fetchall()]
+        return [f"{schema_name}.{name}" for name in names] if schema_name else names
+
+    @handle_db_exception
+    async def get_primary_key(self, table_name):
+        """
+        获取表的主键列，按在主键中的顺序返回，没有主键时返回空列表。
+        """
+        query = f"SHOW KEYS FROM {table_name} WHERE Key_name = 'PRIMARY'"
+        async with self.pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(query)
+                # Seq_in_index在第4列，Column_name在第5列
+                return [row[4] for row in sorted(await cur.fetchall(), key=lambda row: row[3])]
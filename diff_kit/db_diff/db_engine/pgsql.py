@@ -7,10 +7,14 @@ import asyncpg
 from diff_kit.db_diff.db_engine.abc import DbEngine
 from diff_kit.db_diff.db_engine.exception import handle_db_exception
 
+STATEMENT_CACHE_SIZE = 256
+
 
 class AsyncPgEngine(DbEngine):
     def __init__(self, host, port, user, password, db):
         super().__init__(host, port, user, password, db)
+        # 表的列类型 {表名: {列名: 类型}}
+        self.column_types = {}
 
     async def create_pool(self, max_size=10):
         self.pool = await asyncpg.create_pool(
@@ -19,41 +23,195 @@ class AsyncPgEngine(DbEngine):
             database=self.db,
             host=self.host,
             port=self.port,
-            max_size=max_size
+            # 连接按需建立，与aiomysql的minsize=1一致
+            min_size=1,
+            max_size=max_size,
+            # 每个连接缓存的预备语句数，对比过程中SQL文本固定，语句只解析与生成计划一次
+            statement_cache_size=STATEMENT_CACHE_SIZE
         )
 
     async def close(self):
         await self.pool.close()
 
-    def gen_query_sql(self, columns, table_mame, where_clause=None, start_index=None, limit=None):
+    def gen_query_sql(self, columns, table_mame, where_clause=None, start_index=None, limit=None, values=None):
         """
-        生成指定条件的SQL查询语句。
+        生成指定条件的SQL查询语句，返回 (SQL, 参数)。
+        分页参数以占位符绑定并追加在values之后，不同批次的SQL文本相同，可以复用连接上缓存的预备语句。
         """
+        values = list(values or [])
         # 构造基本的SQL查询语句
         query_sql = f"SELECT {columns} FROM {table_mame}"
         if where_clause:
             query_sql += f" WHERE {where_clause}"
         # 如果指定了分页参数，则在SQL语句中添加LIMIT子句
         if start_index is not None and limit is not None:
-            query_sql += f" LIMIT {limit} OFFSET {start_index}"
-        return query_sql
+            query_sql += f" LIMIT ${len(values) + 1} OFFSET ${len(values) + 2}"
+            values.extend([limit, start_index])
+        return query_sql, values
+
+    def gen_range_conditions(self, key_column, key_range, values: list):
+        """
+        生成唯一键首列范围 lower < key <= upper 的查询条件，参数依次追加到values中。
+        """
+        conditions = []
+        if key_range is None:
+            return conditions
+        lower, upper = key_range
+        if lower is not None:
+            values.append(lower)
+            conditions.append(f"{key_column} > ${len(values)}")
+        if upper is not None:
+            values.append(upper)
+            conditions.append(f"{key_column} <= ${len(values)}")
+        return conditions
+
+    def gen_keyset_sql(self, columns, table_name, key_columns, where_clause=None, last_key=None, limit=None,
+                       key_range=None):
+        """
+        生成键集分页(seek)的SQL查询语句。
+        以上一批最后一行的键值作为起点: WHERE (k1, k2) > ($1, $2) ORDER BY k1, k2 LIMIT n，
+        每批的代价与所处的位置无关。
+        key_range: (lower, upper)，限定唯一键首列的范围 lower < k1 <= upper，None表示无边界。
+        """
+        conditions, values = [], []
+        if where_clause:
+            conditions.append(f"({where_clause})")
+        conditions.extend(self.gen_range_conditions(key_columns[0], key_range, values))
+        if last_key is not None:
+            placeholders = ', '.join([f'${i}' for i in range(len(values) + 1, len(values) + len(key_columns) + 1)])
+            conditions.append(f"({', '.join(key_columns)}) > ({placeholders})")
+            values.extend(last_key)
+
+        query_sql = f"SELECT {columns} FROM {table_name}"
+        if conditions:
+            query_sql += " WHERE " + " AND ".join(conditions)
+        query_sql += f" ORDER BY {', '.join(key_columns)}"
+        if limit is not None:
+            values.append(limit)
+            query_sql += f" LIMIT ${len(values)}"
+        return query_sql, values
+
+    async def query_stream(self, columns, table_name, where_clause=None, start_index=None, batch_size=None,
+                           key_columns=None, key_range=None, prefetch=1000):
+        """
+        在只读事务中使用服务端游标流式读取数据，每次只从服务端取prefetch行，内存占用与结果集大小无关。
+        指定key_columns时按唯一键排序，并可以用key_range限定唯一键首列的范围。
+        """
+        if key_columns:
+            query_sql, values = self.gen_keyset_sql(columns, table_name, key_columns, where_clause,
+                                                    key_range=key_range)
+        else:
+            query_sql, values = self.gen_query_sql(columns, table_name, where_clause, start_index, batch_size)
+        async for record in self.execute_stream(query_sql, values, prefetch):
+            yield record
+
+    async def query_sample(self, columns, table_name, key_columns, rate, num_rows, where_clause=None,
+                           prefetch=1000):
+        """
+        使用 TABLESAMPLE BERNOULLI 在服务端按比例rate随机采样，每一行被选中的概率相同，只有样本被传输。
+        """
+        query_sql = f"SELECT {columns} FROM {table_name} TABLESAMPLE BERNOULLI ($1)"
+        if where_clause:
+            query_sql += f" WHERE {where_clause}"
+        async for record in self.execute_stream(query_sql, [min(rate, 1) * 100], prefetch):
+            yield record
+
+    @handle_db_exception
+    async def execute_stream(self, query_sql, values=None, prefetch=1000):
+        """
+        在只读事务中使用服务端游标执行任意查询并逐行返回。
+        """
+        async with self.pool.acquire() as conn:
+            async with conn.transaction(readonly=True):
+                async for record in conn.cursor(query_sql, *(values or []), prefetch=prefetch):
+                    yield record
+
+    @staticmethod
+    def gen_distinct_condition(left, right):
+        """
+        NULL安全的不相等判断，NULL与NULL视为相等。
+        """
+        return f"{left} IS DISTINCT FROM {right}"
 
     @handle_db_exception
     async def query(self, columns, table_mame, where_clause=None, start_index=None, batch_size=None, values=None):
-        query_sql = self.gen_query_sql(columns, table_mame, where_clause, start_index, batch_size)
+        query_sql, values = self.gen_query_sql(columns, table_mame, where_clause, start_index, batch_size, values)
         async with self.pool.acquire() as conn:
-            return await conn.fetch(query_sql, *values) if values else await conn.fetch(query_sql)
+            return await conn.fetch(query_sql, *values)
 
     @handle_db_exception
-    async def query_in(self, columns, table_name, query_data: dict, extend: str = None):
-        query_sql = f"SELECT {columns} FROM {table_name} "
-        where_clause = "WHERE " + ' AND '.join([f"{k} IN {tuple(v)}" for k, v in query_data.items()])
+    async def query_keyset(self, columns, table_name, key_columns, where_clause=None, last_key=None,
+                           batch_size=None, key_range=None):
+        query_sql, values = self.gen_keyset_sql(columns, table_name, key_columns, where_clause, last_key, batch_size,
+                                                key_range)
+        async with self.pool.acquire() as conn:
+            return await conn.fetch(query_sql, *values)
+
+    @handle_db_exception
+    async def query_in(self, columns, table_name, key_columns, keys, extend: str = None):
+        """
+        按唯一键精确查询一批行。
+        每个键列的值作为一个text[]参数绑定，在数据库中unnest后转换为列的类型再做行值比较:
+        (k1, k2) IN (SELECT u.k0::int, u.k1::text FROM unnest($1::text[], $2::text[]) AS u(k0, k1))，
+        SQL文本与批次大小无关，可以复用asyncpg缓存的预备语句与执行计划。
+        :param keys: 唯一键值的列表，每个元素是与key_columns一一对应的元组
+        """
+        if not keys:
+            return []
+        key_types = await self.get_key_types(table_name, key_columns)
+        names = ', '.join([f"k{i}" for i in range(len(key_columns))])
+        casts = ', '.join([f"u.k{i}::{key_type}" for i, key_type in enumerate(key_types)])
+        arrays = ', '.join([f"${i + 1}::text[]" for i in range(len(key_columns))])
+        query_sql = f"SELECT {columns} FROM {table_name} WHERE ({', '.join(key_columns)}) IN " \
+                    f"(SELECT {casts} FROM unnest({arrays}) AS u({names}))"
         if extend:
-            where_clause += " AND " + extend
-        query_sql += where_clause
+            query_sql += f" AND ({extend})"
+        values = [[None if key[i] is None else str(key[i]) for key in keys] for i in range(len(key_columns))]
+
+        async with self.pool.acquire() as conn:
+            return await conn.fetch(query_sql, *values)
 
+    @handle_db_exception
+    async def query_key(self, columns, table_name, key_columns, key, extend: str = None):
+        """
+        按一个唯一键查询B表中的行，NULL使用IS NULL匹配。
+        键值按文本绑定后转换为列的类型，与A表来自哪种数据库无关，同一种键的SQL文本相同。
+        """
+        key_types = await self.get_key_types(table_name, key_columns)
+        conditions, values = [], []
+        for key_column, key_type, value in zip(key_columns, key_types, key):
+            if value is None:
+                conditions.append(f"{key_column} IS NULL")
+            else:
+                values.append(str(value))
+                conditions.append(f"{key_column} = ${len(values)}::text::{key_type}")
+        if extend:
+            conditions.append(f"({extend})")
+        query_sql = f"SELECT {columns} FROM {table_name} WHERE {' AND '.join(conditions)}"
         async with self.pool.acquire() as conn:
-            return await conn.fetch(query_sql)
+            return await conn.fetch(query_sql, *values)
+
+    async def get_key_types(self, table_name, key_columns):
+        """
+        获取唯一字段的类型，用于把按文本绑定的键值转换为列的类型。
+        """
+        column_types = await self.get_column_types(table_name)
+        missing = [key for key in key_columns if key not in column_types]
+        if missing:
+            raise ValueError(f"表{table_name}中不存在唯一字段{missing}")
+        return [column_types[key] for key in key_columns]
+
+    async def get_column_types(self, table_name):
+        """
+        获取表的列类型 {列名: 类型}，同一张表只查询一次。
+        """
+        if table_name not in self.column_types:
+            sql = "SELECT attname, format_type(atttypid, atttypmod) AS column_type FROM pg_attribute " \
+                  "WHERE attrelid = $1::regclass AND attnum > 0 AND NOT attisdropped"
+            async with self.pool.acquire() as conn:
+                self.column_types[table_name] = {row['attname']: row['column_type']
+                                                 for row in await conn.fetch(sql, table_name)}
+        return self.column_types[table_name]
 
     @handle_db_exception
     async def get_row_count(self, table_name, where_clause=None):
@@ -64,8 +222,11 @@ class AsyncPgEngine(DbEngine):
             return await conn.fetchval(sql)
 
     @handle_db_exception
-    async def get_table_columns(self, table_name):
-        query_sql = "SELECT column_name FROM information_schema.columns"
+    async def get_table_columns(self, table_name, with_types=False):
+        """
+        :param with_types: 是否同时返回列类型，为True时返回 {列名: 类型}
+        """
+        query_sql = "SELECT column_name, data_type FROM information_schema.columns"
         if '.' in table_name:
             schema_name, table_name = table_name.split('.')
             query_sql += f" WHERE table_schema = '{schema_name}' AND TABLE_NAME = '{table_name}'"
@@ -73,4 +234,110 @@ class AsyncPgEngine(DbEngine):
             query_sql += f" WHERE TABLE_NAME = '{table_name}'"
 
         async with self.pool.acquire() as conn:
-            return [col.get("column_name") for col in await conn.fetch(query_sql)]
\ No newline at end of file
+            rows = await conn.fetch(query_sql)
+        if with_types:
+            return {col.get("column_name"): col.get("data_type") for col in rows}
+        return [col.get("column_name") for col in rows]
+
+    @handle_db_exception
+    async def get_key_bounds(self, table_name, key_column, where_clause=None, key_range=None):
+        values = []
+        conditions = [f"({where_clause})"] if where_clause else []
+        conditions.extend(self.gen_range_conditions(key_column, key_range, values))
+        sql = f"SELECT MIN({key_column}), MAX({key_column}) FROM {table_name}"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        async with self.pool.acquire() as conn:
+            row = await conn.fetchrow(sql, *values)
+            return row[0], row[1]
+
+    @staticmethod
+    def gen_row_hash(columns):
+        """
+        生成行哈希的SQL表达式: 各列转为文本后先各自取md5(NULL记为N)，再以|拼接后取md5，与MySQL引擎的算法一致。
+        每列的md5是定长的十六进制文本，不含分隔符，列值中的|或与NULL相同的文本不会让不同的行得到相同的哈希。
+        """
+        row_text = "concat_ws('|', " + ", ".join([f"COALESCE(md5({c}::text), 'N')" for c in columns]) + ")"
+        return f"md5({row_text})"
+
+    @handle_db_exception
+    async def get_checksum(self, table_name, columns, key_column, where_clause=None, key_range=None):
+        """
+        在数据库端计算一个键范围内的行数与校验和，返回 (count, checksum)。
+        每行取行哈希的前15位十六进制转为整数后求和，与行的顺序无关，
+        并且与MySQL引擎的算法一致，不同引擎之间也可以直接比较。
+        """
+        row_hash = self.gen_row_hash(columns)
+        values = []
+        conditions = [f"({where_clause})"] if where_clause else []
+        conditions.extend(self.gen_range_conditions(key_column, key_range, values))
+        sql = f"SELECT COUNT(*), COALESCE(SUM(('x' || substr({row_hash}, 1, 15))::bit(60)::bigint), 0) " \
+              f"FROM {table_name}"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        async with self.pool.acquire() as conn:
+            row = await conn.fetchrow(sql, *values)
+            return row[0], int(row[1])
+
+    @handle_db_exception
+    async def get_key_histogram(self, table_name, key_column):
+        """
+        读取pg_stats中的histogram_bounds，返回[(边界值, 累计占比)]，没有统计信息时返回空列表。
+        边界值先按文本读出，再转换为列本身的类型，保证后续可以直接作为查询参数绑定。
+        """
+        if '.' in table_name:
+            schema_name, relname = table_name.split('.')
+            stats_sql = "SELECT histogram_bounds::text FROM pg_stats " \
+                        "WHERE schemaname = $1 AND tablename = $2 AND attname = $3"
+            stats_args = (schema_name, relname, key_column)
+        else:
+            stats_sql = "SELECT histogram_bounds::text FROM pg_stats " \
+                        "WHERE schemaname = current_schema() AND tablename = $1 AND attname = $2"
+            stats_args = (table_name, key_column)
+        type_sql = "SELECT format_type(atttypid, atttypmod) FROM pg_attribute " \
+                   "WHERE attrelid = $1::regclass AND attname = $2"
+
+        async with self.pool.acquire() as conn:
+            bounds_text = await conn.fetchval(stats_sql, *stats_args)
+            if not bounds_text:
+                return []
+            column_type = await conn.fetchval(type_sql, table_name, key_column)
+            bounds = await conn.fetchval(f"SELECT $1::text::{column_type}[]", bounds_text)
+
+        if len(bounds) < 2:
+            return []
+        # histogram_bounds 把非高频值等分为若干个桶，边界即为分位点
+        return [(value, i / (len(bounds) - 1)) for i, value in enumerate(bounds)]
+
+    @handle_db_exception
+    async def estimate_row_count(self, table_name):
+        """
+        根据pg_class.reltuples估算表的行数，不扫描表。
+        """
+        async with self.pool.acquire() as conn:
+            estimate = await conn.fetchval("SELECT reltuples::bigint FROM pg_class WHERE oid = $1::regclass",
+                                           table_name)
+            return estimate if estimate and estimate > 0 else None
+
+    @handle_db_exception
+    async def get_table_names(self, schema_name=None):
+        """
+        获取模式中所有的表名，返回 schema_name.表名，默认为public模式。
+        """
+        schema_name = schema_name or 'public'
+        sql = "SELECT table_name FROM information_schema.tables WHERE table_schema = $1 " \
+              "AND table_type = 'BASE TABLE' ORDER BY table_name"
+        async with self.pool.acquire() as conn:
+            return [f"{schema_name}.{row['table_name']}" for row in await conn.fetch(sql, schema_name)]
+
+    @handle_db_exception
+    async def get_primary_key(self, table_name):
+        """
+        获取表的主键列，按在主键中的顺序返回，没有主键时返回空列表。
+        """
+        sql = "SELECT a.attname FROM pg_index i " \
+              "JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey) " \
+              "WHERE i.indrelid = $1::regclass AND i.indisprimary " \
+              "ORDER BY array_position(i.indkey::int2[], a.attnum)"
+        async with self.pool.acquire() as conn:
+            return [row['attname'] for row in await conn.fetch(sql, table_name)]
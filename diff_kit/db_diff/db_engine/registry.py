@@ -0,0 +1,125 @@
+# @Project: diff-kit
+# @Time: 2025/2/7 16:40
+# @Author: Alan
+# @File: registry
+
+import asyncio
+import atexit
+import time
+from typing import Dict, Tuple
+
+from diff_kit.db_diff.db_engine.abc import DbEngine
+
+
+class PoolEntry:
+    def __init__(self, engine: DbEngine, maxsize: int):
+        self.engine = engine
+        self.maxsize = maxsize
+        self.ref_count = 0
+        self.released_at = time.monotonic()
+
+
+class PoolRegistry:
+    """
+    按 (数据库类型, 地址, 端口, 用户, 密码, 库名) 复用数据库引擎及其连接池。
+    引用计数为0的连接池保留idle_timeout秒，期间再次对比同一个库时不需要重新建立连接。
+    连接池与事件循环绑定，不同事件循环之间不共享；同一个进程中先后执行的对比通过run在同一个常驻事件循环中执行，
+    才能复用之前对比留下的连接池，进程退出时统一关闭。
+    """
+
+    def __init__(self, idle_timeout: float = 300):
+        self.idle_timeout = idle_timeout
+        # 可以被复用的连接池
+        self.entries: Dict[Tuple, PoolEntry] = {}
+        # 所有仍被引用的连接池，包括被更大的连接池替换下来的 {id(engine): PoolEntry}
+        self.leases: Dict[int, PoolEntry] = {}
+        # 常驻的事件循环，第一次调用run时创建
+        self.loop = None
+
+    @staticmethod
+    def make_key(factory) -> Tuple:
+        kwargs = factory.kwargs
+        return (asyncio.get_running_loop(), factory.db_type, kwargs.get('host'), kwargs.get('port'),
+                kwargs.get('user'), kwargs.get('password'), kwargs.get('db'))
+
+    async def acquire(self, factory, maxsize: int) -> DbEngine:
+        """
+        获取引擎，已有的连接池不小于maxsize时直接复用，否则创建新的连接池。
+        :param factory: DbEngineFactory
+        """
+        await self.evict_idle()
+        key = self.make_key(factory)
+        entry = self.entries.get(key)
+        if entry and entry.maxsize < maxsize and entry.ref_count == 0:
+            await entry.engine.close()
+            entry = None
+        # 正在使用的连接池太小时创建新的连接池替换它，旧的连接池在释放后关闭
+        if entry is None or entry.maxsize < maxsize:
+            engine = factory.create_db_engine()
+            await engine.create_pool(maxsize)
+            entry = PoolEntry(engine, maxsize)
+            self.entries[key] = entry
+        entry.ref_count += 1
+        self.leases[id(entry.engine)] = entry
+        return entry.engine
+
+    async def release(self, engine: DbEngine):
+        """
+        释放一次引用，已被替换的连接池在引用计数归零后直接关闭。
+        """
+        entry = self.leases.get(id(engine))
+        if entry is None:
+            return await engine.close()
+        entry.ref_count -= 1
+        entry.released_at = time.monotonic()
+        if entry.ref_count == 0:
+            self.leases.pop(id(engine))
+            if entry not in self.entries.values():
+                await engine.close()
+        await self.evict_idle()
+
+    async def evict_idle(self, idle_timeout: float = None):
+        """
+        关闭空闲超过idle_timeout秒的连接池，丢弃属于已关闭事件循环的连接池。
+        """
+        idle_timeout = self.idle_timeout if idle_timeout is None else idle_timeout
+        now = time.monotonic()
+        loop = asyncio.get_running_loop()
+        for key, entry in list(self.entries.items()):
+            if key[0].is_closed():
+                self.entries.pop(key)
+            elif key[0] is loop and entry.ref_count == 0 and now - entry.released_at >= idle_timeout:
+                self.entries.pop(key)
+                await entry.engine.close()
+
+    async def close_idle(self):
+        """
+        关闭当前事件循环中所有空闲的连接池，在事件循环结束前调用。
+        """
+        await self.evict_idle(idle_timeout=0)
+
+    def run(self, coro):
+        """
+        在常驻的事件循环中执行协程，代替asyncio.run，执行结束后不关闭事件循环与其中的连接池。
+        """
+        if self.loop is None or self.loop.is_closed():
+            self.loop = asyncio.new_event_loop()
+            atexit.register(self.shutdown)
+        asyncio.set_event_loop(self.loop)
+        return self.loop.run_until_complete(coro)
+
+    def shutdown(self):
+        """
+        关闭常驻事件循环中的连接池与事件循环本身，进程退出时自动调用。
+        """
+        if self.loop is None or self.loop.is_closed():
+            return
+        atexit.unregister(self.shutdown)
+        self.loop.run_until_complete(self.close_idle())
+        self.loop.run_until_complete(self.loop.shutdown_asyncgens())
+        self.loop.close()
+        self.loop = None
+        asyncio.set_event_loop(None)
+
+
+pool_registry = PoolRegistry()
@@ -4,9 +4,13 @@
 # @File: report
 
 import os
-import pandas as pd
-from datetime import datetime
+from datetime import date, datetime, time
+from decimal import Decimal
 from pathlib import Path
+from typing import List, Tuple
+from openpyxl import Workbook, load_workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Font
 from diff_kit.db_diff.core.results import Result
 from diff_kit.utils.logger import logger
 
@@ -16,6 +20,82 @@ COLUMN_QUERY = "查询条件"
 COLUMN_INCONSISTENT_FIELDS = "不一致字段"
 COLUMN_A_VALUE = "源表的值"
 COLUMN_B_VALUE = "目标表的值"
+OVERVIEW_SHEET = "总览"
+# 概述信息: (描述, Result的属性)
+SUMMARY_FIELDS = [
+    ('源表名', 'table_name_a'),
+    ('目标表名', 'table_name_b'),
+    ('源表总记录数', 'num_table_a'),
+    ('目标表总记录数', 'num_table_b'),
+    ('此次对比记录数', 'num_diff_row'),
+    ('仅在源表的记录数', 'only_row_count_in_table_a'),
+    ('仅在目标表的记录数', 'only_row_count_in_table_b'),
+    ('目标表存在多条的记录数', 'excess_row_count_in_table_b'),
+    ('对比不一致的记录数', 'difference_row_count'),
+]
+ESTIMATE_DESC = ['估计不一致比例', '置信区间', '估计不一致行数']
+
+# Excel单个工作表的最大行数
+EXCEL_MAX_ROWS = 1048576
+# openpyxl可以直接写入单元格的类型
+CELL_TYPES = (str, int, float, Decimal, datetime, date, time, bool)
+HEADER_FONT = Font(bold=True)
+HEADER_ALIGNMENT = Alignment(horizontal='center')
+
+
+class SheetWriter:
+    """
+    向write_only工作簿逐行写入，超过Excel行数上限时新建工作表继续写入，并重复当前区块的表头。
+    """
+
+    def __init__(self, workbook: Workbook, title: str, used_titles, max_rows: int = EXCEL_MAX_ROWS):
+        self.workbook = workbook
+        self.title = title
+        self.used_titles = set(used_titles)
+        self.max_rows = max_rows
+        self.header = None
+        self.sheet = None
+        self.num_rows = 0
+        self.num_sheets = 0
+        self.new_sheet()
+
+    def new_sheet(self):
+        title = self.title
+        while title in self.used_titles or (self.num_sheets > 0 and title == self.title):
+            title = f"{self.title[:26]}_{self.num_sheets}"
+            self.num_sheets += 1
+        self.num_sheets = max(self.num_sheets, 1)
+        self.used_titles.add(title)
+        self.sheet = self.workbook.create_sheet(title=title)
+        self.num_rows = 0
+        if self.header:
+            self.write_header(self.header)
+
+    def write_header(self, header: list):
+        if self.num_rows >= self.max_rows:
+            self.header = None
+            self.new_sheet()
+        self.header = header
+        cells = []
+        for value in header:
+            cell = WriteOnlyCell(self.sheet, value=value)
+            cell.font = HEADER_FONT
+            cell.alignment = HEADER_ALIGNMENT
+            cells.append(cell)
+        self.sheet.append(cells)
+        self.num_rows += 1
+
+    def end_section(self, row_gap: int = 1):
+        self.header = None
+        # 空行不需要延续到新的工作表
+        for _ in range(min(row_gap, self.max_rows - self.num_rows)):
+            self.append([])
+
+    def append(self, row: list):
+        if self.num_rows >= self.max_rows:
+            self.new_sheet()
+        self.sheet.append(row)
+        self.num_rows += 1
 
 
 class ExcelReport:
@@ -23,111 +103,155 @@ class ExcelReport:
     def generate_report(self, sheet_name: str, report_path: Path, result: Result):
         """
         生成Excel报告
+        使用openpyxl的write_only工作簿，明细从结果存储中逐行读取后直接写入，不在内存中构建整张表。
+        报告已存在时，原有的工作表会被流式复制到新工作簿中，本次结果追加为新的工作表。
+        """
+        self.generate_combined_report(report_path, [(sheet_name, result)])
+
+    def generate_combined_report(self, report_path: Path, results: List[Tuple[str, Result]]):
+        """
+        把多张表的对比结果一次写入同一个报告，每张表一个工作表，多于一张表时在最前面增加总览工作表。
+        :param results: [(工作表名称, 对比结果)]
         """
-        sheet_name = sheet_name[:29]
-        row_gap = 2
         suffix = ".xlsx"
         logger.info("生成报告中...")
         if suffix not in str(report_path):
             report_path += suffix
 
-        def align_left(data_frame):
-            return data_frame.style.apply(lambda x: ['text-align: left' for _ in x], axis=0)
-
-        def add_summary(writer, summary, start_row):
-            if not summary:
-                return
-            df_summary = pd.DataFrame(summary)
-            align_left(df_summary).to_excel(writer, sheet_name=sheet_name, index=False, startrow=start_row)
+        try:
+            workbook = Workbook(write_only=True)
+            used_titles = set(self.copy_existing_sheets(workbook, report_path))
+            existing_count = len(used_titles)
+            if len(results) > 1:
+                writer = SheetWriter(workbook, OVERVIEW_SHEET, used_titles)
+                self.write_overview(writer, results)
+                used_titles |= writer.used_titles
 
-        # 获取数据
-        summary_values = list(result.as_summary().values())
-        difference_rows = result.get_difference_rows()
-        only_rows_in_table_a = result.get_only_rows_in_table_a()
-        excess_rows_in_table_b = result.get_excess_rows_in_table_b()
+            for sheet_name, result in results:
+                sheet_name = sheet_name[:29]
+                if existing_count:
+                    sheet_name = f"{sheet_name}_{existing_count}"
+                writer = SheetWriter(workbook, sheet_name, used_titles)
+                self.write_result(writer, result)
+                used_titles |= writer.used_titles
 
-        # 起始行数
-        differ_across_start_row = len(summary_values) + row_gap
-        table_a_only_start_row = len(summary_values) + row_gap
-        table_b_more_start_row = len(summary_values) + row_gap
-
-        try:
-            if not os.path.exists(report_path):
-                with pd.ExcelWriter(report_path, engine='openpyxl') as writer:
-                    writer.book.create_sheet(title=sheet_name)
-            else:
-                sheet_name = f"{sheet_name}_{len(pd.ExcelFile(report_path).sheet_names)}"
-
-            with pd.ExcelWriter(report_path, mode='a', engine='openpyxl', if_sheet_exists='overlay') as writer:
-
-                # 概述信息
-                summary = {
-                    COLUMN_DESC: ['源表名', '目标表名', '源表总记录数', '目标表总记录数', '此次对比记录数',
-                                  '仅在源表的记录数',
-                                  '目标表存在多条的记录数', '对比不一致的记录数'],
-                    COLUMN_NUM: summary_values
-                }
-                add_summary(writer, summary, 0)
-
-                # 表A与表B不一致的记录
-                if difference_rows:
-
-                    differ_across_summary = {
-                        COLUMN_DESC: [],
-                        COLUMN_QUERY: [],
-                        COLUMN_INCONSISTENT_FIELDS: [],
-                        COLUMN_A_VALUE: [],
-                        COLUMN_B_VALUE: []
-                    }
-
-                    def add_column(query_criteria, field, value1, value2):
-                        differ_across_summary[COLUMN_DESC].append('对比不一致的记录')
-                        differ_across_summary[COLUMN_QUERY].append(query_criteria)
-                        differ_across_summary[COLUMN_INCONSISTENT_FIELDS].append(field)
-                        differ_across_summary[COLUMN_A_VALUE].append(value1)
-                        differ_across_summary[COLUMN_B_VALUE].append(value2)
-
-                    for differ_across_tables in difference_rows:
-                        query_criteria, differ_across = differ_across_tables
-                        for item in differ_across:
-                            if "remove" in item:
-                                _, _, values = item
-                                for field, value in values:
-                                    add_column(query_criteria, field, self.format_value(values), "remove")
-                            elif "add" in item:
-                                _, _, values = item
-                                for field, value in values:
-                                    add_column(query_criteria, field, "add", self.format_value(value))
-                            else:
-                                _, field, values = item
-                                add_column(query_criteria, field, self.format_value(values[0]),
-                                           self.format_value(values[1]))
-
-                    add_summary(writer, differ_across_summary, differ_across_start_row)
-                    table_a_only_start_row = differ_across_start_row + len(differ_across_summary[COLUMN_DESC]) + row_gap
-
-                # 仅在A表的记录
-                if only_rows_in_table_a:
-                    table_a_only_summary = {
-                        COLUMN_DESC: ['仅在源表的记录' for _ in only_rows_in_table_a],
-                        COLUMN_QUERY: only_rows_in_table_a
-                    }
-                    add_summary(writer, table_a_only_summary, table_a_only_start_row)
-                    table_b_more_start_row = table_a_only_start_row + len(table_a_only_summary[COLUMN_DESC]) + row_gap
-
-                # B表多条的数据
-                if excess_rows_in_table_b:
-                    table_b_more_summary = {
-                        COLUMN_DESC: ['目标表存在多条的记录' for _ in excess_rows_in_table_b],
-                        COLUMN_QUERY: excess_rows_in_table_b
-                    }
-                    add_summary(writer, table_b_more_summary, table_b_more_start_row)
+            # 先写入临时文件再替换，避免生成失败时破坏已有的报告
+            temp_path = f"{report_path}.tmp"
+            workbook.save(temp_path)
+            os.replace(temp_path, report_path)
 
         except Exception as e:
             logger.error(f"生成报告时发生错误: {e}")
         else:
             logger.info(f"报告生成完成：{report_path}")
 
+    @staticmethod
+    def summary_values(result: Result) -> list:
+        return [getattr(result, attr) for _, attr in SUMMARY_FIELDS]
+
+    @staticmethod
+    def estimate_values(result: Result) -> list:
+        """
+        采样估计格式化为文本，全量对比时为空。
+        """
+        estimate = result.sample_estimate
+        if not estimate:
+            return [None] * len(ESTIMATE_DESC)
+        return [f"{estimate.rate:.4%}",
+                f"{estimate.confidence:.0%}: [{estimate.lower:.4%}, {estimate.upper:.4%}]",
+                f"{round(estimate.lower * estimate.population)} ~ {round(estimate.upper * estimate.population)}"]
+
+    def write_overview(self, writer: SheetWriter, results: List[Tuple[str, Result]]):
+        """
+        每张表一行的总览，存在采样对比的表时增加估计列。
+        """
+        with_estimate = any(result.sample_estimate for _, result in results)
+        writer.write_header([desc for desc, _ in SUMMARY_FIELDS] + ['是否一致'] +
+                            (ESTIMATE_DESC if with_estimate else []))
+        for _, result in results:
+            writer.append(self.summary_values(result) + ['是' if result.is_success() else '否'] +
+                          (self.estimate_values(result) if with_estimate else []))
+
+    def write_result(self, writer: SheetWriter, result: Result):
+        """
+        写入一张表的概述信息与明细。
+        """
+        # 概述信息
+        writer.write_header([COLUMN_DESC, COLUMN_NUM])
+        for (desc, _), value in zip(SUMMARY_FIELDS, self.summary_values(result)):
+            writer.append([desc, value])
+        if result.sample_estimate:
+            for desc, value in zip(ESTIMATE_DESC, self.estimate_values(result)):
+                writer.append([desc, value])
+        writer.end_section()
+
+        # 表A与表B不一致的记录
+        if result.difference_row_count:
+            writer.write_header([COLUMN_DESC, COLUMN_QUERY, COLUMN_INCONSISTENT_FIELDS, COLUMN_A_VALUE,
+                                 COLUMN_B_VALUE])
+            for query_criteria, field, value_a, value_b in self.iter_differences(result.get_difference_rows()):
+                writer.append(['对比不一致的记录', query_criteria, field, self.to_cell(value_a),
+                               self.to_cell(value_b)])
+            writer.end_section()
+
+        # 仅在A表的记录、仅在B表的记录、B表多条的数据
+        sections = [
+            (result.only_row_count_in_table_a, '仅在源表的记录', result.get_only_rows_in_table_a),
+            (result.only_row_count_in_table_b, '仅在目标表的记录', result.get_only_rows_in_table_b),
+            (result.excess_row_count_in_table_b, '目标表存在多条的记录', result.get_excess_rows_in_table_b),
+        ]
+        for count, desc, get_rows in sections:
+            if not count:
+                continue
+            writer.write_header([COLUMN_DESC, COLUMN_QUERY])
+            for query_criteria in get_rows():
+                writer.append([desc, query_criteria])
+            writer.end_section()
+
+    @staticmethod
+    def copy_existing_sheets(workbook: Workbook, report_path) -> list:
+        """
+        把已有报告中的工作表逐行复制到新的write_only工作簿中，返回已有的工作表名称。
+        """
+        if not os.path.exists(report_path):
+            return []
+        source = load_workbook(report_path, read_only=True)
+        try:
+            for source_sheet in source.worksheets:
+                sheet = workbook.create_sheet(title=source_sheet.title)
+                for row in source_sheet.iter_rows(values_only=True):
+                    sheet.append(row)
+            return source.sheetnames
+        finally:
+            source.close()
+
+    def iter_differences(self, difference_rows):
+        """
+        把dictdiffer的差异结果展开为 (查询条件, 字段, 源表的值, 目标表的值)。
+        """
+        for query_criteria, differ_across in difference_rows:
+            for item in differ_across:
+                if "remove" in item:
+                    _, _, values = item
+                    for field, value in values:
+                        yield query_criteria, field, self.format_value(value), "remove"
+                elif "add" in item:
+                    _, _, values = item
+                    for field, value in values:
+                        yield query_criteria, field, "add", self.format_value(value)
+                else:
+                    _, field, values = item
+                    yield query_criteria, field, self.format_value(values[0]), self.format_value(values[1])
+
+    @staticmethod
+    def to_cell(value):
+        """
+        openpyxl无法直接写入的类型(dict、list、bytes等)转换为字符串。
+        """
+        if value is None or isinstance(value, CELL_TYPES):
+            return value
+        return str(value)
+
     @staticmethod
     def format_value(value):
         """
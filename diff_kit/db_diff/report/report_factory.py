@@ -29,4 +29,12 @@ class ReportFactory:
 
     def create_report(self, report_type: str, filename: str, result: Result, **kwargs):
         report_path = create_report_dir(filename)
-        return getattr(self.report_mapp[report_type](), 'generate_report')(report_path=report_path, result=result, **kwargs)
\ No newline at end of file
+        return getattr(self.report_mapp[report_type](), 'generate_report')(report_path=report_path, result=result, **kwargs)
+
+    def create_combined_report(self, report_type: str, filename: str, results: list):
+        """
+        把多张表的对比结果写入同一个报告。
+        :param results: [(工作表名称, 对比结果)]
+        """
+        report_path = create_report_dir(filename)
+        return self.report_mapp[report_type]().generate_combined_report(report_path=report_path, results=results)
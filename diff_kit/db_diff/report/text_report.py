@@ -4,6 +4,7 @@
 # @File: text_report
 
 from pathlib import Path
+from typing import List, Tuple
 from diff_kit.db_diff.core.results import Result
 
 
@@ -13,22 +14,43 @@ class TextReport(object):
         生成text报告
         """
         with open(report_path, 'w', encoding='utf-8') as file:
-            file.write(
-                f"比较两个表:\n"
-                f"表A为: {result.table_name_a}\n"
-                f"表B为: {result.table_name_b}\n")
-            file.write(f"表A总记录数: {result.num_table_a}\n")
-            file.write(f"表B总记录数: {result.num_table_b}\n")
-            file.write(f"此次对比记录数: {result.num_diff_row}\n")
-            file.write(f"表A仅有的记录数: {result.only_row_count_in_table_a}\n")
-            file.write(f"表B多出的记录数: {result.excess_row_count_in_table_b}\n")
-            file.write(f"表A和表B结果不同的记录数: {result.difference_row_count}\n")
-
-            for i in result.difference_rows:
-                file.write(f"表A和表B结果不同的记录: {i}\n")
-
-            for i in result.only_rows_in_table_a:
-                file.write(f"表A仅有的记录: {i}\n")
-
-            for i in result.excess_rows_in_table_b:
-                file.write(f"表B多出的记录: {i}\n")
+            self.write_result(file, result)
+
+    def generate_combined_report(self, report_path: Path, results: List[Tuple[str, Result]]):
+        """
+        把多张表的对比结果依次写入同一个text报告。
+        """
+        with open(report_path, 'w', encoding='utf-8') as file:
+            for _, result in results:
+                self.write_result(file, result)
+                file.write("\n")
+
+    @staticmethod
+    def write_result(file, result: Result):
+        file.write(
+            f"比较两个表:\n"
+            f"表A为: {result.table_name_a}\n"
+            f"表B为: {result.table_name_b}\n")
+        file.write(f"表A总记录数: {result.format_count(result.num_table_a)}\n")
+        file.write(f"表B总记录数: {result.format_count(result.num_table_b)}\n")
+        file.write(f"此次对比记录数: {result.num_diff_row}\n")
+        file.write(f"表A仅有的记录数: {result.only_row_count_in_table_a}\n")
+        file.write(f"表B仅有的记录数: {result.only_row_count_in_table_b}\n")
+        file.write(f"表B多出的记录数: {result.excess_row_count_in_table_b}\n")
+        file.write(f"表A和表B结果不同的记录数: {result.difference_row_count}\n")
+        if result.sample_estimate:
+            estimate = result.sample_estimate
+            file.write(f"估计不一致比例: {estimate.rate:.4%}，{estimate.confidence:.0%}置信区间: "
+                       f"[{estimate.lower:.4%}, {estimate.upper:.4%}]\n")
+
+        for i in result.difference_rows:
+            file.write(f"表A和表B结果不同的记录: {i}\n")
+
+        for i in result.only_rows_in_table_a:
+            file.write(f"表A仅有的记录: {i}\n")
+
+        for i in result.only_rows_in_table_b:
+            file.write(f"表B仅有的记录: {i}\n")
+
+        for i in result.excess_rows_in_table_b:
+            file.write(f"表B多出的记录: {i}\n")
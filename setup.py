@@ -11,6 +11,7 @@ install_requires = [
     "motor",
     "asyncpg",
     "pandas",
+    "numpy",
     "openpyxl",
     "tqdm",
     "pydantic"
@@ -0,0 +1,183 @@
+# @Project: diff-kit
+# @Time: 2025/2/24 10:05
+# @Author: Alan
+# @File: conftest
+
+import contextlib
+import hashlib
+import itertools
+import sqlite3
+import zlib
+
+import pytest
+
+from diff_kit.db_diff import db_engine
+from diff_kit.db_diff.db_engine import pool_registry
+from diff_kit.db_diff.db_engine.mysql import AsyncMysqlDbEngine
+
+
+class BitXor:
+    def __init__(self):
+        self.value = 0
+
+    def step(self, value):
+        if value is not None:
+            self.value ^= int(value)
+
+    def finalize(self):
+        return self.value
+
+
+class BigSum:
+    # SQLite的SUM会溢出为浮点数，校验和按文本返回与MySQL的DECIMAL一致
+    def __init__(self):
+        self.value = None
+
+    def step(self, value):
+        if value is not None:
+            self.value = (self.value or 0) + int(value)
+
+    def finalize(self):
+        return None if self.value is None else str(self.value)
+
+
+def create_sqlite_db() -> sqlite3.Connection:
+    """
+    创建内存中的SQLite库，并注册对比SQL中用到的MySQL函数。
+    """
+    db = sqlite3.connect(':memory:', check_same_thread=False)
+    db.row_factory = sqlite3.Row
+    db.create_function('CRC32', 1, lambda s: None if s is None else zlib.crc32(str(s).encode()))
+    db.create_function('CONCAT_WS', -1, lambda sep, *args: sep.join(str(a) for a in args if a is not None))
+    db.create_function('MD5', 1, lambda s: None if s is None else hashlib.md5(str(s).encode()).hexdigest())
+    db.create_function('CONV', 3, lambda s, from_base, to_base: str(int(s, from_base)))
+    db.create_aggregate('BIT_XOR', 1, BitXor)
+    db.create_aggregate('SUM', 1, BigSum)
+    return db
+
+
+def expand_params(sql: str, args):
+    """
+    把aiomysql风格的 %s 占位符转换为SQLite的 ?，元组参数展开为 (?, ?, ...)。
+    """
+    if not args:
+        return sql, ()
+    parts = sql.split('%s')
+    statement, params = [parts[0]], []
+    for arg, part in zip(args, parts[1:]):
+        if isinstance(arg, (tuple, list)):
+            statement.append('(' + ', '.join('?' * len(arg)) + ')')
+            params.extend(arg)
+        else:
+            statement.append('?')
+            params.append(arg)
+        statement.append(part)
+    return ''.join(statement), params
+
+
+class FakeCursor:
+    def __init__(self, db: sqlite3.Connection, dict_rows: bool):
+        self.db = db
+        self.dict_rows = dict_rows
+        self.rows = []
+        self.rowcount = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    async def execute(self, sql, args=None):
+        sql, params = expand_params(sql.replace('%%', '%'), args)
+        rows = self.db.execute(sql, params).fetchall()
+        self.rows = [dict(row) if self.dict_rows else tuple(row) for row in rows]
+        self.rowcount = len(self.rows)
+
+    async def fetchall(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+    async def fetchone(self):
+        return self.rows.pop(0) if self.rows else None
+
+    async def fetchmany(self, size):
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        return rows
+
+    async def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, db: sqlite3.Connection):
+        self.db = db
+
+    def cursor(self, cursor_class=None):
+        return FakeCursor(self.db, cursor_class is not None and 'Dict' in cursor_class.__name__)
+
+
+class FakePool:
+    def __init__(self, db: sqlite3.Connection):
+        self.db = db
+
+    @contextlib.asynccontextmanager
+    async def acquire(self):
+        yield FakeConnection(self.db)
+
+    def close(self):
+        pass
+
+    async def wait_closed(self):
+        pass
+
+
+class FakeMysqlEngine(AsyncMysqlDbEngine):
+    """
+    以SQLite代替MySQL的引擎，执行与MySQL引擎相同的SQL，用于在没有数据库的环境中测试对比流程。
+    databases: {库名: SQLite连接}
+    """
+
+    databases = {}
+
+    async def create_pool(self, maxsize=10):
+        self.pool = FakePool(self.databases[self.db])
+
+    async def get_table_columns(self, table_name, with_types=False):
+        rows = self.databases[self.db].execute(f"PRAGMA table_info({table_name})").fetchall()
+        return {row[1]: row[2] for row in rows} if with_types else [row[1] for row in rows]
+
+    async def get_key_histogram(self, table_name, key_column):
+        return []
+
+    async def estimate_row_count(self, table_name):
+        return None
+
+
+_db_names = itertools.count()
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    """
+    注册一个空的SQLite库作为MySQL数据源，返回 (库名, SQLite连接)。
+    每个测试使用不同的库名，常驻事件循环中缓存的连接池不会指向其他测试的库。
+    """
+    monkeypatch.setitem(db_engine.db_mapping, 'mysql', FakeMysqlEngine)
+    name = f"db{next(_db_names)}"
+    db = create_sqlite_db()
+    FakeMysqlEngine.databases[name] = db
+    yield name, db
+    pool_registry.shutdown()
+    FakeMysqlEngine.databases.pop(name)
+
+
+def diff_params(db_name: str, **kwargs) -> dict:
+    """
+    对比fake_db中ta与tb两张表的默认参数。
+    """
+    params = dict(db_conn_a={"db_type": "mysql", "host": "localhost", "port": 3306, "user": "u", "password": "p"},
+                  db_name_a=db_name, db_name_b=db_name, table_name_a='ta', table_name_b='tb',
+                  unique_field=['id'], limit=100, maxsize=4)
+    params.update(kwargs)
+    return params
@@ -0,0 +1,75 @@
+# @Project: diff-kit
+# @Time: 2025/2/24 15:30
+# @Author: Alan
+# @File: test_checkpoint
+
+import os
+
+import pytest
+
+from diff_kit.db_diff.core.checkpoint import Checkpoint
+from diff_kit.db_diff.core.compare_data import DbDiff, DiffParams
+from diff_kit.db_diff.core.planner import KeyRange
+from diff_kit.db_diff.core.results import Result
+
+
+def batch_plugin(batch_a, batch_b):
+    return batch_a, batch_b
+
+
+def fingerprint(**kwargs) -> str:
+    return DbDiff(DiffParams(db_conn_a={"db_type": "mysql", "host": "h", "port": 3306, "user": "u", "password": "p"},
+                             db_name_a='db', db_name_b='db', table_name_a='ta', table_name_b='tb', unique_field=['id'],
+                             **kwargs)).checkpoint_fingerprint()
+
+
+@pytest.mark.parametrize('option', [
+    {'normalize': True}, {'float_tolerance': 0.01}, {'timestamp_precision': 3}, {'trim_strings': True},
+    {'ignore_case': True}, {'row_hash': True}, {'bidirectional': True}, {'batch_plugin': batch_plugin},
+    {'batch_plugin': batch_plugin, 'batch_format': 'dataframe'},
+])
+def test_fingerprint_covers_comparison_rules(option):
+    assert fingerprint(**option) != fingerprint()
+
+
+def test_fingerprint_is_stable_for_plugins():
+    assert fingerprint(batch_plugin=batch_plugin) == fingerprint(batch_plugin=batch_plugin)
+    assert fingerprint(batch_plugin=batch_plugin, batch_format='dataframe') != fingerprint(batch_plugin=batch_plugin)
+
+
+def test_checkpoint_resume(tmp_path):
+    path = str(tmp_path / 'checkpoint.sqlite')
+    checkpoint = Checkpoint(path, 'fp')
+    checkpoint.save_plan([KeyRange(None, 10), KeyRange(10, None)])
+    result = Result()
+    result.num_diff_row = 10
+    result.add_only_row_in_table_a('id=3')
+    checkpoint.commit('range:0', result)
+    checkpoint.close()
+
+    checkpoint = Checkpoint(path, 'fp', resume=True)
+    assert checkpoint.load_plan() == [KeyRange(None, 10), KeyRange(10, None)]
+    units = dict(checkpoint.load())
+    assert list(units) == ['range:0']
+    assert units['range:0'].num_diff_row == 10
+    assert list(units['range:0'].only_rows_in_table_a) == ['id=3']
+    checkpoint.close(remove=True)
+    assert not os.path.exists(path)
+
+
+def test_checkpoint_without_resume_starts_over(tmp_path):
+    path = str(tmp_path / 'checkpoint.sqlite')
+    checkpoint = Checkpoint(path, 'fp')
+    checkpoint.commit('batch:0', Result())
+    checkpoint.close()
+    checkpoint = Checkpoint(path, 'other')
+    assert list(checkpoint.load()) == []
+    assert checkpoint.load_plan() is None
+    checkpoint.close()
+
+
+def test_checkpoint_rejects_other_parameters(tmp_path):
+    path = str(tmp_path / 'checkpoint.sqlite')
+    Checkpoint(path, 'fp').close()
+    with pytest.raises(ValueError):
+        Checkpoint(path, 'other', resume=True)
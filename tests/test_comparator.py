@@ -0,0 +1,95 @@
+# @Project: diff-kit
+# @Time: 2025/2/25 15:20
+# @Author: Alan
+# @File: test_comparator
+
+from decimal import Decimal
+
+import pytest
+
+from diff_kit.db_diff.core.batch_plugin import BatchPlugin
+from diff_kit.db_diff.core.comparator import BatchComparator
+from diff_kit.db_diff.core.normalizer import ColumnNormalizer
+from diff_kit.db_diff.core.results import Result
+
+ROWS_A = [{'id': 1, 'v': 'a'}, {'id': 2, 'v': 'b'}, {'id': 3, 'v': 'c'}, {'id': 4, 'v': 'd'}]
+ROWS_B = [{'id': 1, 'v': 'a'}, {'id': 2, 'v': 'x'}, {'id': 4, 'v': 'd'}, {'id': 4, 'v': 'd'}]
+
+
+def compare(comparator, rows_a, rows_b) -> Result:
+    result = Result()
+    comparator.compare(rows_a, rows_b, result)
+    return result
+
+
+def test_compare_counts_each_kind():
+    result = compare(BatchComparator(['id'], ['id']), ROWS_A, ROWS_B)
+    assert result.num_diff_row == 4
+    assert list(result.only_rows_in_table_a) == ['id=3']
+    assert list(result.excess_rows_in_table_b) == ['id=4']
+    assert list(result.difference_rows) == [('id=2', [('change', 'v', ('b', 'x'))])]
+
+
+def test_compare_matched_agrees_with_compare():
+    comparator = BatchComparator(['id'], ['id'])
+    matched = [(row_a, [row_b for row_b in ROWS_B if row_b['id'] == row_a['id']]) for row_a in ROWS_A]
+    result = Result()
+    comparator.compare_matched(matched, result)
+    expected = compare(comparator, ROWS_A, ROWS_B)
+    assert result.as_summary() == expected.as_summary()
+
+
+def test_keys_of_different_types_align():
+    result = compare(BatchComparator(['id'], ['id']), [{'id': Decimal('1'), 'v': 1}], [{'id': 1, 'v': 1}])
+    assert result.is_success()
+
+
+def test_tolerance_applies_only_to_float_columns():
+    normalizer = ColumnNormalizer.compile({'v': 'double', 'qty': 'int'}, {'v': 'double', 'qty': 'int'},
+                                          {'v': 'v', 'qty': 'qty'}, float_tolerance=1)
+    comparator = BatchComparator(['id'], ['id'], normalizer=normalizer)
+    result = compare(comparator, [{'id': 1, 'v': 1.0, 'qty': 5}, {'id': 2, 'v': 1.0, 'qty': 5}],
+                     [{'id': 1, 'v': 1.5, 'qty': 5}, {'id': 2, 'v': 1.5, 'qty': 6}])
+    assert list(result.difference_rows) == [('id=2', [('change', 'qty', (5, 6))])]
+
+
+def upper_a(batch_a, batch_b):
+    return [dict(row, v=row['v'].upper()) for row in batch_a], batch_b
+
+
+def mark_upper(row):
+    # 只有在批量插件之后执行才会把大写的值改回B表的值
+    return dict(row, v=row['v'].lower() + '!') if row['v'].isupper() else row
+
+
+@pytest.mark.parametrize('path', ['compare', 'compare_matched'])
+def test_batch_plugin_runs_before_plugin(path):
+    comparator = BatchComparator(['id'], ['id'], plugin=mark_upper, batch_plugin=BatchPlugin(upper_a))
+    rows_a, rows_b = [{'id': 1, 'v': 'a'}], [{'id': 1, 'v': 'a!'}]
+    result = Result()
+    if path == 'compare':
+        comparator.compare(rows_a, rows_b, result)
+    else:
+        comparator.compare_matched([(rows_a[0], rows_b)], result)
+    assert result.is_success()
+
+
+def test_batch_plugin_cannot_change_row_count():
+    comparator = BatchComparator(['id'], ['id'], batch_plugin=BatchPlugin(lambda a, b: (a[:0], b)))
+    with pytest.raises(ValueError):
+        comparator.compare_matched([({'id': 1, 'v': 'a'}, [{'id': 1, 'v': 'a'}])], Result())
+
+
+@pytest.mark.parametrize('batch_format', ['rows', 'columns', 'dataframe'])
+def test_batch_formats(batch_format):
+    def strip_b(batch_a, batch_b):
+        if batch_format == 'rows':
+            return batch_a, [dict(row, v=row['v'].rstrip('x')) for row in batch_b]
+        if batch_format == 'columns':
+            return batch_a, dict(batch_b, v=[v.rstrip('x') for v in batch_b['v']])
+        return batch_a, batch_b.assign(v=batch_b['v'].str.rstrip('x'))
+
+    comparator = BatchComparator(['id'], ['id'], batch_plugin=BatchPlugin(strip_b, batch_format))
+    result = compare(comparator, [{'id': 1, 'v': 'a'}, {'id': 2, 'v': 'b'}],
+                     [{'id': 1, 'v': 'ax'}, {'id': 2, 'v': 'c'}])
+    assert result.difference_row_count == 1
@@ -0,0 +1,108 @@
+# @Project: diff-kit
+# @Time: 2025/2/24 16:20
+# @Author: Alan
+# @File: test_compare_data
+
+import asyncio
+import random
+from collections import defaultdict
+
+import pytest
+from conftest import FakeMysqlEngine, diff_params
+
+from diff_kit.db_diff.core.compare_data import DbDiff, DiffParams
+
+
+@pytest.fixture
+def tables(fake_db):
+    name, db = fake_db
+    db.execute("create table ta (id integer, v integer)")
+    db.execute("create table tb (id integer, v integer)")
+    db.executemany("insert into ta values (?, ?)", [(i, i) for i in range(1, 501)])
+    db.executemany("insert into tb values (?, ?)", [(i, i + (i % 50 == 0)) for i in range(1, 501) if i % 100])
+    return name
+
+
+def test_range_scan_skips_row_count(tables, monkeypatch):
+    async def get_row_count(self, table_name, where_clause=None):
+        raise AssertionError("按键范围扫描时不应COUNT两表")
+
+    monkeypatch.setattr(FakeMysqlEngine, 'get_row_count', get_row_count)
+    result = DbDiff(DiffParams(**diff_params(tables, split_ranges=True))).start()
+    assert result.num_table_a is None and result.num_table_b is None
+    assert result.num_diff_row == 500
+    assert result.only_row_count_in_table_a == 5
+    assert result.difference_row_count == 5
+
+
+def test_range_scan_with_exact_row_count(tables):
+    result = DbDiff(DiffParams(**diff_params(tables, split_ranges=True, exact_row_count=True))).start()
+    assert (result.num_table_a, result.num_table_b) == (500, 495)
+    assert not result.is_success()
+
+
+@pytest.mark.parametrize('sample', [100, 0.5, 300])
+def test_sample_reaches_target_size(tables, sample):
+    # 重复命中的探测点会被补充探测，样本数达到目标
+    random.seed(0)
+    result = DbDiff(DiffParams(**diff_params(tables, sample=sample))).start()
+    expected = int(sample * 500) if sample < 1 else sample
+    assert result.num_diff_row == expected
+    assert result.sample_estimate.population == 500
+
+
+def test_sample_probes_match_target_in_one_round(tables, monkeypatch):
+    calls = []
+    randint = random.randint
+
+    def counting_randint(a, b):
+        calls.append(1)
+        return randint(a, b)
+
+    monkeypatch.setattr(random, 'randint', counting_randint)
+    monkeypatch.setattr(FakeMysqlEngine, 'SAMPLE_MAX_ROUNDS', 1)
+    result = DbDiff(DiffParams(**diff_params(tables, sample=200, limit=50))).start()
+    # 只进行一轮探测时，探测点数与目标样本数相同
+    assert len(calls) == 200
+    assert result.num_diff_row <= 200
+
+
+
+@pytest.mark.parametrize('mode', [{'checksum': True, 'checksum_leaf_size': 20}, {'keyset': True}])
+def test_queries_share_global_budget(tables, monkeypatch, mode):
+    # 全局额度只有1个时，每次查询都在占用额度期间执行，每张表同一时刻最多只有一个查询，
+    # 且递归切分不会因父范围持有额度而死锁
+    budget = None
+    in_flight = defaultdict(int)
+    concurrency = []
+    unlimited = []
+
+    def wrap(method):
+        async def wrapper(self, *args, **kwargs):
+            table = next(arg for arg in args if arg in ('ta', 'tb'))
+            in_flight[table] += 1
+            concurrency.append(in_flight[table])
+            if not budget.locked():
+                unlimited.append(method.__name__)
+            try:
+                # 让出事件循环，使并发的查询有机会重叠
+                await asyncio.sleep(0.001)
+                return await method(self, *args, **kwargs)
+            finally:
+                in_flight[table] -= 1
+        return wrapper
+
+    for name in ('get_checksum', 'get_key_bounds', 'query_keyset', 'query_in'):
+        monkeypatch.setattr(FakeMysqlEngine, name, wrap(getattr(FakeMysqlEngine, name)))
+
+    async def run():
+        nonlocal budget
+        budget = asyncio.Semaphore(1)
+        params = DiffParams(**diff_params(tables, **mode))
+        return await asyncio.wait_for(DbDiff(params, budget=budget).run_compare(), timeout=30)
+
+    result = asyncio.run(run())
+    assert not unlimited
+    assert max(concurrency) == 1
+    assert result.num_diff_row == 500
+    assert result.difference_row_count == 5
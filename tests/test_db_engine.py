@@ -0,0 +1,41 @@
+# @Project: diff-kit
+# @Time: 2025/2/25 10:30
+# @Author: Alan
+# @File: test_db_engine
+
+import asyncio
+
+import pytest
+from conftest import FakeMysqlEngine
+
+from diff_kit.db_diff.db_engine.exception import DBException
+
+
+async def consume(rows):
+    return [row async for row in rows]
+
+
+@pytest.fixture
+def engine(fake_db):
+    name, db = fake_db
+    db.execute("create table ta (id integer, v integer)")
+    db.executemany("insert into ta values (?, ?)", [(i, i) for i in range(1, 11)])
+    engine = FakeMysqlEngine('localhost', 3306, 'u', 'p', name)
+    asyncio.run(engine.create_pool())
+    return engine
+
+
+@pytest.mark.parametrize('query', [
+    lambda engine: engine.query_stream('*', 'missing'),
+    lambda engine: engine.query_sample('*', 'missing', ['id'], 0.5, 5),
+    lambda engine: engine.execute_stream("SELECT * FROM missing"),
+], ids=['query_stream', 'query_sample', 'execute_stream'])
+def test_stream_errors_are_wrapped_once(engine, query):
+    with pytest.raises(DBException) as exc_info:
+        asyncio.run(consume(query(engine)))
+    assert not isinstance(exc_info.value.args[0], DBException)
+
+
+def test_sample_returns_distinct_rows(engine):
+    rows = asyncio.run(consume(engine.query_sample('*', 'ta', ['id'], 0.5, 5)))
+    assert len(rows) == len({row['id'] for row in rows}) == 5
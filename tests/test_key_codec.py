@@ -0,0 +1,69 @@
+# @Project: diff-kit
+# @Time: 2025/2/25 11:30
+# @Author: Alan
+# @File: test_key_codec
+
+import datetime
+import uuid
+from decimal import Decimal
+
+from diff_kit.db_diff.core.key_codec import KeyCodec, KeyIndex
+
+
+def test_single_column_key_is_scalar():
+    codec = KeyCodec(['id'])
+    assert codec.encode({'id': 1, 'v': 'x'}) == 1
+    assert codec.encode_values((1,)) == 1
+
+
+def test_composite_keys_do_not_collide():
+    codec = KeyCodec(['a', 'b'])
+    assert codec.encode({'a': 'a_b', 'b': 'c'}) != codec.encode({'a': 'a', 'b': 'b_c'})
+    assert codec.encode({'a': 1, 'b': 'x'}) == codec.encode_values((1, 'x')) == (1, 'x')
+
+
+def test_values_from_different_engines_encode_alike():
+    tz = datetime.timezone(datetime.timedelta(hours=8))
+    value = uuid.uuid4()
+    pairs = [
+        (1, Decimal('1.0')),
+        (2, 2.0),
+        (1, True),
+        (b'ab', memoryview(b'ab')),
+        (b'ab', bytearray(b'ab')),
+        (str(value), value),
+        (datetime.datetime(2025, 1, 1, 0, 0), datetime.datetime(2025, 1, 1, 8, 0, tzinfo=tz)),
+    ]
+    for value_a, value_b in pairs:
+        assert KeyCodec.normalize(value_a) == KeyCodec.normalize(value_b)
+        assert hash(KeyCodec.normalize(value_a)) == hash(KeyCodec.normalize(value_b))
+
+
+def test_fractional_values_stay_distinct():
+    assert KeyCodec.normalize(Decimal('1.50')) == Decimal('1.5')
+    assert KeyCodec.normalize(1.5) != KeyCodec.normalize(1)
+
+
+def test_text_form_round_trip():
+    codec = KeyCodec(['a', 'b'])
+    key = codec.encode({'a': 1, 'b': 'x'})
+    assert codec.to_text(key) == ('1', 'x')
+    assert KeyCodec(['id']).to_text(7) == '7'
+
+
+def test_key_index_lookup_and_duplicates():
+    codec = KeyCodec(['id'])
+    rows = [{'id': 1, 'v': 'a'}, {'id': 2, 'v': 'b'}, {'id': 1, 'v': 'c'}]
+    index = KeyIndex(rows, codec)
+    assert index.lookup(codec.encode_values((2,))) == [rows[1]]
+    assert index.lookup(codec.encode_values((1,))) == [rows[0], rows[2]]
+    assert index.lookup(codec.encode_values((3,))) == []
+
+
+def test_key_index_falls_back_to_text_form():
+    # 一端的唯一字段为字符串时按文本形式匹配
+    codec = KeyCodec(['id'])
+    rows = [{'id': '10'}, {'id': '20'}]
+    index = KeyIndex(rows, codec)
+    assert index.lookup(codec.encode_values((10,))) == [rows[0]]
+    assert index.lookup(codec.encode_values((30,))) == []
@@ -0,0 +1,48 @@
+# @Project: diff-kit
+# @Time: 2025/2/25 10:10
+# @Author: Alan
+# @File: test_key_set
+
+from decimal import Decimal
+
+import numpy as np
+
+from diff_kit.db_diff.core.key_set import KeySet
+
+
+def build(keys, chunk_size=100000) -> KeySet:
+    key_set = KeySet(chunk_size=chunk_size)
+    key_set.add(keys)
+    key_set.freeze()
+    return key_set
+
+
+def test_integer_keys_are_exact():
+    key_set = build([(i,) for i in range(0, 1000, 2)], chunk_size=64)
+    assert len(key_set) == 500
+    found = key_set.contains([(i,) for i in range(1000)])
+    assert np.array_equal(found, np.arange(1000) % 2 == 0)
+
+
+def test_integer_key_codes_are_the_values():
+    assert KeySet.encode((42,)) == 42
+    assert KeySet.encode((-2 ** 63,)) == -2 ** 63
+
+
+def test_keys_are_normalized_across_engines():
+    key_set = build([(Decimal('7'),), ('a',), (1, 'b')])
+    assert key_set.contains([(7,), (7.0,), ('a',), (1, 'b'), (Decimal('1'), 'b'), ('b',)]).tolist() == \
+        [True, True, True, True, True, False]
+
+
+def test_empty_key_set():
+    key_set = build([])
+    assert len(key_set) == 0
+    assert key_set.contains([(1,), ('x',)]).tolist() == [False, False]
+
+
+def test_hash_collision_is_reported_as_present(monkeypatch):
+    # 判定为存在的键不再确认，哈希冲突时仅在B表的键被漏报
+    monkeypatch.setattr(KeySet, 'encode', staticmethod(lambda key: 1))
+    key_set = build([('a',)])
+    assert key_set.contains([('a',), ('b',)]).tolist() == [True, True]
@@ -0,0 +1,108 @@
+# @Project: diff-kit
+# @Time: 2025/2/24 14:10
+# @Author: Alan
+# @File: test_normalizer
+
+import datetime
+import uuid
+from decimal import Decimal
+
+import numpy as np
+
+from diff_kit.db_diff.core.normalizer import ColumnNormalizer, column_category, to_bool, to_json
+
+
+def test_mysql_bit_matches_pg_boolean():
+    normalizer = ColumnNormalizer.compile({'flag': 'bit(1)'}, {'flag': 'boolean'}, {'flag': 'flag'})
+    rows_a = normalizer.apply([{'flag': b'\x00'}, {'flag': b'\x01'}, {'flag': None}])
+    rows_b = normalizer.apply([{'flag': False}, {'flag': True}, {'flag': None}])
+    assert rows_a == rows_b == [{'flag': False}, {'flag': True}, {'flag': None}]
+
+
+def test_to_bool_bytes():
+    assert to_bool(b'\x00') is False
+    assert to_bool(bytearray(b'\x00\x01')) is True
+    assert to_bool(memoryview(b'\x00')) is False
+    assert to_bool(1) is True
+
+
+def test_options_without_normalize_only_apply_requested_converters():
+    types = {'name': 'varchar(20)', 'flag': 'tinyint(1)', 'v': 'double'}
+    mapping = {'name': 'name', 'flag': 'flag', 'v': 'v'}
+    normalizer = ColumnNormalizer.compile(types, types, mapping, trim_strings=True, normalize_types=False)
+    assert set(normalizer.converters) == {'name'}
+    assert normalizer.apply([{'name': b' a ', 'flag': 1, 'v': 1}]) == [{'name': b' a ', 'flag': 1, 'v': 1}]
+    assert normalizer.apply([{'name': ' a ', 'flag': 1, 'v': 1}]) == [{'name': 'a', 'flag': 1, 'v': 1}]
+
+    normalizer = ColumnNormalizer.compile(types, types, mapping, trim_strings=True)
+    assert normalizer.apply([{'name': b' a ', 'flag': 1, 'v': 1}]) == [{'name': 'a', 'flag': True, 'v': 1.0}]
+
+
+def test_column_category():
+    assert column_category('tinyint(1)') == 'bool'
+    assert column_category('tinyint(4)') == 'integer'
+    assert column_category('timestamp without time zone') == 'datetime'
+    assert column_category('time') == 'time'
+    assert column_category('interval') == 'other'
+    assert column_category('varchar(20)') == 'text'
+    assert column_category('geometry') == 'other'
+
+
+def test_decimal_and_float_columns():
+    normalizer = ColumnNormalizer.compile({'v': 'decimal(10,2)'}, {'v': 'double'}, {'v': 'v'})
+    assert normalizer.apply([{'v': Decimal('1.50')}]) == [{'v': 1.5}]
+
+
+def test_datetime_time_zone_and_precision():
+    normalizer = ColumnNormalizer.compile({'ts': 'datetime(6)'}, {'ts': 'timestamp with time zone'}, {'ts': 'ts'},
+                                          timestamp_precision=3)
+    tz = datetime.timezone(datetime.timedelta(hours=8))
+    row_a = {'ts': datetime.datetime(2025, 1, 1, 0, 0, 0, 123456)}
+    row_b = {'ts': datetime.datetime(2025, 1, 1, 8, 0, 0, 123999, tzinfo=tz)}
+    assert normalizer.apply([row_a]) == normalizer.apply([row_b]) == \
+        [{'ts': datetime.datetime(2025, 1, 1, 0, 0, 0, 123000)}]
+
+
+def test_time_json_uuid_and_binary():
+    types = {'t': 'time', 'j': 'json', 'u': 'uuid', 'b': 'varbinary(16)'}
+    normalizer = ColumnNormalizer.compile(types, types, {c: c for c in types})
+    value = uuid.uuid4()
+    rows_a = normalizer.apply([{'t': datetime.timedelta(hours=1), 'j': '{"a": 1}', 'u': str(value).upper(),
+                                'b': bytearray(b'x')}])
+    rows_b = normalizer.apply([{'t': datetime.time(1), 'j': {'a': 1}, 'u': value, 'b': memoryview(b'x')}])
+    assert rows_a == rows_b
+
+
+def test_invalid_json_is_kept_as_text():
+    assert to_json('') == ''
+    assert to_json(b'not json') == 'not json'
+    assert to_json('[1, 2]') == [1, 2]
+
+
+def test_trim_and_ignore_case():
+    types = {'name': 'varchar(20)'}
+    normalizer = ColumnNormalizer.compile(types, types, {'name': 'name'}, trim_strings=True, ignore_case=True)
+    assert normalizer.apply([{'name': '  ABC '}, {'name': None}]) == [{'name': 'abc'}, {'name': None}]
+
+
+def test_tolerance_only_on_float_columns():
+    types_a = {'v': 'double', 'qty': 'int'}
+    types_b = {'v': 'float', 'qty': 'bigint'}
+    normalizer = ColumnNormalizer.compile(types_a, types_b, {'v': 'v', 'qty': 'qty'}, float_tolerance=1)
+    assert normalizer.tolerance_columns == ['v']
+    assert normalizer.is_tolerated(('change', 'v', (1.0, 1.5)))
+    assert not normalizer.is_tolerated(('change', 'v', (1.0, 2.5)))
+    assert not normalizer.is_tolerated(('change', 'v', (None, 1.0)))
+    assert not normalizer.is_tolerated(('change', 'qty', (5, 6)))
+
+
+def test_find_different_with_nulls():
+    normalizer = ColumnNormalizer({}, float_tolerance=0.01, tolerance_columns=['v'])
+    values_a = np.array([1.0, None, None, 2.0], dtype=object)
+    values_b = np.array([1.005, None, 3.0, 2.5], dtype=object)
+    assert normalizer.find_different(values_a, values_b).tolist() == [False, False, True, True]
+
+
+def test_key_columns_are_not_compiled():
+    normalizer = ColumnNormalizer.compile({'id': 'int', 'v': 'double'}, {'id': 'int', 'v': 'double'}, {'v': 'v'})
+    assert set(normalizer.converters) == {'v'}
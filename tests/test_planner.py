@@ -0,0 +1,81 @@
+# @Project: diff-kit
+# @Time: 2025/2/25 11:00
+# @Author: Alan
+# @File: test_planner
+
+import asyncio
+from datetime import date
+
+import pytest
+
+from diff_kit.db_diff.core.planner import KeyRange, RangePlanner
+
+
+class StatsClient:
+    """
+    只提供切分需要的统计信息的数据源。
+    """
+
+    def __init__(self, histogram=None, bounds=(None, None)):
+        self.histogram = histogram or []
+        self.bounds = bounds
+
+    async def get_key_histogram(self, table_name, key_column):
+        return self.histogram
+
+    async def get_key_bounds(self, table_name, key_column, where_clause=None, key_range=None):
+        return self.bounds
+
+
+def plan(client, num_ranges):
+    return asyncio.run(RangePlanner(client, 'ta', 'id').plan(num_ranges))
+
+
+def covers(ranges, value) -> int:
+    """
+    值落在几个左开右闭的范围中。
+    """
+    return sum((r.lower is None or value > r.lower) and (r.upper is None or value <= r.upper) for r in ranges)
+
+
+def test_single_range():
+    assert plan(StatsClient(bounds=(1, 100)), 1) == [KeyRange()]
+
+
+def test_linear_ranges_cover_every_key_once():
+    ranges = plan(StatsClient(bounds=(1, 100)), 4)
+    assert len(ranges) == 4
+    assert ranges[0].lower is None and ranges[-1].upper is None
+    assert all(a.upper == b.lower for a, b in zip(ranges, ranges[1:]))
+    assert all(covers(ranges, key) == 1 for key in range(-5, 110))
+
+
+@pytest.mark.parametrize('bounds', [(None, None), (7, 7), ('a', 'z')])
+def test_unsplittable_keys_give_one_unbounded_range(bounds):
+    # 空表、MIN与MAX相同、字符串键都无法切分
+    assert plan(StatsClient(bounds=bounds), 4) == [KeyRange()]
+
+
+def test_small_integer_range_drops_duplicate_points():
+    ranges = plan(StatsClient(bounds=(1, 3)), 8)
+    assert len(ranges) == len(set(ranges))
+    assert all(covers(ranges, key) == 1 for key in range(0, 5))
+
+
+def test_histogram_split_points():
+    histogram = [(10, 0.1), (20, 0.3), (1000, 0.6), (5000, 1.0)]
+    ranges = plan(StatsClient(histogram=histogram, bounds=(1, 5000)), 4)
+    assert [r.upper for r in ranges] == [20, 1000, 5000, None]
+
+
+def test_split_linear_dates():
+    planner = RangePlanner(StatsClient(), 'ta', 'id')
+    points = planner.split_linear(date(2025, 1, 1), date(2025, 1, 5), 4)
+    assert points == [date(2025, 1, 2), date(2025, 1, 3), date(2025, 1, 4)]
+
+
+def test_split_sub_range():
+    planner = RangePlanner(StatsClient(bounds=(11, 20)), 'ta', 'id')
+    ranges = asyncio.run(planner.split(KeyRange(10, 20), 2))
+    assert ranges[0].lower == 10 and ranges[-1].upper == 20
+    assert all(covers(ranges, key) == 1 for key in range(11, 21))
@@ -0,0 +1,68 @@
+# @Project: diff-kit
+# @Time: 2025/2/25 14:00
+# @Author: Alan
+# @File: test_result_store
+
+import os
+import pickle
+
+import pytest
+
+from diff_kit.db_diff.core.result_store import (DIFFERENCE, ONLY_IN_TABLE_A, MemoryResultStore, SqliteResultStore,
+                                                create_result_store)
+from diff_kit.db_diff.core.results import Result
+
+
+def test_sqlite_store_keeps_order_across_flushes():
+    store = SqliteResultStore(buffer_size=3)
+    for i in range(10):
+        store.append(DIFFERENCE, {'i': i})
+        store.append(ONLY_IN_TABLE_A, f"id={i}")
+    assert list(store.iter(DIFFERENCE)) == [{'i': i} for i in range(10)]
+    assert list(store.iter(ONLY_IN_TABLE_A)) == [f"id={i}" for i in range(10)]
+    path = store.path
+    store.close()
+    assert not os.path.exists(path)
+
+
+def test_sqlite_store_path_is_cleared_on_open(tmp_path):
+    path = str(tmp_path / 'details.sqlite')
+    store = SqliteResultStore(path)
+    store.append(DIFFERENCE, 1)
+    store.close()
+    assert os.path.exists(path)
+
+    store = SqliteResultStore(path)
+    store.append(DIFFERENCE, 2)
+    assert list(store.iter(DIFFERENCE)) == [2]
+    store.close()
+
+
+def test_sqlite_store_pickles_by_path():
+    store = SqliteResultStore(buffer_size=100)
+    store.append(DIFFERENCE, 'a')
+    copy = pickle.loads(pickle.dumps(store))
+    # 写缓冲区在序列化前写入文件
+    assert copy.path == store.path
+    assert list(copy.iter(DIFFERENCE)) == ['a']
+    store.conn.close()
+    copy.close()
+    assert not os.path.exists(store.path)
+
+
+def test_result_merge_across_stores():
+    result = Result('ta', 'tb', store=SqliteResultStore())
+    part = Result(store=MemoryResultStore())
+    part.num_diff_row = 3
+    part.add_only_row_in_table_a('id=1')
+    part.add_difference_row('id=2', [('change', 'v', (1, 2))])
+    result.merge(part)
+    assert result.num_diff_row == 3
+    assert list(result.only_rows_in_table_a) == ['id=1']
+    assert result.difference_row_count == 1
+    result.close()
+
+
+def test_unknown_store_type():
+    with pytest.raises(ValueError):
+        create_result_store('redis')
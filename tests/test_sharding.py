@@ -0,0 +1,46 @@
+# @Project: diff-kit
+# @Time: 2025/2/24 10:40
+# @Author: Alan
+# @File: test_sharding
+
+from conftest import diff_params
+
+from diff_kit.db_diff.core.compare_data import DiffParams
+from diff_kit.db_diff.core.sharding import ShardedDbDiff
+
+
+def create_tables(db, key_type: str, keys: list):
+    db.execute(f"create table ta (id {key_type}, v integer)")
+    db.execute(f"create table tb (id {key_type}, v integer)")
+    db.executemany("insert into ta values (?, ?)", [(key, i) for i, key in enumerate(keys)])
+    # 每10行有一行的值不一致
+    db.executemany("insert into tb values (?, ?)", [(key, i + (i % 10 == 0)) for i, key in enumerate(keys)])
+
+
+def test_sharded_diff_with_unsplittable_text_key(fake_db):
+    # 字符串键没有直方图时只能得到一个键范围，仍需对比全部的行
+    name, db = fake_db
+    create_tables(db, 'text', [f"k{i:04d}" for i in range(500)])
+    result = ShardedDbDiff(DiffParams(**diff_params(name, shards=4))).run()
+    assert result.num_diff_row == 500
+    assert result.difference_row_count == 50
+    assert not result.is_success()
+
+
+def test_sharded_diff_with_single_key(fake_db):
+    # MIN与MAX相同
+    name, db = fake_db
+    create_tables(db, 'integer', [7])
+    result = ShardedDbDiff(DiffParams(**diff_params(name, shards=4))).run()
+    assert result.num_diff_row == 1
+    assert result.difference_row_count == 1
+
+
+def test_sharded_diff_with_integer_key(fake_db):
+    name, db = fake_db
+    create_tables(db, 'integer', list(range(1, 1001)))
+    result = ShardedDbDiff(DiffParams(**diff_params(name, shards=4))).run()
+    assert result.num_table_a == result.num_table_b == 1000
+    assert result.num_diff_row == 1000
+    assert result.difference_row_count == 100
+    assert len(list(result.difference_rows)) == 100
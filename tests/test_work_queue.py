@@ -0,0 +1,117 @@
+# @Project: diff-kit
+# @Time: 2025/2/24 11:20
+# @Author: Alan
+# @File: test_work_queue
+
+import pytest
+from conftest import diff_params
+
+from diff_kit.db_diff.core import work_queue
+from diff_kit.db_diff.core.compare_data import DiffParams
+from diff_kit.db_diff.core.planner import KeyRange
+from diff_kit.db_diff.core.results import Result
+from diff_kit.db_diff.core.work_queue import QueueCoordinator, WorkQueue
+
+
+def create_tables(db, key_type: str, keys: list):
+    db.execute(f"create table ta (id {key_type}, v integer)")
+    db.execute(f"create table tb (id {key_type}, v integer)")
+    db.executemany("insert into ta values (?, ?)", [(key, i) for i, key in enumerate(keys)])
+    db.executemany("insert into tb values (?, ?)", [(key, i + (i % 10 == 0)) for i, key in enumerate(keys)])
+
+
+def run_queue(name: str, tmp_path, **kwargs):
+    params = DiffParams(**diff_params(name, work_queue_path=str(tmp_path / 'queue.sqlite'), shards=2, **kwargs))
+    return QueueCoordinator(params, poll_interval=0.1).run()
+
+
+def test_queue_with_unsplittable_text_key(fake_db, tmp_path):
+    # 字符串键没有直方图时只发布一个无边界的键范围，工作进程仍需对比全部的行
+    name, db = fake_db
+    create_tables(db, 'text', [f"k{i:04d}" for i in range(500)])
+    result = run_queue(name, tmp_path, num_ranges=4)
+    assert result.num_diff_row == 500
+    assert result.difference_row_count == 50
+    assert not result.is_success()
+
+
+def test_queue_with_integer_key(fake_db, tmp_path):
+    name, db = fake_db
+    create_tables(db, 'integer', list(range(1, 1001)))
+    result = run_queue(name, tmp_path, num_ranges=4)
+    assert result.num_diff_row == 1000
+    assert result.difference_row_count == 100
+    assert len(list(result.difference_rows)) == 100
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(work_queue.time, 'time', clock.time)
+    return clock
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = WorkQueue(str(tmp_path / 'queue.sqlite'), max_attempts=2)
+    queue.publish({'table': 'ta'}, [KeyRange(None, 10), KeyRange(10, None)], row_counts=(20, 20))
+    return queue
+
+
+def test_claim_in_order(queue, clock):
+    assert queue.get_meta('params') == {'table': 'ta'}
+    assert queue.get_meta('row_counts') == (20, 20)
+    assert queue.claim('w1', 10) == (0, KeyRange(None, 10))
+    assert queue.claim('w2', 10) == (1, KeyRange(10, None))
+    assert queue.claim('w3', 10) is None
+    assert not queue.is_drained()
+
+
+def test_expired_lease_is_reclaimed(queue, clock):
+    task_id, _ = queue.claim('w1', 10)
+    clock.now += 5
+    assert queue.renew(task_id, 'w1', 10)
+    clock.now += 11
+    # 续约后的租约过期，其他工作进程重新领取
+    assert queue.claim('w2', 10) == (task_id, KeyRange(None, 10))
+    # 原工作进程的续约与结果都被拒绝
+    assert not queue.renew(task_id, 'w1', 10)
+    assert not queue.complete(task_id, 'w1', Result())
+    assert queue.complete(task_id, 'w2', Result())
+
+
+def test_lease_expiring_too_often_fails_the_range(queue, clock):
+    for worker in ('w1', 'w2'):
+        assert queue.claim(worker, 10)[0] == 0
+        clock.now += 11
+    done, failed, total, errors = queue.progress()
+    assert (done, failed, total) == (0, 1, 2)
+    assert errors == ["范围0: 租约多次过期"]
+
+
+def test_failed_range_is_retried_then_marked_failed(queue, clock):
+    task_id, _ = queue.claim('w1', 10)
+    queue.fail(task_id, 'w1', 'boom')
+    assert queue.claim('w1', 10)[0] == task_id
+    queue.fail(task_id, 'w1', 'boom')
+    assert queue.claim('w1', 10)[0] == 1
+    assert queue.progress()[1] == 1
+
+
+def test_results_of_completed_ranges(queue, clock):
+    for worker in ('w1', 'w2'):
+        task_id, _ = queue.claim(worker, 10)
+        result = Result()
+        result.num_diff_row = 10
+        queue.complete(task_id, worker, result)
+    assert queue.is_drained()
+    assert [result.num_diff_row for result in queue.results()] == [10, 10]
+    assert queue.progress() == (2, 0, 2, [])